@@ -0,0 +1,127 @@
+"""Capture writes off the event loop, and a monitor for event-loop stalls.
+
+Saving a capture touches the disk (temporary file, write, optional fsync,
+rename). On a slow disk, NFS or a folder Syncthing is busy scanning that can
+take long enough to hold up every other HTTP and DBus request, so
+:class:`CaptureIO` runs those steps on its own small thread pool.
+:class:`LoopLagMonitor` measures how late the loop wakes up, which is how such
+stalls show up in ``GET /stats``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from .config import StorageConfig
+from .utils import write_text_file
+
+T = TypeVar("T")
+
+# Wake-ups later than this count as a stall.
+STALL_SECONDS = 0.1
+
+
+class CaptureIO:
+    """Dedicated thread pool for capture-path file operations."""
+
+    def __init__(self, cfg: StorageConfig) -> None:
+        self.cfg = cfg
+        self.executor = ThreadPoolExecutor(
+            max_workers=cfg.io_workers, thread_name_prefix="dropsync-io"
+        )
+        self.operations = 0
+        self.pending = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn`` on the I/O pool; the time includes waiting for a free thread."""
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+            elapsed = time.monotonic() - started
+            self.operations += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def write_text(self, path: Path, content: str) -> None:
+        await self.run(write_text_file, path, content, self.cfg.fsync)
+
+    async def close(self) -> None:
+        """Finish queued writes, then stop the threads."""
+
+        await asyncio.to_thread(self.executor.shutdown, wait=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "operations": self.operations,
+            "pending": self.pending,
+            "mean_seconds": (
+                round(self.total_seconds / self.operations, 6) if self.operations else 0.0
+            ),
+            "max_seconds": round(self.max_seconds, 6),
+            "fsync": self.cfg.fsync,
+        }
+
+
+class LoopLagMonitor:
+    """Sleeps ``interval`` in a loop and records how much later than asked it woke up."""
+
+    def __init__(self, interval: float = 0.05, window: int = 1200) -> None:
+        self.interval = interval
+        self._recent: deque[float] = deque(maxlen=window)
+        self._task: asyncio.Task[None] | None = None
+        self.samples = 0
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self._recent.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= STALL_SECONDS:
+            self.stalls += 1
+            self.stalled_seconds += lag
+
+    def stats(self) -> dict[str, Any]:
+        recent = sorted(self._recent)
+        p99 = recent[min(len(recent) - 1, int(len(recent) * 0.99))] if recent else 0.0
+        return {
+            "samples": self.samples,
+            "max_lag": round(self.max_lag, 6),
+            "p99_lag": round(p99, 6),
+            "stalls": self.stalls,
+            "stalled_seconds": round(self.stalled_seconds, 3),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - started - self.interval))
+
+
+__all__ = ["CaptureIO", "LoopLagMonitor", "STALL_SECONDS"]
@@ -16,6 +16,7 @@ from rich.table import Table
 
 from .config import ConfigManager
 from .dbus_service import DropSyncDBusService
+from .dedupe import DuplicateGroup
 from .rules import organize_once
 from .server import app as fastapi_app, app_state
 
@@ -23,6 +24,8 @@ console = Console()
 app = typer.Typer(help="DropSync command-line interface")
 config_cli = typer.Typer(help="Configuration utilities")
 app.add_typer(config_cli, name="config")
+dead_letters_cli = typer.Typer(help="Inspect and requeue processor jobs that gave up")
+app.add_typer(dead_letters_cli, name="dead-letters")
 
 DEPENDENCIES = {
     "readability-cli": ["readability-cli", "--version"],
@@ -129,14 +132,115 @@ def config_print() -> None:
 def organize(force: bool = typer.Option(False, help="Force re-run of processors")) -> None:
     """Apply rules and run post-processors once."""
 
+    asyncio.run(_organize_async(force))
+
+
+async def _organize_async(force: bool) -> None:
     config = app_state.config_manager.config
-    app_state.collector.update_rules()
-    actions = organize_once(config, app_state.collector.rule_engine, app_state.processor_manager, force=force)
-    if not actions:
-        console.print("[green]No actions needed[/green]")
+    try:
+        app_state.collector.update_rules()
+        actions = organize_once(config, app_state.collector.rule_engine, app_state.processor_manager, force=force)
+        if not actions:
+            console.print("[green]No actions needed[/green]")
+            return
+        for action in actions:
+            console.print(f"- {action}")
+        await app_state.processor_manager.join()
+        # Moved stubs and new processor output show up in search right away.
+        await app_state.collector.reconcile_index()
+    finally:
+        await app_state.processor_manager.shutdown()
+        await app_state.collector.close()
+
+
+@app.command("index")
+def index_command() -> None:
+    """Bring the search index in line with the capture folder."""
+
+    counts = asyncio.run(_index_async())
+    if counts is None:
+        console.print("[yellow]Item index is disabled[/yellow]")
+        raise typer.Exit(code=1)
+    console.print(
+        f"[green]Indexed {counts['indexed']}, removed {counts['removed']},"
+        f" unchanged {counts['unchanged']}[/green]"
+    )
+
+
+async def _index_async() -> dict[str, int] | None:
+    try:
+        return await app_state.collector.reconcile_index()
+    finally:
+        await app_state.collector.close()
+
+
+@app.command()
+def dedupe(apply: bool = typer.Option(False, "--apply", help="Merge the duplicates found")) -> None:
+    """Find items captured more than once under the same canonical URL."""
+
+    groups = asyncio.run(_dedupe_async(apply))
+    if groups is None:
+        console.print("[yellow]Item index is disabled[/yellow]")
+        raise typer.Exit(code=1)
+    if not groups:
+        console.print("[green]No duplicates[/green]")
+        return
+    table = Table(title="Duplicate captures", show_header=True, header_style="bold magenta")
+    table.add_column("URL")
+    table.add_column("Kept")
+    table.add_column("Duplicates")
+    for group in groups:
+        table.add_row(group.canonical, group.keep.path.name, str(len(group.duplicates)))
+    console.print(table)
+    count = sum(len(group.duplicates) for group in groups)
+    if apply:
+        console.print(f"[green]Merged {count} duplicate(s)[/green]")
+    else:
+        console.print(f"[yellow]{count} duplicate(s); pass --apply to merge them[/yellow]")
+
+
+async def _dedupe_async(apply: bool) -> list[DuplicateGroup] | None:
+    try:
+        return await app_state.collector.dedupe(apply)
+    finally:
+        await app_state.collector.close()
+
+
+@dead_letters_cli.command("list")
+def dead_letters_list(limit: int = typer.Option(100, help="Maximum entries to show")) -> None:
+    """Show (url, processor) pairs that exhausted their retries."""
+
+    entries = app_state.processor_manager.dead_letters(limit)
+    if not entries:
+        console.print("[green]No dead letters[/green]")
         return
-    for action in actions:
-        console.print(f"- {action}")
+    table = Table(title="Dead letters", show_header=True, header_style="bold magenta")
+    table.add_column("ID")
+    table.add_column("Processor")
+    table.add_column("URL")
+    table.add_column("Attempts")
+    table.add_column("Error")
+    for entry in entries:
+        table.add_row(str(entry.id), entry.name, entry.url, str(entry.attempts), entry.error or "")
+    console.print(table)
+
+
+@dead_letters_cli.command("requeue")
+def dead_letters_requeue(
+    ids: Optional[list[int]] = typer.Argument(None, help="Entry IDs to requeue"),
+    all_entries: bool = typer.Option(False, "--all", help="Requeue every dead letter"),
+) -> None:
+    """Give dead letters a fresh retry budget; the running daemon picks them up."""
+
+    if not ids and not all_entries:
+        console.print("[yellow]Pass entry IDs or --all[/yellow]")
+        raise typer.Exit(code=1)
+    journal = app_state.processor_manager.journal
+    if journal is None:
+        console.print("[yellow]Processor journal is disabled[/yellow]")
+        raise typer.Exit(code=1)
+    count = journal.requeue_dead(None if all_entries else ids)
+    console.print(f"[green]Requeued {count} job(s)[/green]")
 
 
 def run_daemon() -> None:
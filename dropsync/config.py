@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 import tomllib
 from pydantic import BaseModel, Field, ValidationError
 
@@ -23,20 +23,90 @@ def _default_root() -> Path:
     return _expand_path(Path.home() / "Sync" / "Collect")
 
 
+class RetryConfig(BaseModel):
+    max_attempts: int = Field(default=3, ge=1)
+    backoff: float = Field(default=30.0, ge=0)
+    backoff_max: float = Field(default=3600.0, ge=0)
+    jitter: float = Field(default=0.2, ge=0, le=1)
+
+
+class BatchConfig(BaseModel):
+    enabled: bool = False
+    max_items: int = Field(default=20, ge=1)
+    # Seconds to wait for more URLs before running a partial batch.
+    window: float = Field(default=2.0, ge=0)
+
+
+class WorkerConfig(BaseModel):
+    """Long-lived worker fed jobs as NDJSON over stdin/stdout (see dropsync.workers)."""
+
+    enabled: bool = False
+    command: list[str] = Field(default_factory=list)
+    pool_size: int = Field(default=1, ge=1)
+    # Restart a worker after this many jobs to contain leaks.
+    max_jobs: int = Field(default=200, ge=1)
+    # Seconds between pings of idle workers; 0 disables health checks.
+    health_interval: float = Field(default=60.0, ge=0)
+    startup_timeout: float = Field(default=10.0, gt=0)
+
+
 class ProcessorConfig(BaseModel):
     enabled: bool = True
     command: list[str] = Field(default_factory=list)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    retry: RetryConfig = Field(default_factory=RetryConfig)
+    # Wall-clock limit in seconds; the whole process group is killed when exceeded.
+    timeout: Optional[float] = Field(default=None, gt=0)
+    nice: Optional[int] = Field(default=10, ge=0, le=19)
+    ionice_class: Optional[int] = Field(default=None, ge=1, le=3)
+    ionice_level: Optional[int] = Field(default=None, ge=0, le=7)
+    rlimit_as_mb: Optional[int] = Field(default=None, ge=1)
+    rlimit_cpu: Optional[int] = Field(default=None, ge=1)
+    batch: BatchConfig = Field(default_factory=BatchConfig)
+    worker: WorkerConfig = Field(default_factory=WorkerConfig)
+    # Name of a shared limit in `processors.classes`.
+    concurrency_class: Optional[str] = None
+
+
+class ReadabilityConfig(ProcessorConfig):
+    # "cli" spawns `command` per URL; "builtin" extracts in a local process pool.
+    backend: Literal["cli", "builtin"] = "cli"
+    workers: int = Field(default=2, ge=1)
+    max_document_bytes: int = Field(default=10 * 1024 * 1024, ge=1024)
+
+
+class CustomProcessorConfig(ProcessorConfig):
+    """A command-line processor declared in config (see dropsync.registry)."""
+
+    args: list[str] = Field(default_factory=lambda: ["{url}"])
+    # Used instead of `args` when the page was fetched already; `{input}` is the local copy.
+    input_args: Optional[list[str]] = None
+    output: Optional[str] = None
+    capture_stdout: bool = False
+    item_types: list[str] = Field(default_factory=list)
+    domains: list[str] = Field(default_factory=list)
+    workdir: Literal["item", "media"] = "item"
+    skip_if_done: bool = True
 
 
 class ProcessorsConfig(BaseModel):
-    readability: ProcessorConfig = Field(
-        default_factory=lambda: ProcessorConfig(
-            enabled=True, command=["readability-cli"]
+    max_concurrency: int = Field(default=4, ge=1)
+    per_domain_concurrency: int = Field(default=2, ge=1)
+    journal: bool = True
+    # Shared concurrency limits referenced by `concurrency_class`.
+    classes: Dict[str, int] = Field(default_factory=dict)
+    custom: Dict[str, CustomProcessorConfig] = Field(default_factory=dict)
+    readability: ReadabilityConfig = Field(
+        default_factory=lambda: ReadabilityConfig(
+            enabled=True, command=["readability-cli"], timeout=120.0
         )
     )
     monolith: ProcessorConfig = Field(
         default_factory=lambda: ProcessorConfig(
-            enabled=True, command=["monolith", "--isolate", "--no-js"]
+            enabled=True,
+            command=["monolith", "--isolate", "--no-js"],
+            max_concurrency=2,
+            timeout=300.0,
         )
     )
     yt_dlp: ProcessorConfig = Field(
@@ -49,16 +119,137 @@ class ProcessorsConfig(BaseModel):
                 "-o",
                 "%(title).200B.%(ext)s",
             ],
+            max_concurrency=1,
+            timeout=3600.0,
+            batch=BatchConfig(enabled=True),
         )
     )
     gallery_dl: ProcessorConfig = Field(
         default_factory=lambda: ProcessorConfig(
             enabled=True,
             command=["gallery-dl", "-D", "."],
+            max_concurrency=1,
+            timeout=3600.0,
+            batch=BatchConfig(enabled=True),
         )
     )
 
 
+class AdaptiveTimeoutConfig(BaseModel):
+    """Per-domain title timeouts learned from latency (see dropsync.latency)."""
+
+    enabled: bool = True
+    min_timeout: float = Field(default=0.5, gt=0)
+    # Budget = smoothed latency + `deviations` x its mean deviation, capped at http.timeout.
+    deviations: float = Field(default=4.0, ge=0)
+    # Consecutive timeouts/connection failures that open a domain's circuit breaker.
+    failure_threshold: int = Field(default=3, ge=1)
+    # Seconds an open breaker skips the domain before one probe is let through.
+    cooldown: float = Field(default=300.0, ge=0)
+
+
+class HttpConfig(BaseModel):
+    """Shared HTTP client used for title lookups (see dropsync.httpclient)."""
+
+    # Per-request timeout in seconds.
+    timeout: float = Field(default=3.0, gt=0)
+    max_connections: int = Field(default=20, ge=1)
+    max_keepalive_connections: int = Field(default=10, ge=0)
+    # Seconds an idle pooled connection is kept open.
+    keepalive_expiry: float = Field(default=30.0, ge=0)
+    # Needs the optional `h2` package (`pip install 'dropsync[http2]'`).
+    http2: bool = False
+    # Seconds to reuse DNS answers; 0 resolves on every new connection.
+    dns_cache_ttl: float = Field(default=300.0, ge=0)
+    # Title lookups stop reading a page after this many bytes.
+    title_max_bytes: int = Field(default=128 * 1024, ge=1024)
+    user_agent: str = "DropSync/0.1"
+    adaptive: AdaptiveTimeoutConfig = Field(default_factory=AdaptiveTimeoutConfig)
+
+
+class TitleCacheConfig(BaseModel):
+    """Resolved titles kept in memory and in <root>/.dropsync/titles.sqlite."""
+
+    enabled: bool = True
+    memory_entries: int = Field(default=1024, ge=1)
+    # Seconds a resolved title is reused.
+    ttl: float = Field(default=30 * 24 * 3600.0, gt=0)
+    # Seconds a URL that yielded no title (HTTP error, non-HTML, no title) is skipped.
+    negative_ttl: float = Field(default=3600.0, ge=0)
+    # Seconds every URL on a host that timed out or refused connections is skipped
+    # (only when http.adaptive is disabled; otherwise its circuit breaker decides).
+    host_failure_ttl: float = Field(default=600.0, ge=0)
+
+
+class TitlesConfig(BaseModel):
+    # "deferred" writes URL stubs under a slug title straight away and renames
+    # them once the page title has been fetched.
+    mode: Literal["inline", "deferred"] = "inline"
+    cache: TitleCacheConfig = Field(default_factory=TitleCacheConfig)
+
+
+FsyncPolicy = Literal["none", "file", "file+dir"]
+
+
+class StorageConfig(BaseModel):
+    """How captures are written to disk (see dropsync.captureio)."""
+
+    # "file" fsyncs each capture before renaming it into place; "file+dir" also
+    # fsyncs the directory so the rename itself survives a crash.
+    fsync: FsyncPolicy = "file"
+    # Threads doing capture writes off the event loop.
+    io_workers: int = Field(default=4, ge=1)
+
+
+class PagesConfig(BaseModel):
+    """Fetched pages shared by title parsing and processors (see dropsync.pagecache)."""
+
+    enabled: bool = True
+    # Seconds a fetched page is kept for processors and later captures of the URL.
+    ttl: float = Field(default=3600.0, gt=0)
+    # Longer documents are cut short; processors then fetch the URL themselves.
+    max_bytes: int = Field(default=10 * 1024 * 1024, ge=1024)
+
+
+class IndexConfig(BaseModel):
+    """Full-text index of captured items (see dropsync.index)."""
+
+    enabled: bool = True
+    # Only the start of long notes and readable text is indexed.
+    max_text_bytes: int = Field(default=1024 * 1024, ge=1024)
+
+
+DuplicateAction = Literal["existing", "update", "new"]
+
+
+class DedupeConfig(BaseModel):
+    """Recognising URLs captured before (see dropsync.dedupe); needs the item index."""
+
+    # "new" always creates another stub, "update" merges the tags and selection
+    # into the earlier item and queues processors still missing output,
+    # "existing" answers with the earlier item and drops what was sent.
+    on_duplicate: DuplicateAction = "new"
+    # Query parameters (fnmatch patterns) ignored when comparing URLs, on top of
+    # utm_* and the other well-known trackers.
+    strip_params: list[str] = Field(default_factory=list)
+
+
+class RateLimitConfig(BaseModel):
+    # Sustained requests per second.
+    rate: float = Field(default=1.0, gt=0)
+    # Requests allowed back to back before `rate` applies.
+    burst: int = Field(default=5, ge=1)
+
+
+class RateLimitsConfig(BaseModel):
+    """Per-host token buckets for title fetches and processors (see dropsync.ratelimit)."""
+
+    enabled: bool = True
+    default: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    # Limits for specific domains; an entry also covers its subdomains.
+    domains: Dict[str, RateLimitConfig] = Field(default_factory=dict)
+
+
 class DropSyncConfig(BaseModel):
     root: Path = Field(default_factory=_default_root)
     bind_host: str = "127.0.0.1"
@@ -77,6 +268,13 @@ class DropSyncConfig(BaseModel):
         }
     )
     processors: ProcessorsConfig = Field(default_factory=ProcessorsConfig)
+    http: HttpConfig = Field(default_factory=HttpConfig)
+    titles: TitlesConfig = Field(default_factory=TitlesConfig)
+    pages: PagesConfig = Field(default_factory=PagesConfig)
+    index: IndexConfig = Field(default_factory=IndexConfig)
+    dedupe: DedupeConfig = Field(default_factory=DedupeConfig)
+    storage: StorageConfig = Field(default_factory=StorageConfig)
+    rate_limits: RateLimitsConfig = Field(default_factory=RateLimitsConfig)
     filename_max_length: int = 120
     timezone: Optional[str] = None
 
@@ -114,13 +312,122 @@ files = "files"
 media = "media"
 scratch = "scratch"
 
+[http]
+# Title lookups share one pooled client; connections to a site are kept alive
+# between captures. Changes take effect when the daemon restarts.
+timeout = 3.0
+max_connections = 20
+max_keepalive_connections = 10
+keepalive_expiry = 30.0
+# http2 = true  # requires the `h2` package
+dns_cache_ttl = 300.0
+# Title lookups stream the page and stop at </head> once a title is known, or
+# after this many bytes.
+title_max_bytes = 131072
+
+# Per-domain timeouts learned from observed latency, stored in
+# <root>/.dropsync/domains.sqlite. `timeout` above is the ceiling. Domains that
+# keep timing out are skipped for `cooldown` seconds.
+[http.adaptive]
+enabled = true
+min_timeout = 0.5
+deviations = 4.0
+failure_threshold = 3
+cooldown = 300.0
+
+[titles]
+# "inline" fetches the page title before answering a capture; "deferred" answers
+# at once with a slug-named stub (title_source: pending) and renames it later.
+mode = "inline"
+
+[titles.cache]
+# Resolved titles are reused for `ttl` seconds. URLs that produced no title are
+# skipped for `negative_ttl`, and hosts that timed out or refused connections
+# for `host_failure_ttl`; those captures use the URL slug straight away.
+enabled = true
+memory_entries = 1024
+ttl = 2592000.0
+negative_ttl = 3600.0
+host_failure_ttl = 600.0
+
+[storage]
+# Captures are written by `io_workers` threads to a temporary file that is
+# renamed into place. fsync: "none", "file" or "file+dir" (also syncs the
+# directory entry after the rename).
+fsync = "file"
+io_workers = 4
+
+[pages]
+# A captured page is downloaded once into <root>/.dropsync/pages; its title is
+# parsed from that copy and readability/monolith read it instead of the URL.
+enabled = true
+ttl = 3600.0
+max_bytes = 10485760
+
+[index]
+# Captures and their readable text are indexed in <root>/.dropsync/index.sqlite
+# for GET /search and the DBus Search method.
+enabled = true
+max_text_bytes = 1048576
+
+[dedupe]
+# What capturing an already captured URL does ("existing", "update" or "new").
+# URLs are compared without tracking parameters, www., scheme or fragment.
+on_duplicate = "new"
+strip_params = []
+
+[rate_limits]
+# Token bucket per host shared by title fetches and processor jobs: `burst`
+# requests back to back, then `rate` per second. Rules can set `rate_limit` too.
+enabled = true
+default = { rate = 1.0, burst = 5 }
+
+# [rate_limits.domains]
+# "reddit.com" = { rate = 0.2, burst = 2 }
+
+[processors]
+# Upper bound on processor subprocesses running at once.
+max_concurrency = 4
+# Upper bound on concurrent processor jobs against a single domain.
+per_domain_concurrency = 2
+# Record jobs in <root>/.dropsync/jobs.sqlite so they survive daemon restarts.
+journal = true
+
 [processors.readability]
 enabled = true
+# "cli" runs `command`; "builtin" extracts Markdown in-process (see `workers`).
+backend = "cli"
 command = ["readability-cli"]
+workers = 2
+# Wall-clock timeout in seconds; the processor's whole process group is killed.
+timeout = 120.0
+# Scheduling and resource limits applied to the spawned process.
+nice = 10
+# ionice_class = 3
+# rlimit_as_mb = 2048
+# rlimit_cpu = 300
+
+# Optional persistent worker speaking the NDJSON protocol; falls back to
+# `command` when the worker cannot be started.
+# [processors.readability.worker]
+# enabled = true
+# command = ["python3", "-m", "dropsync.reference_worker"]
+# pool_size = 2
+# max_jobs = 200
+
+# Failed jobs are retried with exponential backoff (seconds) and jitter; after
+# max_attempts the (url, processor) pair lands on the dead-letter list.
+[processors.readability.retry]
+max_attempts = 3
+backoff = 30.0
+backoff_max = 3600.0
+jitter = 0.2
 
 [processors.monolith]
 enabled = true
 command = ["monolith", "--isolate", "--no-js"]
+max_concurrency = 2
+timeout = 300.0
 
 [processors.yt_dlp]
 enabled = true
@@ -131,10 +438,43 @@ command = [
     "-o",
     "%(title).200B.%(ext)s",
 ]
+max_concurrency = 1
+timeout = 3600.0
+
+# Media URLs arriving within `window` seconds (up to max_items) share one
+# invocation via the tool's batch-file input.
+[processors.yt_dlp.batch]
+enabled = true
+max_items = 20
+window = 2.0
 
 [processors.gallery_dl]
 enabled = true
 command = ["gallery-dl", "-D", "."]
+max_concurrency = 1
+timeout = 3600.0
+
+[processors.gallery_dl.batch]
+enabled = true
+max_items = 20
+window = 2.0
+
+# Extra processors need no code: declare a command, an output file next to the
+# stub, and the item types that trigger it. Rules can also request them via `post`.
+# [processors.classes]
+# heavy = 1
+#
+# [processors.custom.wayback]
+# command = ["curl", "-fsS", "-o", "/dev/null"]
+# args = ["https://web.archive.org/save/{url}"]
+# item_types = ["article"]
+# skip_if_done = false
+#
+# [processors.custom.screenshot]
+# command = ["chromium", "--headless", "--disable-gpu"]
+# args = ["--screenshot={output}", "{url}"]
+# output = "{stem}.png"
+# concurrency_class = "heavy"
 """
 
 
@@ -201,4 +541,26 @@ class ConfigManager:
         return self.config.model_dump()
 
 
-__all__ = ["ConfigManager", "DropSyncConfig", "DEFAULT_CONFIG_TEMPLATE"]
+__all__ = [
+    "AdaptiveTimeoutConfig",
+    "ConfigManager",
+    "DedupeConfig",
+    "DropSyncConfig",
+    "DuplicateAction",
+    "FsyncPolicy",
+    "BatchConfig",
+    "CustomProcessorConfig",
+    "HttpConfig",
+    "IndexConfig",
+    "PagesConfig",
+    "ProcessorConfig",
+    "RateLimitConfig",
+    "RateLimitsConfig",
+    "ReadabilityConfig",
+    "RetryConfig",
+    "StorageConfig",
+    "TitleCacheConfig",
+    "TitlesConfig",
+    "WorkerConfig",
+    "DEFAULT_CONFIG_TEMPLATE",
+]
@@ -4,12 +4,16 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
+from dbus_next import DBusError, ErrorType, Variant
 from dbus_next.aio import MessageBus
 from dbus_next.service import ServiceInterface, method, signal
 
+from .index import IndexedItem, InvalidCursorError, SearchHit
 from .server import CodePayload, Collector, FilePayload, NotePayload, UrlPayload
 
 logger = logging.getLogger("dropsync.dbus")
@@ -19,6 +23,45 @@ OBJECT_PATH = "/org/dropsync/Collector1"
 INTERFACE_NAME = "org.dropsync.Collector1"
 
 
+def _opt(opts: dict[str, Variant], key: str, default: Any) -> Any:
+    value = opts.get(key)
+    return value.value if value is not None else default
+
+
+def _item_to_dict(item: IndexedItem) -> dict[str, Variant]:
+    result = {
+        "path": Variant("s", str(item.path)),
+        "kind": Variant("s", item.kind),
+        "type": Variant("s", item.type),
+        "title": Variant("s", item.title),
+        "tags": Variant("as", item.tags),
+        "timestamp": Variant("s", item.timestamp),
+        "processors": Variant("as", item.outputs),
+    }
+    if item.url is not None:
+        result["url"] = Variant("s", item.url)
+    if item.domain is not None:
+        result["domain"] = Variant("s", item.domain)
+    return result
+
+
+def _hit_to_dict(hit: SearchHit) -> dict[str, Variant]:
+    result = _item_to_dict(hit.item)
+    result["snippet"] = Variant("s", hit.snippet)
+    result["score"] = Variant("d", hit.score)
+    return result
+
+
+def _opt_datetime(opts: dict[str, Variant], key: str) -> datetime | None:
+    value = _opt(opts, key, "")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise DBusError(ErrorType.INVALID_ARGS, f"{key}: {exc}") from exc
+
+
 class CollectorInterface(ServiceInterface):
     def __init__(self, collector: Collector) -> None:
         super().__init__(INTERFACE_NAME)
@@ -26,7 +69,14 @@ class CollectorInterface(ServiceInterface):
 
     @method()
     async def SaveUrl(self, url: "s", title: "s", selection: "s", opts: "a{sv}") -> "s":
-        payload = UrlPayload(url=url, title=title or None, selection=selection or None)
+        payload = UrlPayload(
+            url=url,
+            title=title or None,
+            selection=selection or None,
+            html=_opt(opts, "html", None),
+            html_compression=_opt(opts, "html_compression", "gzip"),
+            on_duplicate=_opt(opts, "on_duplicate", None),
+        )
         result = await self.collector.save_url(payload)
         return str(result.path)
 
@@ -48,10 +98,57 @@ class CollectorInterface(ServiceInterface):
         result = await self.collector.save_file(payload)
         return str(result.path)
 
+    @method()
+    async def SaveFileFd(self, name: "s", fd: "h", opts: "a{sv}") -> "s":
+        # dbus-next hands over a descriptor it does not close itself.
+        try:
+            result = await self.collector.save_file_fd(name, fd)
+        finally:
+            os.close(fd)
+        return str(result.path)
+
+    @method()
+    async def Search(self, query: "s", opts: "a{sv}") -> "aa{sv}":
+        hits = await self.collector.search(
+            query,
+            limit=max(1, min(int(_opt(opts, "limit", 20)), 200)),
+            kind=_opt(opts, "kind", None) or None,
+            domain=_opt(opts, "domain", None) or None,
+            tag=_opt(opts, "tag", None) or None,
+        )
+        if hits is None:
+            raise DBusError(ErrorType.FAILED, "item index is disabled")
+        return [_hit_to_dict(hit) for hit in hits]
+
+    @method()
+    async def ListItems(self, opts: "a{sv}") -> "aa{sv}s":
+        # Newest first; the second value is the cursor for the next page ("" on the last).
+        try:
+            page = await self.collector.list_items(
+                limit=max(1, min(int(_opt(opts, "limit", 50)), 500)),
+                cursor=_opt(opts, "cursor", None) or None,
+                newest_first=_opt(opts, "order", "newest") != "oldest",
+                kind=_opt(opts, "kind", None) or None,
+                item_type=_opt(opts, "type", None) or None,
+                domain=_opt(opts, "domain", None) or None,
+                tag=_opt(opts, "tag", None) or None,
+                since=_opt_datetime(opts, "since"),
+                until=_opt_datetime(opts, "until"),
+            )
+        except InvalidCursorError as exc:
+            raise DBusError(ErrorType.INVALID_ARGS, str(exc)) from exc
+        if page is None:
+            raise DBusError(ErrorType.FAILED, "item index is disabled")
+        return [[_item_to_dict(item) for item in page.items], page.next_cursor or ""]
+
     @signal()
     def ItemSaved(self, path: "s", item_type: "s") -> "ss":
         return [path, item_type]
 
+    @signal()
+    def ItemRenamed(self, old_path: "s", new_path: "s") -> "ss":
+        return [old_path, new_path]
+
 
 class DropSyncDBusService:
     """Manage lifecycle of the DropSync DBus service."""
@@ -61,15 +158,17 @@ class DropSyncDBusService:
         self._bus: Optional[MessageBus] = None
         self._interface = CollectorInterface(collector)
         self.collector.add_listener(self._emit_signal)
+        self.collector.add_rename_listener(self._emit_renamed)
 
     async def start(self) -> None:
         logger.info("Starting DBus service: %s", BUS_NAME)
-        self._bus = await MessageBus().connect()
+        self._bus = await MessageBus(negotiate_unix_fd=True).connect()
         self._bus.export(OBJECT_PATH, self._interface)
         await self._bus.request_name(BUS_NAME)
 
     async def stop(self) -> None:
         self.collector.remove_listener(self._emit_signal)
+        self.collector.remove_rename_listener(self._emit_renamed)
         if self._bus is None:
             return
         try:
@@ -84,5 +183,11 @@ class DropSyncDBusService:
         except Exception:  # pylint: disable=broad-except
             logger.exception("Failed to emit DBus ItemSaved signal")
 
+    def _emit_renamed(self, old_path: Path, new_path: Path) -> None:
+        try:
+            self._interface.ItemRenamed(str(old_path), str(new_path))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to emit DBus ItemRenamed signal")
+
 
 __all__ = ["DropSyncDBusService", "BUS_NAME", "OBJECT_PATH", "INTERFACE_NAME"]
@@ -0,0 +1,232 @@
+"""Canonical URLs and merging of items captured more than once."""
+
+from __future__ import annotations
+
+import fnmatch
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Mapping, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .config import FsyncPolicy
+from .utils import parse_front_matter, update_front_matter, write_text_file
+
+if TYPE_CHECKING:
+    from .index import IndexedItem
+
+logger = logging.getLogger("dropsync.dedupe")
+
+# Query parameters that only say where a click came from.
+TRACKING_PARAMS = frozenset(
+    {
+        "_hsenc",
+        "_hsmi",
+        "dclid",
+        "fbclid",
+        "gbraid",
+        "gclid",
+        "igshid",
+        "mc_cid",
+        "mc_eid",
+        "mkt_tok",
+        "msclkid",
+        "oly_anon_id",
+        "oly_enc_id",
+        "ref_src",
+        "ref_url",
+        "s_cid",
+        "twclid",
+        "vero_id",
+        "wbraid",
+        "yclid",
+    }
+)
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+
+# Host prefixes for the same site.
+_HOST_PREFIXES = ("www.", "m.", "mobile.")
+_DEFAULT_PORTS = {80, 443}
+
+# Closing line of every URL stub; not worth carrying over when merging.
+_STUB_FOOTER = "Captured via DropSync."
+
+Rewrite = Callable[[str, list[tuple[str, str]]], tuple[str, str, list[tuple[str, str]]]]
+
+
+def _youtube(path: str, query: list[tuple[str, str]]) -> tuple[str, str, list[tuple[str, str]]]:
+    parts = [part for part in path.split("/") if part]
+    if len(parts) == 2 and parts[0] in {"shorts", "embed", "live", "v"}:
+        return "youtube.com", "/watch", [("v", parts[1])]
+    if path == "/watch":
+        return "youtube.com", path, [(key, value) for key, value in query if key == "v"]
+    return "youtube.com", path, query
+
+
+def _youtu_be(path: str, query: list[tuple[str, str]]) -> tuple[str, str, list[tuple[str, str]]]:
+    video = path.strip("/")
+    if not video:
+        return "youtube.com", "/", []
+    return "youtube.com", "/watch", [("v", video)]
+
+
+def _reddit(path: str, query: list[tuple[str, str]]) -> tuple[str, str, list[tuple[str, str]]]:
+    # Share links carry share_id, context, ...; the thread is the path.
+    return "reddit.com", path, []
+
+
+def _x(path: str, query: list[tuple[str, str]]) -> tuple[str, str, list[tuple[str, str]]]:
+    return "x.com", path, []
+
+
+# Per-site rewrites, keyed by host after the common prefixes are removed.
+SITE_REWRITES: dict[str, Rewrite] = {
+    "youtube.com": _youtube,
+    "music.youtube.com": _youtube,
+    "youtu.be": _youtu_be,
+    "reddit.com": _reddit,
+    "old.reddit.com": _reddit,
+    "new.reddit.com": _reddit,
+    "np.reddit.com": _reddit,
+    "twitter.com": _x,
+    "x.com": _x,
+}
+
+
+def _is_tracking(key: str, extra: Sequence[str]) -> bool:
+    lowered = key.lower()
+    if lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PREFIXES):
+        return True
+    return any(fnmatch.fnmatchcase(lowered, pattern.lower()) for pattern in extra)
+
+
+def canonical_url(url: str, strip_params: Sequence[str] = ()) -> str:
+    """The form of ``url`` used to recognise a page captured before.
+
+    Only used as a lookup key: http and https are treated alike, the host is
+    lowercased without ``www.``/``m.``/``mobile.``, the default port,
+    fragment, trailing slash and tracking parameters (plus ``strip_params``)
+    are dropped, the remaining parameters are sorted, and known sites are
+    rewritten to one URL per page (``youtu.be/ID`` to ``youtube.com/watch?v=ID``).
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in {"http", "https"}:
+        return url.strip()
+    host = (parts.hostname or "").rstrip(".")
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix) :]
+            break
+    port = parts.port if parts.port not in _DEFAULT_PORTS else None
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(key, strip_params)
+    ]
+    rewrite = SITE_REWRITES.get(host)
+    if rewrite is not None:
+        host, path, query = rewrite(path, query)
+    netloc = f"{host}:{port}" if port is not None else host
+    return urlunsplit(("https", netloc, path, urlencode(sorted(query)), ""))
+
+
+def merge_into_stub(
+    stub: Path,
+    tags: Iterable[str] = (),
+    selection: str | None = None,
+    recaptured: str | None = None,
+    fsync: FsyncPolicy = "none",
+) -> bool:
+    """Fold a repeated capture into ``stub``; return whether the file changed.
+
+    New tags are added, a selection not yet in the stub is appended, and
+    ``recaptured`` records when the URL was captured again.
+    """
+
+    text = stub.read_text(encoding="utf-8")
+    metadata, _ = parse_front_matter(text)
+    current = metadata.get("tags") or []
+    current = current if isinstance(current, list) else [current]
+    updates: dict[str, object] = {}
+    merged = sorted({*current, *tags})
+    if merged != sorted(current):
+        updates["tags"] = merged
+    if recaptured:
+        updates["recaptured"] = recaptured
+    updated = update_front_matter(text, updates)
+    selection = (selection or "").strip()
+    if selection and selection not in updated:
+        updated = f"{updated.rstrip()}\n\n{selection}\n"
+    if updated == text:
+        return False
+    write_text_file(stub, updated, fsync)
+    return True
+
+
+@dataclass(slots=True)
+class DuplicateGroup:
+    canonical: str
+    keep: "IndexedItem"
+    duplicates: list["IndexedItem"]
+
+
+def plan_group(canonical: str, items: Sequence["IndexedItem"]) -> DuplicateGroup:
+    """Keep the item with the most processor output, the earliest one on a tie."""
+
+    ordered = sorted(items, key=lambda item: (-len(item.outputs), item.timestamp, item.id))
+    return DuplicateGroup(canonical=canonical, keep=ordered[0], duplicates=ordered[1:])
+
+
+def merge_group(
+    group: DuplicateGroup,
+    outputs_for: Callable[[Path], Mapping[str, Path]],
+    fsync: FsyncPolicy = "none",
+) -> list[Path]:
+    """Merge ``group`` into its kept item and delete the other stubs; return what was removed.
+
+    Processor output the kept item lacks is moved over from a duplicate
+    instead of being deleted. Tags are combined and the text of each
+    duplicate (its selection) is appended to the kept stub before the
+    duplicate is removed.
+    """
+
+    keep_outputs = outputs_for(group.keep.path)
+    removed: list[Path] = []
+    for duplicate in group.duplicates:
+        try:
+            _, body = parse_front_matter(duplicate.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            body = ""
+        text = body.removesuffix(_STUB_FOOTER).strip()
+        merge_into_stub(group.keep.path, duplicate.tags, selection=text, fsync=fsync)
+        for name, output in outputs_for(duplicate.path).items():
+            if not output.exists():
+                continue
+            target = keep_outputs.get(name)
+            if target is not None and not target.exists():
+                os.rename(output, target)
+            else:
+                output.unlink()
+        duplicate.path.unlink(missing_ok=True)
+        removed.append(duplicate.path)
+    logger.info(
+        "Merged %d duplicate(s) of %s into %s", len(removed), group.canonical, group.keep.path
+    )
+    return removed
+
+
+__all__ = [
+    "DuplicateGroup",
+    "SITE_REWRITES",
+    "TRACKING_PARAMS",
+    "canonical_url",
+    "merge_group",
+    "merge_into_stub",
+    "plan_group",
+]
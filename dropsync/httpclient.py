@@ -0,0 +1,248 @@
+"""Shared, pooled HTTP client for the daemon's own requests (title lookups).
+
+One :class:`SharedHttpClient` lives in ``AppState``: it is opened on startup
+and closed on shutdown, so consecutive captures from the same site reuse a
+kept-alive connection (and TLS session) instead of paying a fresh DNS lookup
+and handshake each time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import importlib.util
+import ipaddress
+import logging
+import socket
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import httpcore
+import httpx
+
+from .config import HttpConfig
+from .ratelimit import HostRateLimiter, RateLimitedTransport
+
+logger = logging.getLogger("dropsync.http")
+
+# httpcore errors as httpx raises them; the most specific class in the MRO wins.
+_HTTPCORE_ERRORS: dict[type[Exception], type[httpx.TransportError]] = {
+    httpcore.TimeoutException: httpx.TimeoutException,
+    httpcore.ConnectTimeout: httpx.ConnectTimeout,
+    httpcore.ReadTimeout: httpx.ReadTimeout,
+    httpcore.WriteTimeout: httpx.WriteTimeout,
+    httpcore.PoolTimeout: httpx.PoolTimeout,
+    httpcore.NetworkError: httpx.NetworkError,
+    httpcore.ConnectError: httpx.ConnectError,
+    httpcore.ReadError: httpx.ReadError,
+    httpcore.WriteError: httpx.WriteError,
+    httpcore.ProxyError: httpx.ProxyError,
+    httpcore.UnsupportedProtocol: httpx.UnsupportedProtocol,
+    httpcore.ProtocolError: httpx.ProtocolError,
+    httpcore.LocalProtocolError: httpx.LocalProtocolError,
+    httpcore.RemoteProtocolError: httpx.RemoteProtocolError,
+}
+
+
+@contextlib.contextmanager
+def _httpx_errors() -> Iterator[None]:
+    try:
+        yield
+    except Exception as exc:
+        for cls in type(exc).__mro__:
+            mapped = _HTTPCORE_ERRORS.get(cls)
+            if mapped is not None:
+                raise mapped(str(exc)) from exc
+        raise
+
+
+class CachingResolver(httpcore.AsyncNetworkBackend):
+    """Network backend that reuses ``getaddrinfo`` answers for ``ttl`` seconds.
+
+    TLS still uses the original host name for SNI and certificate checks; only
+    the TCP connect goes to the cached address.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float) -> None:
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            async with asyncio.timeout(timeout):
+                addresses = await self._resolve(host, port)
+        except TimeoutError as exc:
+            raise httpcore.ConnectTimeout(f"resolving {host} timed out") from exc
+        except OSError as exc:
+            raise httpcore.ConnectError(f"cannot resolve {host}: {exc}") from exc
+        error: httpcore.ConnectError | None = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address,
+                    port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except httpcore.ConnectError as exc:
+                error = exc
+        # Every address refused: the answer may be stale, resolve afresh next time.
+        self._cache.pop((host, port), None)
+        raise error or httpcore.ConnectError(f"no addresses for {host}")
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: float | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options
+        )
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+    async def _resolve(self, host: str, port: int) -> list[str]:
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        key = (host, port)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        self._cache[key] = (now + self._ttl, addresses)
+        return addresses
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: AsyncIterable[bytes]) -> None:
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class PoolTransport(httpx.AsyncBaseTransport):
+    """httpx transport over an ``httpcore.AsyncConnectionPool`` built by the caller.
+
+    ``httpx.AsyncHTTPTransport`` builds its own pool and takes no network
+    backend; this one lets ``SharedHttpClient`` pass the caching resolver in.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool) -> None:
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        assert isinstance(request.stream, httpx.AsyncByteStream)
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors():
+            response = await self.pool.handle_async_request(core_request)
+        assert isinstance(response.stream, AsyncIterable)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+class SharedHttpClient:
+    """Lifecycle wrapper around one pooled ``httpx.AsyncClient``."""
+
+    def __init__(self, cfg: HttpConfig, rate_limiter: HostRateLimiter | None = None) -> None:
+        self.cfg = cfg
+        self.rate_limiter = rate_limiter
+        self.client: httpx.AsyncClient | None = None
+        self.resolver: CachingResolver | None = None
+
+    async def start(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = self._build()
+        return self.client
+
+    async def close(self) -> None:
+        client, self.client = self.client, None
+        self.resolver = None
+        if client is not None:
+            await client.aclose()
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {"open": self.client is not None}
+        if self.resolver is not None:
+            stats["dns"] = {"hits": self.resolver.hits, "misses": self.resolver.misses}
+        return stats
+
+    def _build(self) -> httpx.AsyncClient:
+        cfg = self.cfg
+        http2 = cfg.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("http.http2 is enabled but the h2 package is missing; using HTTP/1.1")
+            http2 = False
+        backend: httpcore.AsyncNetworkBackend | None = None
+        if cfg.dns_cache_ttl > 0:
+            self.resolver = CachingResolver(httpcore.AnyIOBackend(), cfg.dns_cache_ttl)
+            backend = self.resolver
+        transport = PoolTransport(
+            httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive_connections,
+                keepalive_expiry=cfg.keepalive_expiry,
+                http1=True,
+                http2=http2,
+                network_backend=backend,
+            )
+        )
+        return httpx.AsyncClient(
+            transport=(
+                RateLimitedTransport(transport, self.rate_limiter)
+                if self.rate_limiter is not None
+                else transport
+            ),
+            timeout=cfg.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": cfg.user_agent},
+        )
+
+
+__all__ = ["CachingResolver", "PoolTransport", "SharedHttpClient"]
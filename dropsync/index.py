@@ -0,0 +1,597 @@
+"""SQLite index of captured items with FTS5 full-text search."""
+
+from __future__ import annotations
+
+import base64
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Mapping
+
+from .config import IndexConfig
+from .dedupe import canonical_url
+from .utils import parse_front_matter
+
+logger = logging.getLogger("dropsync.index")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    url TEXT,
+    canonical_url TEXT,
+    domain TEXT,
+    tags TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL DEFAULT '',
+    outputs TEXT NOT NULL DEFAULT '',
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_recent ON items(timestamp, id);
+CREATE INDEX IF NOT EXISTS items_domain ON items(domain);
+CREATE INDEX IF NOT EXISTS items_canonical ON items(canonical_url);
+CREATE TABLE IF NOT EXISTS item_tags (
+    tag TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    PRIMARY KEY (tag, item_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, body, readable, tags,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', lower(hex(randomblob(8))));
+"""
+
+_ITEM_COLUMNS = (
+    "items.id, items.path, items.kind, items.type, items.title, items.url, items.domain,"
+    " items.tags, items.timestamp, items.outputs"
+)
+
+# Column weights for bm25(): title, body, readable, tags.
+_RANK = "bm25(items_fts, 10.0, 2.0, 1.0, 5.0)"
+
+_TIMESTAMP_PREFIX = re.compile(r"^(\d{8}-\d{6})--")
+
+# Items written per transaction while reconciling with the folder.
+_RECONCILE_BATCH = 500
+
+OutputsFor = Callable[[Path], Mapping[str, Path]]
+Canonicalize = Callable[[str], str]
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor was not produced by ``ItemIndex.list_items``."""
+
+
+@dataclass(slots=True)
+class IndexedItem:
+    id: int
+    path: Path
+    kind: str
+    type: str
+    title: str
+    url: str | None
+    domain: str | None
+    tags: list[str]
+    timestamp: str
+    # Processors whose output file exists next to the item.
+    outputs: list[str]
+
+    @classmethod
+    def from_row(cls, row: tuple[Any, ...]) -> "IndexedItem":
+        return cls(
+            id=row[0],
+            path=Path(row[1]),
+            kind=row[2],
+            type=row[3],
+            title=row[4],
+            url=row[5],
+            domain=row[6],
+            tags=row[7].split(",") if row[7] else [],
+            timestamp=row[8],
+            outputs=row[9].split(",") if row[9] else [],
+        )
+
+
+@dataclass(slots=True)
+class SearchHit:
+    item: IndexedItem
+    snippet: str
+    score: float
+
+
+@dataclass(slots=True)
+class ItemPage:
+    items: list[IndexedItem]
+    # Pass back to list_items for the next page; None on the last one.
+    next_cursor: str | None
+
+
+@dataclass(slots=True)
+class _Document:
+    kind: str
+    type: str
+    title: str
+    url: str | None
+    domain: str | None
+    tags: list[str]
+    timestamp: str
+    outputs: list[str]
+    mtime: float
+    body: str = ""
+    readable: str = ""
+
+
+def index_path(root: Path) -> Path:
+    return root / ".dropsync" / "index.sqlite"
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, ``word*`` matches a prefix."""
+
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+def _encode_cursor(item: IndexedItem) -> str:
+    raw = f"{item.timestamp}|{item.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, item_id = raw.rsplit("|", 1)
+        return timestamp, int(item_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursorError(f"invalid cursor: {cursor!r}") from exc
+
+
+def _read_text(path: Path, max_bytes: int) -> str:
+    with path.open("rb") as handle:
+        return handle.read(max_bytes).decode("utf-8", errors="replace")
+
+
+def _split_name(path: Path) -> tuple[str, str]:
+    """Timestamp and title encoded in a capture's file name."""
+
+    match = _TIMESTAMP_PREFIX.match(path.stem)
+    if match is None:
+        return "", path.stem
+    return match.group(1), path.stem[match.end() :]
+
+
+def _as_list(value: Any) -> list[str]:
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [value] if value else []
+
+
+class ItemIndex:
+    """One row per capture (stubs, notes, code, files) plus an FTS5 table over their text.
+
+    Safe to call from the I/O pool threads: a lock serialises access to the
+    single connection. ``canonicalize`` turns an item's URL into the key
+    ``find_by_url`` and ``duplicate_groups`` look it up by.
+    """
+
+    def __init__(
+        self, path: Path, cfg: IndexConfig, canonicalize: Canonicalize = canonical_url
+    ) -> None:
+        self.path = path
+        self.cfg = cfg
+        self.canonicalize = canonicalize
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        migrated = self._migrate()
+        self._conn.executescript(_SCHEMA)
+        if migrated:
+            self.recanonicalize()
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.updates = 0
+
+    def _migrate(self) -> bool:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+        if columns and "canonical_url" not in columns:
+            self._conn.execute("ALTER TABLE items ADD COLUMN canonical_url TEXT")
+            return True
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def update(
+        self, path: Path, outputs: Mapping[str, Path] | None = None, is_file: bool = False
+    ) -> bool:
+        """(Re)index the capture at ``path``; return False if it is not (or no longer) one.
+
+        ``outputs`` maps processor names to their output paths for the item;
+        ``is_file`` marks uploads, which are indexed by name only.
+        """
+
+        document = self._read(path, outputs or {}, is_file)
+        with self._lock, self._transaction():
+            if document is None:
+                self._delete(path)
+                return False
+            self._upsert(path, document)
+        self.updates += 1
+        return True
+
+    def remove(self, path: Path) -> None:
+        with self._lock, self._transaction():
+            self._delete(path)
+
+    def rename(self, old: Path, new: Path) -> None:
+        with self._lock, self._transaction():
+            self._delete(new)
+            self._conn.execute("UPDATE items SET path = ? WHERE path = ?", (str(new), str(old)))
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        kind: str | None = None,
+        domain: str | None = None,
+        tag: str | None = None,
+    ) -> list[SearchHit]:
+        """Best matches for ``query`` (see ``fts_query``), optionally filtered."""
+
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = [
+            f"SELECT {_ITEM_COLUMNS},",
+            " snippet(items_fts, -1, '[', ']', '…', 12),",
+            f" {_RANK} AS score",
+            " FROM items_fts JOIN items ON items.id = items_fts.rowid",
+            " WHERE items_fts MATCH ?",
+        ]
+        params: list[Any] = [match]
+        if kind:
+            sql.append(" AND items.kind = ?")
+            params.append(kind)
+        if domain:
+            sql.append(" AND items.domain = ?")
+            params.append(domain)
+        if tag:
+            sql.append(" AND items.id IN (SELECT item_id FROM item_tags WHERE tag = ?)")
+            params.append(tag)
+        sql.append(" ORDER BY score LIMIT ?")
+        params.append(limit)
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute("".join(sql), params).fetchall()
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return [
+            SearchHit(item=IndexedItem.from_row(row[:10]), snippet=row[10], score=-row[11])
+            for row in rows
+        ]
+
+    def list_items(
+        self,
+        limit: int = 50,
+        cursor: str | None = None,
+        newest_first: bool = True,
+        kind: str | None = None,
+        item_type: str | None = None,
+        domain: str | None = None,
+        tag: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> ItemPage:
+        """A page of items ordered by capture time.
+
+        ``since`` (inclusive) and ``until`` (exclusive) are capture timestamps
+        (``YYYYMMDD-HHMMSS``, UTC). Raises InvalidCursorError for a bad cursor.
+        """
+
+        where: list[str] = []
+        params: list[Any] = []
+        for column, value in (
+            ("kind", kind),
+            ("type", item_type),
+            ("domain", domain),
+        ):
+            if value:
+                where.append(f"items.{column} = ?")
+                params.append(value)
+        if tag:
+            where.append("items.id IN (SELECT item_id FROM item_tags WHERE tag = ?)")
+            params.append(tag)
+        if since:
+            where.append("items.timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("items.timestamp < ?")
+            params.append(until)
+        if cursor:
+            # Keyset pagination: pages stay stable while new items arrive.
+            where.append(f"(items.timestamp, items.id) {'<' if newest_first else '>'} (?, ?)")
+            params.extend(_decode_cursor(cursor))
+        direction = "DESC" if newest_first else "ASC"
+        sql = f"SELECT {_ITEM_COLUMNS} FROM items"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY items.timestamp {direction}, items.id {direction} LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        items = [IndexedItem.from_row(row) for row in rows[:limit]]
+        next_cursor = _encode_cursor(items[-1]) if len(rows) > limit else None
+        return ItemPage(items=items, next_cursor=next_cursor)
+
+    def find_by_url(self, canonical: str) -> IndexedItem | None:
+        """The newest item whose URL canonicalizes to ``canonical``."""
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_ITEM_COLUMNS} FROM items WHERE items.canonical_url = ?"
+                " ORDER BY items.timestamp DESC, items.id DESC LIMIT 1",
+                (canonical,),
+            ).fetchone()
+        return IndexedItem.from_row(row) if row is not None else None
+
+    def duplicate_groups(self) -> dict[str, list[IndexedItem]]:
+        """Items sharing a canonical URL, oldest first, keyed by that URL."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT items.canonical_url, {_ITEM_COLUMNS} FROM items"
+                " WHERE items.canonical_url IN (SELECT canonical_url FROM items"
+                "  WHERE canonical_url IS NOT NULL GROUP BY canonical_url HAVING count(*) > 1)"
+                " ORDER BY items.canonical_url, items.timestamp, items.id"
+            ).fetchall()
+        groups: dict[str, list[IndexedItem]] = {}
+        for row in rows:
+            groups.setdefault(row[0], []).append(IndexedItem.from_row(row[1:]))
+        return groups
+
+    def recanonicalize(self) -> int:
+        """Recompute every stored canonical URL (after the rules changed); return how many moved."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, canonical_url FROM items WHERE url IS NOT NULL"
+            ).fetchall()
+            changed = [
+                (canonical, item_id)
+                for item_id, url, current in rows
+                if (canonical := self.canonicalize(url)) != current
+            ]
+            if changed:
+                with self._transaction():
+                    self._conn.executemany(
+                        "UPDATE items SET canonical_url = ? WHERE id = ?", changed
+                    )
+        return len(changed)
+
+    def version(self) -> str:
+        """Changes whenever the index does; used as the ETag of item listings."""
+
+        with self._lock:
+            values = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        return f"{values['instance']}-{values['generation']}"
+
+    def reconcile(self, root: Path, files_dir: Path, outputs_for: OutputsFor) -> dict[str, int]:
+        """Bring the index in line with ``root``: add new or changed captures, drop missing ones.
+
+        Unchanged items (same modification time) are not read again.
+        """
+
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM items").fetchall())
+        seen: set[str] = set()
+        pending: list[tuple[Path, _Document]] = []
+        counts = {"indexed": 0, "removed": 0, "unchanged": 0}
+        for path in self._walk(root):
+            is_file = path.is_relative_to(files_dir)
+            if not is_file and path.suffix != ".md":
+                continue
+            outputs = {} if is_file else outputs_for(path)
+            key = str(path)
+            try:
+                mtime = self._mtime(path, outputs)
+            except OSError:
+                continue
+            if known.get(key) == mtime:
+                seen.add(key)
+                counts["unchanged"] += 1
+                continue
+            document = self._read(path, outputs, is_file)
+            if document is None:
+                continue
+            seen.add(key)
+            pending.append((path, document))
+            if len(pending) >= _RECONCILE_BATCH:
+                counts["indexed"] += self._write_batch(pending)
+        counts["indexed"] += self._write_batch(pending)
+        missing = [Path(key) for key in known if key not in seen]
+        with self._lock, self._transaction():
+            for path in missing:
+                self._delete(path)
+        counts["removed"] = len(missing)
+        return counts
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            (items,) = self._conn.execute("SELECT count(*) FROM items").fetchone()
+        return {
+            "items": items,
+            "updates": self.updates,
+            "searches": self.searches,
+            "mean_search_ms": (
+                round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0
+            ),
+        }
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        changes = self._conn.total_changes
+        try:
+            yield
+            if self._conn.total_changes != changes:
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _write_batch(self, pending: list[tuple[Path, _Document]]) -> int:
+        count = len(pending)
+        if count:
+            with self._lock, self._transaction():
+                for path, document in pending:
+                    self._upsert(path, document)
+            pending.clear()
+        return count
+
+    def _upsert(self, path: Path, document: _Document) -> None:
+        values = (
+            document.kind,
+            document.type,
+            document.title,
+            document.url,
+            self.canonicalize(document.url) if document.url else None,
+            document.domain,
+            ",".join(document.tags),
+            document.timestamp,
+            ",".join(document.outputs),
+            document.mtime,
+        )
+        row = self._conn.execute("SELECT id FROM items WHERE path = ?", (str(path),)).fetchone()
+        if row is None:
+            cursor = self._conn.execute(
+                "INSERT INTO items (kind, type, title, url, canonical_url, domain, tags, timestamp,"
+                " outputs, mtime, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*values, str(path)),
+            )
+            item_id = cursor.lastrowid
+        else:
+            item_id = row[0]
+            self._conn.execute(
+                "UPDATE items SET kind = ?, type = ?, title = ?, url = ?, canonical_url = ?,"
+                " domain = ?, tags = ?, timestamp = ?, outputs = ?, mtime = ? WHERE id = ?",
+                (*values, item_id),
+            )
+            self._conn.execute("DELETE FROM items_fts WHERE rowid = ?", (item_id,))
+            self._conn.execute("DELETE FROM item_tags WHERE item_id = ?", (item_id,))
+        self._conn.execute(
+            "INSERT INTO items_fts (rowid, title, body, readable, tags) VALUES (?, ?, ?, ?, ?)",
+            (item_id, document.title, document.body, document.readable, " ".join(document.tags)),
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO item_tags (tag, item_id) VALUES (?, ?)",
+            [(tag, item_id) for tag in document.tags],
+        )
+
+    def _delete(self, path: Path) -> None:
+        row = self._conn.execute("SELECT id FROM items WHERE path = ?", (str(path),)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM items WHERE id = ?", row)
+        self._conn.execute("DELETE FROM items_fts WHERE rowid = ?", row)
+        self._conn.execute("DELETE FROM item_tags WHERE item_id = ?", row)
+
+    def _read(self, path: Path, outputs: Mapping[str, Path], is_file: bool) -> _Document | None:
+        try:
+            mtime = self._mtime(path, outputs)
+            if is_file:
+                timestamp, title = _split_name(path)
+                return _Document(
+                    kind="file",
+                    type=path.suffix.lstrip(".").lower(),
+                    title=title,
+                    url=None,
+                    domain=None,
+                    tags=[],
+                    timestamp=timestamp,
+                    outputs=[],
+                    mtime=mtime,
+                )
+            with path.open("rb") as handle:
+                if handle.read(4) != b"---\n":
+                    return None
+            metadata, body = parse_front_matter(_read_text(path, self.cfg.max_text_bytes))
+            kind = metadata.get("kind")
+            if not kind:
+                return None
+            timestamp, name_title = _split_name(path)
+            present = [name for name, output in outputs.items() if output.exists()]
+            readable = outputs.get("readability")
+            return _Document(
+                kind=str(kind),
+                type=str(metadata.get("type") or ""),
+                title=str(metadata.get("title") or name_title),
+                url=metadata.get("url") or None,
+                domain=metadata.get("domain") or None,
+                tags=_as_list(metadata.get("tags")),
+                timestamp=str(metadata.get("timestamp") or timestamp),
+                outputs=present,
+                mtime=mtime,
+                body=body,
+                readable=(
+                    _read_text(readable, self.cfg.max_text_bytes)
+                    if readable is not None and "readability" in present
+                    else ""
+                ),
+            )
+        except OSError:
+            return None
+
+    @staticmethod
+    def _mtime(path: Path, outputs: Mapping[str, Path]) -> float:
+        mtime = path.stat().st_mtime
+        for output in outputs.values():
+            try:
+                mtime = max(mtime, output.stat().st_mtime)
+            except OSError:
+                continue
+        return mtime
+
+    @staticmethod
+    def _walk(root: Path) -> Iterator[Path]:
+        # Hidden entries are DropSync's own state, Syncthing's, or in-progress writes.
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for name in filenames:
+                if not name.startswith("."):
+                    yield Path(directory, name)
+
+
+__all__ = [
+    "IndexedItem",
+    "InvalidCursorError",
+    "ItemIndex",
+    "ItemPage",
+    "SearchHit",
+    "fts_query",
+    "index_path",
+]
@@ -0,0 +1,301 @@
+"""Persistent journal of processor jobs."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Collection, Iterator
+
+logger = logging.getLogger("dropsync.journal")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner INTEGER,
+    owner_token TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    not_before REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs(name, url);
+"""
+
+_COLUMNS = (
+    "id, name, url, domain, priority, payload, state, attempts, error, not_before, updated_at,"
+    " owner, owner_token"
+)
+
+# Finished rows are kept for a while for debugging, then pruned.
+FINISHED_RETENTION_SECONDS = 7 * 24 * 3600
+
+_BOOT_ID_PATH = Path("/proc/sys/kernel/random/boot_id")
+
+
+@dataclass(slots=True)
+class JournalEntry:
+    id: int
+    name: str
+    url: str
+    domain: str
+    priority: int
+    payload: dict[str, Any]
+    state: str
+    attempts: int
+    error: str | None = None
+    not_before: float | None = None
+    updated_at: float = 0.0
+
+
+def journal_path(root: Path) -> Path:
+    return root / ".dropsync" / "jobs.sqlite"
+
+
+class JobJournal:
+    """SQLite (WAL) record of enqueued, running and finished processor jobs.
+
+    Writes use ``synchronous=NORMAL``: a commit is a WAL append without fsync,
+    so thousands of enqueues per minute stay cheap while still surviving a
+    daemon crash or restart.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+        self._owner = (os.getpid(), _process_token(os.getpid()))
+        self.prune()
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if columns and "not_before" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+        if columns and "owner_token" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_token TEXT")
+
+    def prune(self) -> int:
+        """Delete finished rows older than ``FINISHED_RETENTION_SECONDS``."""
+
+        return self._conn.execute(
+            "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - FINISHED_RETENTION_SECONDS),
+        ).rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def enqueue(
+        self,
+        name: str,
+        url: str,
+        domain: str,
+        priority: int,
+        payload: dict[str, Any],
+    ) -> int:
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT INTO jobs (name, url, domain, priority, payload, state, owner, owner_token,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, url, domain, priority, json.dumps(payload), PENDING, *self._owner, now, now),
+        )
+        return int(cursor.lastrowid or 0)
+
+    def mark_running(self, job_id: int) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, owner = ?, owner_token = ?, attempts = attempts + 1,"
+            " updated_at = ? WHERE id = ?",
+            (RUNNING, *self._owner, time.time(), job_id),
+        )
+
+    def mark_finished(self, job_id: int, ok: bool, error: str | None = None) -> None:
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                (DONE if ok else FAILED, error, now, job_id),
+            )
+            if ok:
+                # A later success supersedes earlier dead-letter entries for the same work.
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?"
+                    " AND (name, url) = (SELECT name, url FROM jobs WHERE id = ?)",
+                    (FAILED, now, DEAD, job_id),
+                )
+
+    def mark_retry(self, job_id: int, error: str, not_before: float) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, error = ?, not_before = ?, updated_at = ? WHERE id = ?",
+            (PENDING, error, not_before, time.time(), job_id),
+        )
+
+    def mark_dead(self, job_id: int, error: str) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, error = ?, not_before = NULL, updated_at = ? WHERE id = ?",
+            (DEAD, error, time.time(), job_id),
+        )
+
+    def is_dead(self, name: str, url: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM jobs WHERE name = ? AND url = ? AND state = ? LIMIT 1",
+            (name, url, DEAD),
+        ).fetchone()
+        return row is not None
+
+    def has_active(self, name: str, url: str, target: str) -> bool:
+        """Whether another live process has this exact job queued or running."""
+
+        rows = self._conn.execute(
+            "SELECT payload, owner, owner_token FROM jobs WHERE name = ? AND url = ? AND state IN (?, ?)",
+            (name, url, PENDING, RUNNING),
+        ).fetchall()
+        for payload, owner, token in rows:
+            if owner is None or owner == self._owner[0]:
+                continue
+            if json.loads(payload).get("target") == target and _owner_alive(owner, token):
+                return True
+        return False
+
+    def dead_letters(self, limit: int | None = None) -> list[JournalEntry]:
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE state = ? ORDER BY updated_at DESC LIMIT ?",
+            (DEAD, -1 if limit is None else limit),
+        ).fetchall()
+        return [_entry_from_row(row) for row in rows]
+
+    def requeue_dead(self, ids: Collection[int] | None = None) -> int:
+        """Move dead-letter entries back to pending with a fresh attempt budget."""
+
+        query = (
+            "UPDATE jobs SET state = ?, attempts = 0, owner = NULL, owner_token = NULL, not_before = NULL,"
+            " updated_at = ? WHERE state = ?"
+        )
+        params: list[Any] = [PENDING, time.time(), DEAD]
+        if ids is not None:
+            if not ids:
+                return 0
+            query += f" AND id IN ({', '.join('?' for _ in ids)})"
+            params.extend(ids)
+        return self._conn.execute(query, params).rowcount
+
+    def claim_unfinished(self, active: Collection[int] = ()) -> list[JournalEntry]:
+        """Take over pending or interrupted jobs that no live process is handling.
+
+        ``active`` lists job ids this process already has queued, so periodic
+        sweeps only pick up work left behind by dead or other finished runs.
+        """
+
+        me = self._owner[0]
+        claimed: list[JournalEntry] = []
+        # Read and claim under one write lock so two processes sweeping at the
+        # same time cannot both take the same orphaned row.
+        with self._transaction():
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE state IN (?, ?) ORDER BY priority, id",
+                (PENDING, RUNNING),
+            ).fetchall()
+            for row in rows:
+                owner, token = row[11], row[12]
+                if row[0] in active:
+                    continue
+                if owner is not None and owner != me and _owner_alive(owner, token):
+                    continue
+                updated = self._conn.execute(
+                    "UPDATE jobs SET state = ?, owner = ?, owner_token = ?, updated_at = ?"
+                    " WHERE id = ? AND state IN (?, ?) AND owner IS ? AND owner_token IS ?",
+                    (PENDING, *self._owner, time.time(), row[0], PENDING, RUNNING, owner, token),
+                ).rowcount
+                if updated:
+                    claimed.append(_entry_from_row(row))
+        return claimed
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+
+def _entry_from_row(row: tuple[Any, ...]) -> JournalEntry:
+    return JournalEntry(
+        id=row[0],
+        name=row[1],
+        url=row[2],
+        domain=row[3],
+        priority=row[4],
+        payload=json.loads(row[5]),
+        state=row[6],
+        attempts=row[7],
+        error=row[8],
+        not_before=row[9],
+        updated_at=row[10],
+    )
+
+
+def _owner_alive(pid: int, token: str | None) -> bool:
+    """Whether the process that recorded ``(pid, token)`` is still running.
+
+    The token pins the PID to one process incarnation, so a recycled PID does
+    not keep orphaned jobs claimed forever.
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    if token is None:
+        return True
+    current = _process_token(pid)
+    return current is None or current == token
+
+
+def _process_token(pid: int) -> str | None:
+    """Boot id plus process start time, or None where /proc is unavailable."""
+
+    try:
+        boot_id = _BOOT_ID_PATH.read_text(encoding="ascii").strip()
+        stat = Path(f"/proc/{pid}/stat").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    # Field 22 (starttime) follows the parenthesised command name, which may contain spaces.
+    fields = stat.rpartition(")")[2].split()
+    if len(fields) < 20:
+        return None
+    return f"{boot_id}:{fields[19]}"
+
+
+__all__ = ["JobJournal", "JournalEntry", "journal_path"]
@@ -0,0 +1,213 @@
+"""Per-domain latency tracking, adaptive timeouts and a circuit breaker."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .config import AdaptiveTimeoutConfig
+
+logger = logging.getLogger("dropsync.latency")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain TEXT PRIMARY KEY,
+    srtt REAL,
+    rttvar REAL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    open_until REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    backoff INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Smoothing gains from RFC 6298 (TCP retransmission timer).
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+
+# Rows not touched for this long are dropped when the store is opened.
+_RETENTION_SECONDS = 90 * 24 * 3600
+
+
+@dataclass(slots=True)
+class DomainStats:
+    domain: str
+    srtt: float | None = None
+    rttvar: float | None = None
+    samples: int = 0
+    # Consecutive timeouts or connection failures.
+    failures: int = 0
+    open_until: float = 0.0
+    updated_at: float = 0.0
+    # Timeouts since the last response; each one doubles the budget.
+    backoff: int = 0
+
+
+def latency_path(root: Path) -> Path:
+    return root / ".dropsync" / "domains.sqlite"
+
+
+class LatencyTracker:
+    """Learns how fast each domain answers and how long to wait for it.
+
+    The timeout budget is ``srtt + deviations * rttvar`` (smoothed latency plus
+    a multiple of its mean deviation), clamped between ``min_timeout`` and the
+    configured ceiling. As in RFC 6298 every timeout doubles the budget until
+    the next response, so a domain that is only slower than usual gets more
+    time instead of failing again. After ``failure_threshold`` consecutive
+    timeouts at the ceiling or connection failures the breaker opens and the
+    domain is not fetched for ``cooldown`` seconds; then one probe is let
+    through, which either closes the breaker or re-opens it.
+    """
+
+    def __init__(self, path: Path | None, cfg: AdaptiveTimeoutConfig) -> None:
+        self.path = path
+        self.cfg = cfg
+        self._domains: dict[str, DomainStats] = {}
+        self._conn: sqlite3.Connection | None = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._migrate(self._conn)
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "DELETE FROM domains WHERE updated_at < ?", (time.time() - _RETENTION_SECONDS,)
+            )
+            for row in self._conn.execute(
+                "SELECT domain, srtt, rttvar, samples, failures, open_until, updated_at, backoff"
+                " FROM domains"
+            ):
+                self._domains[row[0]] = DomainStats(*row)
+        self.skipped = 0
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(domains)")}
+        if columns and "backoff" not in columns:
+            conn.execute("ALTER TABLE domains ADD COLUMN backoff INTEGER NOT NULL DEFAULT 0")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def timeout_for(self, domain: str, ceiling: float) -> float:
+        stats = self._domains.get(domain)
+        if stats is None or stats.srtt is None or stats.rttvar is None:
+            return ceiling
+        budget = max(self.cfg.min_timeout, stats.srtt + self.cfg.deviations * stats.rttvar)
+        return min(ceiling, budget * 2**stats.backoff)
+
+    def allow(self, domain: str) -> bool:
+        """Whether to fetch from ``domain`` now; False while its breaker is open."""
+
+        stats = self._domains.get(domain)
+        if stats is None or stats.failures < self.cfg.failure_threshold:
+            return True
+        now = time.time()
+        if stats.open_until > now:
+            self.skipped += 1
+            return False
+        # Half-open: this caller is the probe; everyone else waits another cooldown.
+        stats.open_until = now + self.cfg.cooldown
+        self._save(stats)
+        return True
+
+    def record_success(self, domain: str, elapsed: float) -> None:
+        stats = self._domains.setdefault(domain, DomainStats(domain))
+        if stats.srtt is None or stats.rttvar is None:
+            stats.srtt = elapsed
+            stats.rttvar = elapsed / 2
+        else:
+            stats.rttvar = (1 - _BETA) * stats.rttvar + _BETA * abs(stats.srtt - elapsed)
+            stats.srtt = (1 - _ALPHA) * stats.srtt + _ALPHA * elapsed
+        stats.samples += 1
+        stats.failures = 0
+        stats.backoff = 0
+        stats.open_until = 0.0
+        self._save(stats)
+
+    def record_timeout(self, domain: str, budget: float, ceiling: float) -> None:
+        """A fetch given ``budget`` seconds timed out; only a timeout at ``ceiling`` is a failure."""
+
+        if budget < ceiling:
+            stats = self._domains.setdefault(domain, DomainStats(domain))
+            stats.backoff += 1
+            self._save(stats)
+            return
+        self.record_failure(domain)
+
+    def record_failure(self, domain: str) -> None:
+        """A timeout at the ceiling or a connection failure; counts toward the breaker."""
+
+        stats = self._domains.setdefault(domain, DomainStats(domain))
+        stats.failures += 1
+        if stats.failures >= self.cfg.failure_threshold:
+            if stats.failures == self.cfg.failure_threshold:
+                logger.info(
+                    "Skipping title fetches from %s for %.0fs after %d failures",
+                    domain,
+                    self.cfg.cooldown,
+                    stats.failures,
+                )
+            stats.open_until = time.time() + self.cfg.cooldown
+        self._save(stats)
+
+    def stats(self, ceiling: float, limit: int = 50) -> dict[str, Any]:
+        """Summary for ``GET /stats``: open breakers first, then the slowest domains."""
+
+        now = time.time()
+        ordered = sorted(
+            self._domains.values(),
+            key=lambda entry: (entry.open_until <= now, -(entry.srtt or 0.0)),
+        )
+        return {
+            "tracked": len(self._domains),
+            "skipped": self.skipped,
+            "domains": [
+                {
+                    "domain": entry.domain,
+                    "srtt": round(entry.srtt, 4) if entry.srtt is not None else None,
+                    "rttvar": round(entry.rttvar, 4) if entry.rttvar is not None else None,
+                    "timeout": round(self.timeout_for(entry.domain, ceiling), 3),
+                    "samples": entry.samples,
+                    "failures": entry.failures,
+                    "open_for": max(0.0, round(entry.open_until - now, 1)),
+                }
+                for entry in ordered[:limit]
+            ],
+        }
+
+    def _save(self, stats: DomainStats) -> None:
+        stats.updated_at = time.time()
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO domains"
+                " (domain, srtt, rttvar, samples, failures, open_until, updated_at, backoff)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    stats.domain,
+                    stats.srtt,
+                    stats.rttvar,
+                    stats.samples,
+                    stats.failures,
+                    stats.open_until,
+                    stats.updated_at,
+                    stats.backoff,
+                ),
+            )
+        except sqlite3.Error:
+            logger.exception("Failed to persist latency stats for %s", stats.domain)
+
+
+__all__ = ["DomainStats", "LatencyTracker", "latency_path"]
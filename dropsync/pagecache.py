@@ -0,0 +1,439 @@
+"""Fetch-once page cache shared by title parsing and processors.
+
+A captured page is downloaded once into ``<root>/.dropsync/pages``. The title
+is parsed while the body streams in (and handed back as soon as it is settled,
+the download carries on in the background), and readability and monolith are
+then pointed at the local copy instead of fetching the URL again. Clients that
+already hold the rendered page can supply it instead (see ``decode_html_payload``
+and ``decode_html_stream``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import codecs
+import functools
+import hashlib
+import json
+import logging
+import time
+import zlib
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, Literal, TypeVar
+
+import httpx
+
+from .config import PagesConfig
+from .titlecache import cache_key
+from .utils import (
+    _HTML_CONTENT_TYPES,
+    AtomicFileWriter,
+    TitleMetadata,
+    _MetaTitleParser,
+    title_from_html,
+)
+
+logger = logging.getLogger("dropsync.pages")
+
+T = TypeVar("T")
+
+# Expired pages are swept at most this often.
+_PRUNE_INTERVAL = 300.0
+
+# Client-supplied HTML is decoded and written in chunks of this size.
+_DECODE_CHUNK_BYTES = 64 * 1024
+
+HtmlCompression = Literal["gzip", "deflate", "identity"]
+_ZLIB_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+class InvalidHtmlPayloadError(ValueError):
+    """Client-supplied HTML is not valid base64 or does not decompress."""
+
+
+@dataclass(slots=True)
+class CachedPage:
+    url: str
+    # Where the download ended up after redirects; processors use it as base URL.
+    final_url: str
+    encoding: str
+    size: int
+    # The body was cut short at `pages.max_bytes`.
+    truncated: bool
+    fetched_at: float
+    path: Path
+
+    def read_text(self, max_bytes: int | None = None) -> str:
+        with self.path.open("rb") as handle:
+            data = handle.read(-1 if max_bytes is None else max_bytes)
+        return data.decode(self.encoding, errors="replace")
+
+
+def page_cache_path(root: Path) -> Path:
+    return root / ".dropsync" / "pages"
+
+
+def decode_html_payload(data: str, compression: HtmlCompression) -> Iterator[bytes]:
+    """Yield the HTML a client supplied, decoded chunk by chunk.
+
+    ``gzip`` and ``deflate`` (zlib) payloads are base64 encoded; ``identity``
+    is the document itself. Stopping early never inflates the rest.
+    """
+
+    if compression == "identity":
+        for start in range(0, len(data), _DECODE_CHUNK_BYTES):
+            yield data[start : start + _DECODE_CHUNK_BYTES].encode("utf-8")
+        return
+    decompressor = zlib.decompressobj(_ZLIB_WBITS[compression])
+    # A multiple of 4 characters decodes to whole bytes.
+    step = _DECODE_CHUNK_BYTES // 3 * 4
+    try:
+        for start in range(0, len(data), step):
+            pending = base64.b64decode(data[start : start + step], validate=True)
+            while pending:
+                chunk = decompressor.decompress(pending, _DECODE_CHUNK_BYTES)
+                pending = decompressor.unconsumed_tail
+                if chunk:
+                    yield chunk
+        tail = decompressor.flush()
+    except (binascii.Error, zlib.error) as exc:
+        raise InvalidHtmlPayloadError(f"invalid {compression} html: {exc}") from exc
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise InvalidHtmlPayloadError(f"truncated {compression} html")
+
+
+async def decode_html_stream(
+    chunks: AsyncIterable[bytes], compression: HtmlCompression
+) -> AsyncIterator[bytes]:
+    """Yield an uploaded document, decompressed as its chunks arrive.
+
+    Unlike ``decode_html_payload`` the body is the compressed bytes themselves
+    (no base64), as sent with a ``Content-Encoding`` header.
+    """
+
+    if compression == "identity":
+        async for chunk in chunks:
+            yield chunk
+        return
+    decompressor = zlib.decompressobj(_ZLIB_WBITS[compression])
+    try:
+        async for pending in chunks:
+            while pending:
+                chunk = decompressor.decompress(pending, _DECODE_CHUNK_BYTES)
+                pending = decompressor.unconsumed_tail
+                if chunk:
+                    yield chunk
+        tail = decompressor.flush()
+    except zlib.error as exc:
+        raise InvalidHtmlPayloadError(f"invalid {compression} html: {exc}") from exc
+    if tail:
+        yield tail
+    if not decompressor.eof:
+        raise InvalidHtmlPayloadError(f"truncated {compression} html")
+
+
+class _PageFetch:
+    """One in-flight download: the title future settles before the page does."""
+
+    def __init__(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.title: asyncio.Future[TitleMetadata | None] = loop.create_future()
+        # The title may have no consumer (prefetch only); don't log its errors as unretrieved.
+        self.title.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self.task: asyncio.Task[CachedPage | None] | None = None
+
+
+class PageCache:
+    """Downloads each URL once and keeps the body for ``ttl`` seconds.
+
+    File operations (writes, renames, lookups, pruning) run on ``executor``,
+    the daemon's capture I/O pool, or asyncio's default one when it is None.
+    """
+
+    def __init__(self, directory: Path, cfg: PagesConfig, executor: Executor | None = None) -> None:
+        self.directory = directory
+        self.cfg = cfg
+        self.executor = executor
+        self._inflight: dict[str, _PageFetch] = {}
+        self._next_prune = 0.0
+        self.fetches = 0
+        self.supplied = 0
+        self.hits = 0
+        self.failures = 0
+
+    def entry_path(self, url: str) -> Path:
+        digest = hashlib.sha256(cache_key(url).encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{digest}.html"
+
+    async def get(self, url: str) -> CachedPage | None:
+        """The stored copy of ``url`` if it is fresh."""
+
+        return await self._run(self._lookup, url)
+
+    def _lookup(self, url: str) -> CachedPage | None:
+        meta_path = self.entry_path(url).with_suffix(".json")
+        try:
+            data = json.loads(meta_path.read_text(encoding="utf-8"))
+            page = CachedPage(**{**data, "path": self.entry_path(url)})
+        except (OSError, ValueError, TypeError):
+            return None
+        if page.fetched_at + self.cfg.ttl <= time.time() or not page.path.exists():
+            return None
+        return page
+
+    def prefetch(self, client: httpx.AsyncClient, url: str, timeout: float) -> None:
+        """Start downloading ``url`` unless it is cached or already on its way."""
+
+        self._start(client, url, timeout)
+
+    async def fetch_title(
+        self, client: httpx.AsyncClient, url: str, timeout: float, max_bytes: int
+    ) -> TitleMetadata | None:
+        """Title of ``url``, from the stored copy or from a download started for it.
+
+        Raises the download's ``httpx.HTTPError`` like a plain title lookup would.
+        """
+
+        page = await self.get(url)
+        if page is not None:
+            self.hits += 1
+            return title_from_html(await self._run(page.read_text, max_bytes))
+        fetch = self._start(client, url, timeout, max_bytes)
+        return await asyncio.shield(fetch.title)
+
+    async def store(
+        self,
+        url: str,
+        chunks: Iterable[bytes] | AsyncIterable[bytes],
+        encoding: str = "utf-8",
+        executor: Executor | None = None,
+    ) -> CachedPage:
+        """Keep a document the client supplied for ``url``, replacing any download of it.
+
+        ``chunks`` are decoded and written on ``executor`` (by default the cache's
+        own); an async iterable is consumed on the loop and each chunk written there.
+        """
+
+        fetch = self._inflight.pop(cache_key(url), None)
+        if fetch is not None and fetch.task is not None:
+            fetch.task.cancel()
+        executor = executor or self.executor
+        if isinstance(chunks, AsyncIterable):
+            page = await self._write_streamed(url, chunks, encoding, executor)
+        else:
+            page = await asyncio.get_running_loop().run_in_executor(
+                executor, self._write_supplied, url, chunks, encoding
+            )
+        self.supplied += 1
+        return page
+
+    def _write_supplied(self, url: str, chunks: Iterable[bytes], encoding: str) -> CachedPage:
+        writer = AtomicFileWriter(self.entry_path(url))
+        truncated = False
+        try:
+            for chunk in chunks:
+                room = self.cfg.max_bytes - writer.size
+                writer.write(chunk[:room])
+                if len(chunk) > room:
+                    truncated = True
+                    break
+        except BaseException:
+            writer.discard()
+            raise
+        return self._commit(url, url, encoding, writer, truncated)
+
+    async def _write_streamed(
+        self, url: str, chunks: AsyncIterable[bytes], encoding: str, executor: Executor | None
+    ) -> CachedPage:
+        loop = asyncio.get_running_loop()
+        writer = await loop.run_in_executor(executor, AtomicFileWriter, self.entry_path(url))
+        truncated = False
+        try:
+            async for chunk in chunks:
+                room = self.cfg.max_bytes - writer.size
+                await loop.run_in_executor(executor, writer.write, chunk[:room])
+                if len(chunk) > room:
+                    truncated = True
+                    break
+        except BaseException:
+            writer.discard()
+            raise
+        return await loop.run_in_executor(
+            executor, self._commit, url, url, encoding, writer, truncated
+        )
+
+    async def wait(self, url: str) -> CachedPage | None:
+        """The page once its download (if one is running) has finished."""
+
+        fetch = self._inflight.get(cache_key(url))
+        if fetch is not None and fetch.task is not None:
+            try:
+                return await asyncio.shield(fetch.task)
+            except asyncio.CancelledError:
+                # Only the download was cancelled (replaced by a supplied page).
+                if not fetch.task.cancelled():
+                    raise
+        return await self.get(url)
+
+    def prune(self) -> int:
+        """Delete expired pages; return how many were removed."""
+
+        removed = 0
+        cutoff = time.time() - self.cfg.ttl
+        try:
+            entries = list(self.directory.glob("*.html"))
+        except OSError:
+            return 0
+        for path in entries:
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                path.with_suffix(".json").unlink(missing_ok=True)
+                path.unlink(missing_ok=True)
+                removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "fetches": self.fetches,
+            "supplied": self.supplied,
+            "hits": self.hits,
+            "failures": self.failures,
+            "in_flight": len(self._inflight),
+        }
+
+    async def close(self) -> None:
+        fetches, self._inflight = list(self._inflight.values()), {}
+        tasks = [fetch.task for fetch in fetches if fetch.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        timeout: float,
+        title_bytes: int | None = None,
+    ) -> _PageFetch:
+        key = cache_key(url)
+        fetch = self._inflight.get(key)
+        if fetch is not None:
+            return fetch
+        fetch = _PageFetch()
+        self._inflight[key] = fetch
+        fetch.task = asyncio.create_task(
+            self._download(fetch, client, url, timeout, title_bytes or self.cfg.max_bytes)
+        )
+        fetch.task.add_done_callback(functools.partial(self._finished, key, fetch))
+        return fetch
+
+    def _finished(self, key: str, fetch: _PageFetch, _task: asyncio.Task[Any]) -> None:
+        # A supplied document may have replaced (and cancelled) this download.
+        if self._inflight.get(key) is fetch:
+            del self._inflight[key]
+
+    async def _download(
+        self,
+        fetch: _PageFetch,
+        client: httpx.AsyncClient,
+        url: str,
+        timeout: float,
+        title_bytes: int,
+    ) -> CachedPage | None:
+        cached = await self.get(url)
+        if cached is not None:
+            fetch.title.set_result(None)
+            return cached
+        self.fetches += 1
+        parser = _MetaTitleParser()
+        path = self.entry_path(url)
+        writer: AtomicFileWriter | None = None
+        try:
+            async with client.stream("GET", url, timeout=timeout) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0]
+                if content_type.strip().lower() not in _HTML_CONTENT_TYPES | {""}:
+                    return None
+                encoding = response.encoding or "utf-8"
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                writer = await self._run(AtomicFileWriter, path)
+                truncated = False
+                async for chunk in response.aiter_bytes():
+                    room = self.cfg.max_bytes - writer.size
+                    await self._run(writer.write, chunk[:room])
+                    if not fetch.title.done():
+                        parser.feed(decoder.decode(chunk[:room]))
+                        if parser.done or writer.size >= title_bytes:
+                            fetch.title.set_result(parser.result())
+                    if len(chunk) > room:
+                        truncated = True
+                        break
+            page = await self._run(
+                self._commit, url, str(response.url), encoding, writer, truncated
+            )
+            writer = None
+            return page
+        except Exception as exc:
+            self.failures += 1
+            if not fetch.title.done():
+                fetch.title.set_exception(exc)
+            if not isinstance(exc, httpx.HTTPError):
+                logger.exception("Failed to store page %s", url)
+            return None
+        finally:
+            if writer is not None:
+                # Failure or cancellation only; dropping the temporary file is cheap.
+                writer.discard()
+            if not fetch.title.done():
+                fetch.title.set_result(parser.result())
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _commit(
+        self, url: str, final_url: str, encoding: str, writer: AtomicFileWriter, truncated: bool
+    ) -> CachedPage:
+        page = CachedPage(
+            url=url,
+            final_url=final_url,
+            encoding=encoding,
+            size=writer.size,
+            truncated=truncated,
+            fetched_at=time.time(),
+            path=writer.commit(),
+        )
+        meta = AtomicFileWriter(page.path.with_suffix(".json"))
+        metadata = {key: value for key, value in asdict(page).items() if key != "path"}
+        meta.write(json.dumps(metadata).encode("utf-8"))
+        meta.commit()
+        self._maybe_prune()
+        return page
+
+    def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + _PRUNE_INTERVAL
+        removed = self.prune()
+        if removed:
+            logger.debug("Pruned %d cached page(s)", removed)
+
+
+__all__ = [
+    "CachedPage",
+    "HtmlCompression",
+    "InvalidHtmlPayloadError",
+    "PageCache",
+    "decode_html_payload",
+    "decode_html_stream",
+    "page_cache_path",
+]
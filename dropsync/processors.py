@@ -3,14 +3,39 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
+import multiprocessing
+import os
+import random
+import resource
 import shutil
-from dataclasses import dataclass
+import signal
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Any, Awaitable, Callable, List, Sequence
 
-from .config import ConfigManager, DropSyncConfig
-from .utils import ItemPaths, write_text_file
+import httpx
+
+from .config import (
+    BatchConfig,
+    ConfigManager,
+    DropSyncConfig,
+    ProcessorConfig,
+    RetryConfig,
+)
+from .httpclient import SharedHttpClient
+from .journal import JobJournal, JournalEntry, journal_path
+from .pagecache import CachedPage, PageCache, page_cache_path
+from .ratelimit import PREPAID_EXTENSION, HostRateLimiter
+from .readability import extract_readable_markdown
+from .registry import BUILTIN_PROCESSORS, ProcessorRegistry, ProcessorSpec, default_registry
+from .scheduler import JobScheduler, Priority, SchedulerLimits
+from .utils import AtomicFileWriter, ItemPaths
+from .workers import WorkerPool, WorkerUnavailableError
 
 logger = logging.getLogger("dropsync.processors")
 
@@ -21,6 +46,7 @@ class UrlItem:
     paths: ItemPaths
     domain: str
     item_type: str
+    priority: Priority = Priority.INTERACTIVE
 
 
 @dataclass(slots=True)
@@ -29,132 +55,482 @@ class ProcessorJob:
     command: List[str]
     cwd: Path
     capture_stdout_to: Path | None = None
+    output: Path | None = None
+    # In-process engine used instead of ``command`` (e.g. "builtin" readability).
+    engine: str | None = None
+    url: str = ""
+    domain: str = ""
+    priority: Priority = Priority.INTERACTIVE
+    # Local copy of the page in the page cache, and the command that reads it.
+    input: Path | None = None
+    input_command: List[str] = field(default_factory=list)
+    # The capture the job belongs to; media jobs write elsewhere.
+    stub: Path | None = None
+    job_id: int | None = None
+    attempts: int = 0
+    # Set on batch jobs: the individual jobs sharing one invocation.
+    members: List["ProcessorJob"] = field(default_factory=list)
+
+    @property
+    def target(self) -> str:
+        """Where the job's result lands; media jobs write into their working directory."""
+
+        return str(self.output or self.capture_stdout_to or self.cwd)
+
+    @property
+    def dedup_key(self) -> tuple[str, str, str]:
+        return (self.name, self.url, self.target)
+
+    def to_payload(self) -> dict[str, Any]:
+        return {
+            "command": list(self.command),
+            "cwd": str(self.cwd),
+            "capture_stdout_to": str(self.capture_stdout_to) if self.capture_stdout_to else None,
+            "output": str(self.output) if self.output else None,
+            "engine": self.engine,
+            "target": self.target,
+            "input": str(self.input) if self.input else None,
+            "input_command": list(self.input_command),
+            "stub": str(self.stub) if self.stub else None,
+        }
+
+    @classmethod
+    def from_journal(cls, entry: JournalEntry) -> "ProcessorJob":
+        payload = entry.payload
+        capture = payload.get("capture_stdout_to")
+        output = payload.get("output")
+        page = payload.get("input")
+        stub = payload.get("stub")
+        return cls(
+            name=entry.name,
+            command=list(payload["command"]),
+            cwd=Path(payload["cwd"]),
+            capture_stdout_to=Path(capture) if capture else None,
+            output=Path(output) if output else None,
+            engine=payload.get("engine"),
+            url=entry.url,
+            domain=entry.domain,
+            priority=Priority(entry.priority),
+            input=Path(page) if page else None,
+            input_command=list(payload.get("input_command") or []),
+            stub=Path(stub) if stub else None,
+            job_id=entry.id,
+            attempts=entry.attempts,
+        )
+
+
+JobFinishedListener = Callable[[ProcessorJob], Awaitable[None] | None]
+
+# How often the daemon looks for journaled work it does not own yet
+# (requeued dead letters, jobs left behind by an exited `dropsync organize`).
+JOURNAL_SWEEP_SECONDS = 60.0
+
+# Processor output is streamed in chunks; only the end of stderr is kept for logs.
+STREAM_CHUNK_BYTES = 64 * 1024
+STDERR_TAIL_BYTES = 8 * 1024
+
+KILL_GRACE_SECONDS = 5.0
+
+
+@dataclass(frozen=True, slots=True)
+class BatchProtocol:
+    """How a media tool reads a batch of URLs and reports per-URL outcomes.
+
+    ``result_flags`` are followed by a file path the tool appends URLs to;
+    ``reports`` says whether those URLs are the ones that succeeded or failed.
+    """
+
+    input_flags: tuple[str, ...]
+    result_flags: tuple[str, ...]
+    reports: str
+
+
+BATCH_PROTOCOLS = {
+    "yt-dlp": BatchProtocol(
+        input_flags=("--batch-file",),
+        result_flags=("--print-to-file", "after_move:%(original_url)s"),
+        reports="succeeded",
+    ),
+    "gallery-dl": BatchProtocol(
+        input_flags=("--input-file",),
+        result_flags=("--error-file",),
+        reports="failed",
+    ),
+}
+
+
+class MediaBatcher:
+    """Collect media jobs per processor and domain for a short window before running them.
+
+    Keeping one domain per batch lets the scheduler's per-domain limit apply to
+    batched invocations just like single jobs.
+    """
+
+    def __init__(self, flush: Callable[[str, List[ProcessorJob]], None]) -> None:
+        self._flush_callback = flush
+        self._buffers: dict[tuple[str, str], List[ProcessorJob]] = {}
+        self._timers: dict[tuple[str, str], asyncio.TimerHandle] = {}
+
+    def add(self, job: ProcessorJob, cfg: BatchConfig) -> None:
+        key = (job.name, job.domain)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(job)
+        if len(buffer) >= cfg.max_items:
+            self.flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(cfg.window, self.flush, key)
+
+    def flush(self, key: tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        jobs = self._buffers.pop(key, [])
+        if jobs:
+            self._flush_callback(key[0], jobs)
+
+    def flush_all(self) -> None:
+        for key in list(self._buffers):
+            self.flush(key)
+
+    def clear(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._buffers.clear()
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(jobs) for jobs in self._buffers.values())
+
+
+def retry_delay(policy: RetryConfig, attempt: int) -> float:
+    """Exponential backoff for the given (1-based) failed attempt, with jitter."""
+
+    delay = min(policy.backoff_max, policy.backoff * (2 ** (attempt - 1)))
+    if policy.jitter:
+        delay *= random.uniform(1 - policy.jitter, 1 + policy.jitter)
+    return max(0.0, delay)
 
 
 class ProcessorManager:
     """Manage asynchronous processor subprocesses."""
 
-    def __init__(self, config_manager: ConfigManager) -> None:
+    def __init__(
+        self,
+        config_manager: ConfigManager,
+        registry: ProcessorRegistry | None = None,
+        rate_limiter: HostRateLimiter | None = None,
+        http: SharedHttpClient | None = None,
+    ) -> None:
         self.config_manager = config_manager
-        self._tasks: set[asyncio.Task[None]] = set()
+        self.registry = registry or default_registry()
+        self.rate_limiter = rate_limiter
+        # The daemon's pooled client; the built-in readability backend fetches with it.
+        self.http = http
+        self._scheduler: JobScheduler | None = None
+        self._journal: JobJournal | None = None
+        self._page_cache: PageCache | None = None
+        self._active_ids: set[int] = set()
+        self._inflight: dict[tuple[str, str, str], ProcessorJob] = {}
+        self._submitted = 0
+        self._coalesced = 0
+        self._batcher = MediaBatcher(self._submit_batch)
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._worker_pools: dict[str, WorkerPool] = {}
+        self._worker_fallbacks = 0
+        self._batches_run = 0
+        self._batched_items = 0
+        self._retry_handles: dict[tuple[str, str, str], asyncio.TimerHandle] = {}
+        self._sweeper: asyncio.Task[None] | None = None
         self._command_cache: dict[str, bool] = {}
         self._missing_commands_reported: set[str] = set()
+        self._finished_listeners: set[JobFinishedListener] = set()
+
+    @property
+    def scheduler(self) -> JobScheduler:
+        if self._scheduler is None:
+            self._scheduler = JobScheduler(
+                self._execute, self._limits(self.config_manager.config), self.rate_limiter
+            )
+        return self._scheduler
+
+    @property
+    def journal(self) -> JobJournal | None:
+        cfg = self.config_manager.config
+        if not cfg.processors.journal:
+            return None
+        path = journal_path(cfg.root_path)
+        if self._journal is not None and self._journal.path != path:
+            self._journal.close()
+            self._journal = None
+        if self._journal is None:
+            self._journal = JobJournal(path)
+        return self._journal
+
+    @property
+    def page_cache(self) -> PageCache | None:
+        cfg = self.config_manager.config
+        if not cfg.pages.enabled:
+            return None
+        directory = page_cache_path(cfg.root_path)
+        if self._page_cache is not None and self._page_cache.directory != directory:
+            self._page_cache = None
+        if self._page_cache is None:
+            self._page_cache = PageCache(directory, cfg.pages)
+        self._page_cache.cfg = cfg.pages
+        return self._page_cache
+
+    def add_finished_listener(self, listener: JobFinishedListener) -> None:
+        """Call ``listener`` with every job that completes successfully."""
+
+        self._finished_listeners.add(listener)
+
+    def remove_finished_listener(self, listener: JobFinishedListener) -> None:
+        self._finished_listeners.discard(listener)
+
+    def wants_page(self, item_type: str, domain: str) -> bool:
+        """Whether a processor triggered for the item would read a fetched copy of the page."""
+
+        cfg = self.config_manager.config
+        if not cfg.pages.enabled:
+            return False
+        for spec in self.registry.resolve(cfg).values():
+            if not spec.triggered_by(item_type, domain):
+                continue
+            processor_cfg = self._processor_config(spec.name)
+            if processor_cfg is not None and processor_cfg.enabled and self._reads_page(spec, cfg):
+                return True
+        return False
+
+    def resume(self) -> int:
+        """Requeue journaled jobs left pending or interrupted by a previous run."""
+
+        journal = self.journal
+        if journal is None:
+            return 0
+        resumed = 0
+        now = time.time()
+        for entry in journal.claim_unfinished(self._active_ids):
+            job = ProcessorJob.from_journal(entry)
+            if not self._job_available(job):
+                journal.mark_finished(entry.id, ok=False, error="command not available")
+                continue
+            delay = (entry.not_before or 0.0) - now
+            if delay > 0:
+                self._submit_later(job, delay)
+            else:
+                self._submit(job)
+            resumed += 1
+        if resumed:
+            logger.info("Resumed %d processor job(s) from the journal", resumed)
+        return resumed
+
+    def start(self) -> None:
+        """Resume journaled work and keep sweeping the journal while the daemon runs."""
+
+        self.resume()
+        if self._sweeper is None and self.journal is not None:
+            self._sweeper = asyncio.create_task(self._sweep_journal())
+
+    async def _sweep_journal(self) -> None:
+        while True:
+            await asyncio.sleep(JOURNAL_SWEEP_SECONDS)
+            try:
+                self.resume()
+                journal = self.journal
+                if journal is not None:
+                    journal.prune()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Journal sweep failed")
+
+    def dead_letters(self, limit: int | None = None) -> list[JournalEntry]:
+        journal = self.journal
+        return journal.dead_letters(limit) if journal is not None else []
+
+    def requeue_dead_letters(self, ids: Sequence[int] | None = None) -> int:
+        journal = self.journal
+        if journal is None:
+            return 0
+        count = journal.requeue_dead(ids)
+        if count:
+            self.resume()
+        return count
 
     async def shutdown(self) -> None:
-        pending = list(self._tasks)
-        for task in pending:
-            task.cancel()
-        if pending:
-            await asyncio.gather(*pending, return_exceptions=True)
+        # Unstarted, interrupted and backing-off jobs stay in the journal and
+        # resume on the next start.
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        self._batcher.clear()
+        self._active_ids.clear()
+        self._inflight.clear()
+        if self._scheduler is not None:
+            await self._scheduler.shutdown()
+            self._scheduler = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._page_cache is not None:
+            await self._page_cache.close()
+            self._page_cache = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        pools, self._worker_pools = list(self._worker_pools.values()), {}
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
+
+    async def join(self) -> None:
+        """Wait for every queued processor job to finish."""
+
+        self._batcher.flush_all()
+        if self._scheduler is not None:
+            await self._scheduler.join()
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {"pending": 0, "running": 0}
+        if self._scheduler is not None:
+            stats = self._scheduler.stats()
+        requests = self._submitted + self._coalesced
+        stats["dedup"] = {
+            "submitted": self._submitted,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._inflight),
+            "hit_rate": self._coalesced / requests if requests else 0.0,
+        }
+        stats["batching"] = {
+            "buffered": self._batcher.buffered,
+            "batches": self._batches_run,
+            "items": self._batched_items,
+        }
+        if self._worker_pools or self._worker_fallbacks:
+            stats["workers"] = {name: pool.stats() for name, pool in self._worker_pools.items()}
+            stats["workers"]["fallbacks"] = self._worker_fallbacks
+        if self._journal is not None:
+            stats["journal"] = self._journal.counts()
+        if self._page_cache is not None:
+            stats["pages"] = self._page_cache.stats()
+        return stats
 
     def queue_for_url(
         self,
         item: UrlItem,
         extra_processors: Sequence[str],
         force: bool = False,
+        missing_only: bool = False,
     ) -> list[str]:
-        cfg = self.config_manager.config
-        scheduled: list[str] = []
+        """Schedule the processors for ``item``; return the names of those queued.
 
-        if cfg.processors.readability.enabled and (force or not item.paths.readable.exists()):
-            if self._schedule(
-                ProcessorJob(
-                    name="readability",
-                    command=[*cfg.processors.readability.command, item.url],
-                    cwd=item.paths.stub.parent,
-                    capture_stdout_to=item.paths.readable,
-                )
-            ):
-                scheduled.append("readability")
-
-        if item.item_type == "video" and cfg.processors.yt_dlp.enabled:
-            if self._schedule(
-                ProcessorJob(
-                    name="yt-dlp",
-                    command=[*cfg.processors.yt_dlp.command, item.url],
-                    cwd=self._media_directory(cfg),
-                )
-            ):
-                scheduled.append("yt-dlp")
-        elif item.item_type == "gallery" and cfg.processors.gallery_dl.enabled:
-            if self._schedule(
-                ProcessorJob(
-                    name="gallery-dl",
-                    command=[*cfg.processors.gallery_dl.command, item.url],
-                    cwd=self._media_directory(cfg),
-                )
-            ):
-                scheduled.append("gallery-dl")
+        ``missing_only`` limits this to processors with an output file that
+        does not exist yet, for items captured before.
+        """
 
-        if (
-            cfg.processors.monolith.enabled
-            and item.item_type in {"article", "gallery"}
-            and (force or not item.paths.singlefile.exists())
-        ):
-            command = [*cfg.processors.monolith.command, item.url, "-o", str(item.paths.singlefile)]
-            if self._schedule(
-                ProcessorJob(
-                    name="monolith",
-                    command=command,
-                    cwd=item.paths.stub.parent,
-                )
-            ):
-                scheduled.append("monolith")
+        cfg = self.config_manager.config
+        if self._scheduler is not None:
+            self._scheduler.configure(self._limits(cfg))
+        scheduled: list[str] = []
 
-        for name in extra_processors:
+        specs = self.registry.resolve(cfg)
+        triggered = [
+            name for name, spec in specs.items() if spec.triggered_by(item.item_type, item.domain)
+        ]
+        for name in [*triggered, *extra_processors]:
             if name in scheduled:
                 continue
-            job = self._job_from_name(name, item, cfg)
+            spec = specs.get(name)
+            if spec is None:
+                logger.warning("Unknown processor requested: %s", name)
+                continue
+            job = self._job_from_spec(spec, item, cfg)
             if job is None:
                 continue
-            if not force:
-                if name == "readability" and item.paths.readable.exists():
-                    continue
-                if name == "monolith" and item.paths.singlefile.exists():
-                    continue
+            if not force and item.priority is Priority.BACKFILL and self._is_dead_letter(job):
+                continue
+            if not force and spec.skip_if_done and job.output is not None and job.output.exists():
+                continue
+            if missing_only and (job.output is None or job.output.exists()):
+                continue
             if self._schedule(job):
                 scheduled.append(name)
 
         return scheduled
 
-    def _job_from_name(self, name: str, item: UrlItem, cfg: DropSyncConfig) -> ProcessorJob | None:
-        match name:
-            case "readability":
-                if not cfg.processors.readability.enabled:
-                    return None
-                return ProcessorJob(
-                    name="readability",
-                    command=[*cfg.processors.readability.command, item.url],
-                    cwd=item.paths.stub.parent,
-                    capture_stdout_to=item.paths.readable,
-                )
-            case "monolith":
-                if not cfg.processors.monolith.enabled:
-                    return None
-                return ProcessorJob(
-                    name="monolith",
-                    command=[*cfg.processors.monolith.command, item.url, "-o", str(item.paths.singlefile)],
-                    cwd=item.paths.stub.parent,
-                )
-            case "yt-dlp":
-                if not cfg.processors.yt_dlp.enabled:
-                    return None
-                return ProcessorJob(
-                    name="yt-dlp",
-                    command=[*cfg.processors.yt_dlp.command, item.url],
-                    cwd=self._media_directory(cfg),
-                )
-            case "gallery-dl":
-                if not cfg.processors.gallery_dl.enabled:
-                    return None
-                return ProcessorJob(
-                    name="gallery-dl",
-                    command=[*cfg.processors.gallery_dl.command, item.url],
-                    cwd=self._media_directory(cfg),
-                )
-            case _:
-                logger.warning("Unknown processor requested: %s", name)
-                return None
+    def _job_from_spec(
+        self, spec: ProcessorSpec, item: UrlItem, cfg: DropSyncConfig
+    ) -> ProcessorJob | None:
+        processor_cfg = self._processor_config(spec.name)
+        if processor_cfg is None or not processor_cfg.enabled:
+            return None
+        output = spec.output_path(item.paths.stub)
+        cwd = self._media_directory(cfg) if spec.workdir == "media" else item.paths.stub.parent
+        pages = self.page_cache if self._reads_page(spec, cfg) else None
+        page = pages.entry_path(item.url) if pages is not None else None
+        if spec.name == "readability" and cfg.processors.readability.backend == "builtin":
+            return ProcessorJob(
+                name=spec.name,
+                command=[],
+                cwd=cwd,
+                output=output,
+                engine="builtin",
+                url=item.url,
+                domain=item.domain,
+                priority=item.priority,
+                input=page,
+                stub=item.paths.stub,
+            )
+        if not processor_cfg.command and not processor_cfg.worker.enabled:
+            logger.warning("Skipping processor %s: no command configured", spec.name)
+            return None
+        return ProcessorJob(
+            name=spec.name,
+            command=spec.build_command(processor_cfg.command, item.url, item.paths.stub, output),
+            cwd=cwd,
+            capture_stdout_to=output if spec.capture_stdout else None,
+            output=output,
+            url=item.url,
+            domain=item.domain,
+            priority=item.priority,
+            input=page,
+            input_command=(
+                spec.build_command(processor_cfg.command, item.url, item.paths.stub, output, page)
+                if page is not None
+                else []
+            ),
+            stub=item.paths.stub,
+        )
+
+    @staticmethod
+    def _reads_page(spec: ProcessorSpec, cfg: DropSyncConfig) -> bool:
+        if spec.name == "readability" and cfg.processors.readability.backend == "builtin":
+            return True
+        return spec.input_args is not None
+
+    def _limits(self, cfg: DropSyncConfig) -> SchedulerLimits:
+        per_processor: dict[str, int] = {}
+        processor_class: dict[str, str] = {}
+        for name, spec in self.registry.resolve(cfg).items():
+            processor_cfg = self.registry.config_for(cfg, name)
+            if processor_cfg is None:
+                continue
+            if processor_cfg.max_concurrency:
+                per_processor[name] = processor_cfg.max_concurrency
+            klass = processor_cfg.concurrency_class or spec.concurrency_class
+            if klass:
+                processor_class[name] = klass
+        return SchedulerLimits(
+            max_concurrency=cfg.processors.max_concurrency,
+            per_domain=cfg.processors.per_domain_concurrency,
+            per_processor=per_processor,
+            processor_class=processor_class,
+            per_class=dict(cfg.processors.classes),
+        )
+
+    def _processor_config(self, name: str) -> ProcessorConfig | None:
+        return self.registry.config_for(self.config_manager.config, name)
 
     def _media_directory(self, cfg: DropSyncConfig) -> Path:
         media_dir = cfg.subdirectory_path("media")
@@ -162,20 +538,107 @@ class ProcessorManager:
         return media_dir
 
     def _schedule(self, job: ProcessorJob) -> bool:
-        if not self._ensure_command_available(job.command[0], job.name):
+        if not self._job_available(job):
             return False
-        task = asyncio.create_task(self._run_job(job))
-        self._tasks.add(task)
-        task.add_done_callback(self._tasks.discard)
+        journal = self.journal
+        if job.dedup_key in self._inflight or (
+            journal is not None and journal.has_active(job.name, job.url, job.target)
+        ):
+            # Identical work is already queued or running here or in another
+            # DropSync process; attach to it instead of spawning a duplicate.
+            self._coalesced += 1
+            logger.debug("Coalesced duplicate %s job for %s", job.name, job.url)
+            return True
+        self._submitted += 1
+        if journal is not None:
+            job.job_id = journal.enqueue(
+                job.name, job.url, job.domain, int(job.priority), job.to_payload()
+            )
+        self._submit(job)
         return True
 
+    def _submit(self, job: ProcessorJob) -> None:
+        if job.job_id is not None:
+            self._active_ids.add(job.job_id)
+        self._inflight[job.dedup_key] = job
+        batch_cfg = self._batch_config(job.name)
+        if batch_cfg is not None:
+            self._batcher.add(job, batch_cfg)
+        else:
+            self.scheduler.submit(job)
+
+    def _batch_config(self, name: str) -> BatchConfig | None:
+        if name not in BATCH_PROTOCOLS:
+            return None
+        processor_cfg = self._processor_config(name)
+        if processor_cfg is None or not processor_cfg.batch.enabled:
+            return None
+        if not processor_cfg.command:
+            # A worker-only processor has no command to run the batch with.
+            return None
+        return processor_cfg.batch
+
+    def _submit_batch(self, name: str, jobs: List[ProcessorJob]) -> None:
+        if len(jobs) == 1:
+            self.scheduler.submit(jobs[0])
+            return
+        first = jobs[0]
+        self.scheduler.submit(
+            ProcessorJob(
+                name=name,
+                command=[],
+                cwd=first.cwd,
+                domain=first.domain,
+                priority=min(job.priority for job in jobs),
+                members=jobs,
+            )
+        )
+
+    def _release(self, job: ProcessorJob) -> None:
+        if job.job_id is not None:
+            self._active_ids.discard(job.job_id)
+        if self._inflight.get(job.dedup_key) is job:
+            del self._inflight[job.dedup_key]
+
+    def _submit_later(self, job: ProcessorJob, delay: float) -> None:
+        self._inflight[job.dedup_key] = job
+        if job.job_id is not None:
+            self._active_ids.add(job.job_id)
+        # Tracked even without a journal so shutdown() can cancel pending retries.
+        self._retry_handles[job.dedup_key] = asyncio.get_running_loop().call_later(
+            delay, self._retry_due, job
+        )
+
+    def _retry_due(self, job: ProcessorJob) -> None:
+        self._retry_handles.pop(job.dedup_key, None)
+        self._submit(job)
+
+    def _is_dead_letter(self, job: ProcessorJob) -> bool:
+        journal = self.journal
+        return journal is not None and journal.is_dead(job.name, job.url)
+
+    def _retry_policy(self, name: str) -> RetryConfig:
+        processor_cfg = self._processor_config(name)
+        return processor_cfg.retry if processor_cfg is not None else RetryConfig()
+
+    def _job_available(self, job: ProcessorJob) -> bool:
+        if job.engine is not None:
+            return True
+        processor_cfg = self._processor_config(job.name)
+        if processor_cfg is not None and processor_cfg.worker.enabled:
+            return True
+        return self._ensure_command_available(job.command[0], job.name)
+
     def _ensure_command_available(self, executable: str, job_name: str) -> bool:
         cached = self._command_cache.get(executable)
         if cached is None:
             cached = shutil.which(executable) is not None
             self._command_cache[executable] = cached
         if not cached and executable not in self._missing_commands_reported:
-            config_key = job_name.replace("-", "_")
+            if job_name in BUILTIN_PROCESSORS:
+                config_key = job_name.replace("-", "_")
+            else:
+                config_key = f"custom.{job_name}"
             logger.warning(
                 "Skipping processor %s: command %r not found in PATH. Install it or disable processors.%s.enabled.",
                 job_name,
@@ -185,29 +648,375 @@ class ProcessorManager:
             self._missing_commands_reported.add(executable)
         return cached
 
-    async def _run_job(self, job: ProcessorJob) -> None:
-        logger.info("Running processor %s: %s", job.name, job.command)
+    async def _execute(self, job: ProcessorJob) -> None:
+        if job.members:
+            await self._execute_batch(job)
+            return
+        journal = self.journal if job.job_id is not None else None
+        if journal is not None and job.job_id is not None:
+            journal.mark_running(job.job_id)
+        job.attempts += 1
+        error = await self._run_job(job)
+        if error is None:
+            if journal is not None and job.job_id is not None:
+                journal.mark_finished(job.job_id, ok=True)
+            self._release(job)
+            await self._notify_finished(job)
+            return
+        self._handle_failure(job, error, journal)
+
+    async def _execute_batch(self, batch: ProcessorJob) -> None:
+        protocol = BATCH_PROTOCOLS[batch.name]
+        journal = self.journal
+        for member in batch.members:
+            if journal is not None and member.job_id is not None:
+                journal.mark_running(member.job_id)
+            member.attempts += 1
+        cfg = self.config_manager.config
+        processor_cfg = self._processor_config(batch.name) or ProcessorConfig()
+        batch_dir = cfg.root_path / ".dropsync" / "batches"
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        input_fd, input_name = tempfile.mkstemp(
+            dir=batch_dir, prefix=f"{batch.name}-", suffix=".txt"
+        )
+        result_fd, result_name = tempfile.mkstemp(
+            dir=batch_dir, prefix=f"{batch.name}-", suffix=".out"
+        )
+        os.close(result_fd)
         try:
+            with os.fdopen(input_fd, "w", encoding="utf-8") as handle:
+                handle.writelines(f"{member.url}\n" for member in batch.members)
+            batch.command = [
+                *processor_cfg.command,
+                *protocol.result_flags,
+                result_name,
+                *protocol.input_flags,
+                input_name,
+            ]
+            self._batches_run += 1
+            self._batched_items += len(batch.members)
+            error = await self._run_job(batch)
+            reported = {
+                line.strip()
+                for line in Path(result_name)
+                .read_text(encoding="utf-8", errors="ignore")
+                .splitlines()
+                if line.strip()
+            }
+        finally:
+            Path(input_name).unlink(missing_ok=True)
+            Path(result_name).unlink(missing_ok=True)
+
+        for member in batch.members:
+            if protocol.reports == "succeeded":
+                ok = member.url in reported
+            else:
+                # Without any per-URL report a failed run is blamed on every item.
+                ok = member.url not in reported and (error is None or bool(reported))
+            if ok:
+                if journal is not None and member.job_id is not None:
+                    journal.mark_finished(member.job_id, ok=True)
+                self._release(member)
+                await self._notify_finished(member)
+            else:
+                self._handle_failure(member, error or "failed within batch", journal)
+
+    async def _notify_finished(self, job: ProcessorJob) -> None:
+        for listener in list(self._finished_listeners):
+            try:
+                maybe_awaitable = listener(job)
+                if asyncio.iscoroutine(maybe_awaitable):
+                    await maybe_awaitable
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Finished-job listener failed for %s", job.url)
+
+    def _handle_failure(self, job: ProcessorJob, error: str, journal: JobJournal | None) -> None:
+        policy = self._retry_policy(job.name)
+        if job.attempts < policy.max_attempts:
+            delay = retry_delay(policy, job.attempts)
+            logger.warning(
+                "Processor %s failed for %s (%s); retry %d/%d in %.0fs",
+                job.name,
+                job.url,
+                error,
+                job.attempts,
+                policy.max_attempts - 1,
+                delay,
+            )
+            if journal is not None and job.job_id is not None:
+                journal.mark_retry(job.job_id, error, time.time() + delay)
+            self._submit_later(job, delay)
+            return
+        logger.error(
+            "Processor %s gave up on %s after %d attempt(s): %s",
+            job.name,
+            job.url,
+            job.attempts,
+            error,
+        )
+        if journal is not None and job.job_id is not None:
+            journal.mark_dead(job.job_id, error)
+        self._release(job)
+
+    async def _run_job(self, job: ProcessorJob) -> str | None:
+        """Run one processor subprocess; return an error description on failure."""
+
+        processor_cfg = self._processor_config(job.name) or ProcessorConfig()
+        timeout = processor_cfg.timeout
+        if timeout is not None and job.members:
+            timeout *= len(job.members)
+        page = await self._fetched_page(job)
+        if job.engine == "builtin":
+            return await self._run_builtin_readability(job, timeout, page)
+        if page is not None and page.truncated:
+            page = None
+        command = job.input_command if page is not None and job.input_command else job.command
+        logger.info("Running processor %s: %s", job.name, command)
+        if processor_cfg.worker.enabled and not job.members:
+            try:
+                return await self._run_in_worker(job, processor_cfg, timeout, page)
+            except WorkerUnavailableError as exc:
+                if not processor_cfg.command:
+                    logger.error("%s and %s has no command to fall back to", exc, job.name)
+                    return "worker unavailable"
+                self._worker_fallbacks += 1
+                logger.warning("%s; running %s as a one-shot process", exc, job.name)
+        writer: AtomicFileWriter | None = None
+        try:
+            # Each job leads its own session/process group so timeouts and
+            # shutdown can take down everything the tool spawned.
             process = await asyncio.create_subprocess_exec(
-                *job.command,
+                *_wrap_ionice(command, processor_cfg),
                 cwd=str(job.cwd),
-                stdout=asyncio.subprocess.PIPE,
+                stdout=(
+                    asyncio.subprocess.PIPE if job.capture_stdout_to else asyncio.subprocess.DEVNULL
+                ),
                 stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
             )
-            stdout, stderr = await process.communicate()
-            if job.capture_stdout_to and stdout:
-                write_text_file(job.capture_stdout_to, stdout.decode("utf-8", errors="ignore"))
-            if process.returncode != 0:
+            _apply_child_limits(process.pid, processor_cfg)
+            stderr_tail = bytearray()
+            stderr_task = asyncio.create_task(_read_tail(process.stderr, stderr_tail))
+            try:
+                async with asyncio.timeout(timeout):
+                    if job.capture_stdout_to is not None and process.stdout is not None:
+                        writer = AtomicFileWriter(job.capture_stdout_to)
+                        while chunk := await process.stdout.read(STREAM_CHUNK_BYTES):
+                            writer.write(chunk)
+                    await stderr_task
+                    returncode = await process.wait()
+            except TimeoutError:
+                await _kill_process_group(process)
+                logger.error("Processor %s timed out after %ss: %s", job.name, timeout, job.url)
+                return f"timed out after {timeout}s"
+            except asyncio.CancelledError:
+                await asyncio.shield(_kill_process_group(process))
+                raise
+            finally:
+                stderr_task.cancel()
+            if writer is not None:
+                if writer.size:
+                    writer.commit()
+                else:
+                    writer.discard()
+                writer = None
+            if returncode != 0:
                 logger.error(
                     "Processor %s exited with %s: %s",
                     job.name,
-                    process.returncode,
-                    stderr.decode("utf-8", errors="ignore"),
+                    returncode,
+                    stderr_tail.decode("utf-8", errors="ignore"),
                 )
+                return f"exit status {returncode}"
         except FileNotFoundError:
-            logger.error("Processor command not found: %s", job.command[0])
-        except Exception:  # pylint: disable=broad-except
+            logger.error("Processor command not found: %s", command[0])
+            return "command not found"
+        except Exception as exc:  # pylint: disable=broad-except
             logger.exception("Processor %s failed", job.name)
+            return str(exc) or type(exc).__name__
+        finally:
+            if writer is not None:
+                writer.discard()
+        return None
+
+    async def _fetched_page(self, job: ProcessorJob) -> CachedPage | None:
+        """The job's page from the page cache, once a running download has finished."""
+
+        pages = self.page_cache if job.input is not None else None
+        if pages is None:
+            return None
+        return await pages.wait(job.url)
+
+    async def _run_builtin_readability(
+        self, job: ProcessorJob, timeout: float | None, page: CachedPage | None = None
+    ) -> str | None:
+        """Extract Markdown in the process pool, no subprocess per item.
+
+        The page comes from the page cache when it was fetched already.
+        """
+
+        if job.output is None:
+            return "no output path"
+        readability_cfg = self.config_manager.config.processors.readability
+        try:
+            async with asyncio.timeout(timeout):
+                if page is not None:
+                    html = await asyncio.to_thread(
+                        page.read_text, readability_cfg.max_document_bytes
+                    )
+                else:
+                    html = await self._fetch_document(
+                        job.url, readability_cfg.max_document_bytes
+                    )
+                markdown = await asyncio.get_running_loop().run_in_executor(
+                    self._pool(readability_cfg.workers), extract_readable_markdown, html, job.url
+                )
+        except TimeoutError:
+            logger.error("Processor %s timed out after %ss: %s", job.name, timeout, job.url)
+            return f"timed out after {timeout}s"
+        except httpx.HTTPError as exc:
+            logger.error("Processor %s could not fetch %s: %s", job.name, job.url, exc)
+            return f"fetch failed: {exc}"
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception("Processor %s failed", job.name)
+            return str(exc) or type(exc).__name__
+        writer = AtomicFileWriter(job.output)
+        try:
+            writer.write(markdown.encode("utf-8"))
+        except BaseException:
+            writer.discard()
+            raise
+        writer.commit()
+        return None
+
+    async def _run_in_worker(
+        self,
+        job: ProcessorJob,
+        processor_cfg: ProcessorConfig,
+        timeout: float | None,
+        page: CachedPage | None = None,
+    ) -> str | None:
+        pool = self._worker_pools.get(job.name)
+        if pool is None or pool.cfg != processor_cfg.worker:
+            if pool is not None:
+                await pool.close()
+            pool = WorkerPool(
+                job.name,
+                processor_cfg.worker,
+                self.config_manager.config.root_path,
+                on_start=functools.partial(_apply_child_limits, cfg=processor_cfg),
+            )
+            self._worker_pools[job.name] = pool
+        logger.info("Sending %s job to worker: %s", job.name, job.url)
+        target = job.output or job.capture_stdout_to
+        return await pool.run(
+            {
+                "url": job.url,
+                "output": str(target) if target else None,
+                "cwd": str(job.cwd),
+                "input": str(page.path) if page is not None else None,
+            },
+            timeout,
+        )
+
+    async def _fetch_document(self, url: str, max_bytes: int) -> str:
+        """Fetch ``url`` with the daemon's pooled client.
+
+        Outside the daemon (``dropsync organize``) a client is built from the
+        same ``[http]`` settings for the request.
+        """
+
+        if self.http is not None and self.http.client is not None:
+            return await _fetch_document(self.http.client, url, max_bytes)
+        http = SharedHttpClient(self.config_manager.config.http, self.rate_limiter)
+        try:
+            return await _fetch_document(await http.start(), url, max_bytes)
+        finally:
+            await http.close()
+
+    def _pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+
+async def _fetch_document(client: httpx.AsyncClient, url: str, max_bytes: int) -> str:
+    # The scheduler took this job's rate-limit token already.
+    request = client.build_request("GET", url, extensions={PREPAID_EXTENSION: True})
+    response = await client.send(request, stream=True)
+    try:
+        response.raise_for_status()
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                break
+        encoding = response.encoding or "utf-8"
+    finally:
+        await response.aclose()
+    return body.decode(encoding, errors="replace")
+
+
+def _wrap_ionice(command: List[str], cfg: ProcessorConfig) -> List[str]:
+    if cfg.ionice_class is None or shutil.which("ionice") is None:
+        return command
+    prefix = ["ionice", "-c", str(cfg.ionice_class)]
+    if cfg.ionice_level is not None and cfg.ionice_class != 3:
+        prefix += ["-n", str(cfg.ionice_level)]
+    return [*prefix, "--", *command]
+
+
+def _apply_child_limits(pid: int, cfg: ProcessorConfig) -> None:
+    """Apply nice and rlimits to a freshly started child from the parent.
+
+    A ``preexec_fn`` would run Python in the forked child, which is unsafe
+    while the server and process pool threads are alive.
+    """
+
+    try:
+        if cfg.nice:
+            current = os.getpriority(os.PRIO_PROCESS, 0)
+            os.setpriority(os.PRIO_PROCESS, pid, min(19, current + cfg.nice))
+        if cfg.rlimit_as_mb:
+            limit = cfg.rlimit_as_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if cfg.rlimit_cpu:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cfg.rlimit_cpu, cfg.rlimit_cpu))
+    except ProcessLookupError:
+        pass
+    except OSError as exc:
+        logger.warning("Could not apply resource limits to pid %s: %s", pid, exc)
+
+
+async def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """SIGTERM the job's process group, escalating to SIGKILL after a grace period."""
+
+    if process.returncode is not None:
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout=KILL_GRACE_SECONDS)
+            return
+        except TimeoutError:
+            continue
+
+
+async def _read_tail(stream: asyncio.StreamReader | None, tail: bytearray) -> None:
+    """Drain ``stream`` keeping only its last ``STDERR_TAIL_BYTES`` in ``tail``."""
+
+    if stream is None:
+        return
+    while chunk := await stream.read(STREAM_CHUNK_BYTES):
+        tail += chunk
+        if len(tail) > STDERR_TAIL_BYTES:
+            del tail[:-STDERR_TAIL_BYTES]
 
 
-__all__ = ["ProcessorManager", "UrlItem"]
+__all__ = ["ProcessorManager", "ProcessorJob", "UrlItem", "Priority"]
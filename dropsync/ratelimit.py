@@ -0,0 +1,186 @@
+"""Per-host token buckets shared by title fetches and processors."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+import httpx
+
+from .config import RateLimitConfig, RateLimitsConfig
+
+# Past this many buckets, full (idle) ones are forgotten.
+_MAX_IDLE_BUCKETS = 1024
+
+
+class RateLimitExceededError(httpx.TransportError):
+    """A request would have waited longer than its timeout for a token."""
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    burst: int
+    tokens: float
+    updated: float
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, count: int = 1) -> float:
+        """Seconds until ``count`` tokens (at most a full bucket) are available."""
+
+        self._refill(now)
+        return max(0.0, (min(count, self.burst) - self.tokens) / self.rate)
+
+    def take(self, now: float, count: int = 1) -> float:
+        """Consume ``count`` tokens, going into debt if needed; return the wait owed."""
+
+        wait = self.delay(now, count)
+        self.tokens -= count
+        return wait
+
+
+def normalize_host(host: str) -> str:
+    host = host.lower().rsplit("@", 1)[-1]
+    if not host.startswith("["):
+        host = host.split(":", 1)[0]
+    return host.removeprefix("www.")
+
+
+class HostRateLimiter:
+    """Token bucket per host; ``domains`` entries also cover their subdomains.
+
+    Hosts without an entry get their own bucket with the default limits, so one
+    busy site never slows the others down.
+    """
+
+    def __init__(
+        self,
+        cfg: RateLimitsConfig,
+        overrides: Mapping[str, RateLimitConfig] | None = None,
+    ) -> None:
+        self._buckets: dict[str, TokenBucket] = {}
+        self.waits = 0
+        self.rejected = 0
+        self.configure(cfg, overrides)
+
+    def configure(
+        self,
+        cfg: RateLimitsConfig,
+        overrides: Mapping[str, RateLimitConfig] | None = None,
+    ) -> None:
+        """Apply config limits, then ``overrides`` (from rules) on top."""
+
+        self.cfg = cfg
+        self._limits = {normalize_host(domain): limit for domain, limit in cfg.domains.items()}
+        for domain, limit in (overrides or {}).items():
+            self._limits[normalize_host(domain)] = limit
+        # Buckets pick up changed limits lazily; drop the ones whose limits changed.
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if (bucket.rate, bucket.burst) == self._limit_for_key(key)
+        }
+
+    def delay(self, host: str, count: int = 1) -> float:
+        bucket = self._bucket(host)
+        return bucket.delay(time.monotonic(), count) if bucket is not None else 0.0
+
+    def take(self, host: str, count: int = 1) -> None:
+        bucket = self._bucket(host)
+        if bucket is not None:
+            bucket.take(time.monotonic(), count)
+
+    async def acquire(self, host: str, max_wait: float | None = None) -> None:
+        """Wait for a token; raise RateLimitExceededError rather than wait past ``max_wait``."""
+
+        bucket = self._bucket(host)
+        if bucket is None:
+            return
+        now = time.monotonic()
+        if max_wait is not None and bucket.delay(now) > max_wait:
+            self.rejected += 1
+            raise RateLimitExceededError(f"rate limit for {host} exceeded")
+        wait = bucket.take(now)
+        if wait > 0:
+            self.waits += 1
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "waits": self.waits,
+            "rejected": self.rejected,
+            "throttled": sorted(
+                key for key, bucket in self._buckets.items() if bucket.delay(now) > 0
+            ),
+        }
+
+    def _key(self, host: str) -> str:
+        host = normalize_host(host)
+        candidate = host
+        while candidate:
+            if candidate in self._limits:
+                return candidate
+            candidate = candidate.partition(".")[2]
+        return host
+
+    def _limit_for_key(self, key: str) -> tuple[float, int]:
+        limit = self._limits.get(key, self.cfg.default)
+        return limit.rate, limit.burst
+
+    def _bucket(self, host: str) -> TokenBucket | None:
+        if not self.cfg.enabled or not host:
+            return None
+        key = self._key(host)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_IDLE_BUCKETS:
+                self._drop_full_buckets()
+            rate, burst = self._limit_for_key(key)
+            bucket = TokenBucket(rate, burst, float(burst), time.monotonic())
+            self._buckets[key] = bucket
+        return bucket
+
+    def _drop_full_buckets(self) -> None:
+        # A full bucket is indistinguishable from a new one, so forgetting it is free.
+        now = time.monotonic()
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket.delay(now, bucket.burst)
+        }
+
+
+# Request extension marking a request whose token was already taken (e.g. by the
+# job scheduler for the processor job making it).
+PREPAID_EXTENSION = "dropsync.rate_limit_prepaid"
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Waits for the target host's token before handing a request on."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: HostRateLimiter) -> None:
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not request.extensions.get(PREPAID_EXTENSION):
+            timeout = request.extensions.get("timeout", {}).get("pool")
+            await self._limiter.acquire(request.url.host, max_wait=timeout)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+__all__ = [
+    "PREPAID_EXTENSION",
+    "HostRateLimiter",
+    "RateLimitExceededError",
+    "RateLimitedTransport",
+    "TokenBucket",
+    "normalize_host",
+]
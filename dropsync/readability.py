@@ -0,0 +1,376 @@
+"""Built-in readability extraction: HTML in, readable Markdown out.
+
+A compact take on the Arc90/Readability heuristics using only the standard
+library, so it can run inside a process pool instead of spawning
+``readability-cli`` for every capture.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Iterator, Optional, Union
+from urllib.parse import urljoin
+
+_SKIP_TAGS = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "form",
+    "button",
+    "select",
+    "textarea",
+    "nav",
+    "footer",
+    "aside",
+}
+_VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+_BLOCK_TAGS = {
+    "address",
+    "article",
+    "blockquote",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "main",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "tr",
+    "ul",
+}
+_SCORED_TAGS = {"p", "pre", "td", "blockquote"}
+_POSITIVE = re.compile(r"article|body|content|entry|main|page|post|text|blog|story", re.I)
+_NEGATIVE = re.compile(
+    r"comment|meta|footer|footnote|sidebar|sponsor|\bad\b|ad-|share|social|nav|menu|related"
+    r"|promo|subscribe|cookie|banner|popup",
+    re.I,
+)
+# Elements whose end tag is optional: starting one closes an open sibling of the
+# listed kinds, searching no further up than the given container.
+_IMPLIED_END = {
+    "li": ({"li"}, {"ul", "ol"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "tr": ({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "option": ({"option"}, {"select", "datalist", "optgroup"}),
+}
+# Deeper elements are flattened into their ancestor so rendering stays well
+# within the recursion limit on pathological markup.
+_MAX_DEPTH = 128
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(slots=True)
+class _Node:
+    tag: str
+    attrs: dict[str, str] = field(default_factory=dict)
+    children: list[Union["_Node", str]] = field(default_factory=list)
+    parent: Optional["_Node"] = None
+    score: float = 0.0
+    # Filled in by _measure(): whitespace-collapsed text length, the part of it
+    # inside links, and the number of commas.
+    text_length: int = 0
+    link_length: int = 0
+    commas: int = 0
+
+    def text(self) -> str:
+        parts: list[str] = []
+        stack: list[Union[_Node, str]] = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            else:
+                stack.extend(reversed(item.children))
+        return "".join(parts)
+
+    def class_weight(self) -> float:
+        marker = f"{self.attrs.get('class', '')} {self.attrs.get('id', '')}"
+        weight = 0.0
+        if _NEGATIVE.search(marker):
+            weight -= 25
+        if _POSITIVE.search(marker):
+            weight += 25
+        return weight
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("document")
+        self._stack = [self.root]
+        self._skip_depth = 0
+        self.title: Optional[str] = None
+        self.meta_title: Optional[str] = None
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        tag = tag.lower()
+        if self._skip_depth:
+            if tag in _SKIP_TAGS:
+                self._skip_depth += 1
+            return
+        if tag in _SKIP_TAGS:
+            self._skip_depth = 1
+            return
+        attr_map = {name.lower(): (value or "") for name, value in attrs}
+        if tag == "meta":
+            prop = (attr_map.get("property") or attr_map.get("name") or "").lower()
+            if prop == "og:title" and attr_map.get("content") and not self.meta_title:
+                self.meta_title = attr_map["content"].strip()
+            return
+        if tag == "title":
+            self._in_title = True
+            return
+        # Implicitly close an open paragraph when another block starts.
+        if tag in _BLOCK_TAGS and self._stack[-1].tag == "p":
+            self._stack.pop()
+        if tag in _IMPLIED_END:
+            self._close_implied(tag)
+        node = _Node(tag, attr_map, parent=self._stack[-1])
+        self._stack[-1].children.append(node)
+        if tag not in _VOID_TAGS and len(self._stack) < _MAX_DEPTH:
+            self._stack.append(node)
+
+    def _close_implied(self, tag: str) -> None:
+        closes, scope = _IMPLIED_END[tag]
+        for index in range(len(self._stack) - 1, 0, -1):
+            open_tag = self._stack[index].tag
+            if open_tag in closes:
+                del self._stack[index:]
+                return
+            if open_tag in scope:
+                return
+
+    def handle_endtag(self, tag: str) -> None:
+        tag = tag.lower()
+        if self._skip_depth:
+            if tag in _SKIP_TAGS:
+                self._skip_depth -= 1
+            return
+        if tag == "title":
+            self._in_title = False
+            return
+        for index in range(len(self._stack) - 1, 0, -1):
+            if self._stack[index].tag == tag:
+                del self._stack[index:]
+                return
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title = ((self.title or "") + data).strip()
+            return
+        self._stack[-1].children.append(data)
+
+
+def _iter_nodes(node: _Node) -> Iterator[_Node]:
+    """Yield the descendants of ``node`` in document order."""
+
+    stack = [child for child in reversed(node.children) if isinstance(child, _Node)]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(child for child in reversed(current.children) if isinstance(child, _Node))
+
+
+def _measure(root: _Node) -> None:
+    """Compute text, link-text and comma counts for every node in one pass."""
+
+    for node in reversed(list(_iter_nodes(root))):
+        text_length = link_length = commas = 0
+        for child in node.children:
+            if isinstance(child, str):
+                text_length += len(_WHITESPACE.sub(" ", child))
+                commas += child.count(",")
+            else:
+                text_length += child.text_length
+                link_length += child.link_length
+                commas += child.commas
+        node.text_length = text_length
+        node.link_length = text_length if node.tag == "a" else link_length
+        node.commas = commas
+
+
+def _pick_content(root: _Node) -> _Node:
+    _measure(root)
+    candidates: list[_Node] = []
+    for node in _iter_nodes(root):
+        if node.tag not in _SCORED_TAGS:
+            continue
+        if node.text_length < 25:
+            continue
+        score = 1 + node.commas + min(node.text_length / 100, 3)
+        for ancestor, share in (
+            (node.parent, 1.0),
+            (node.parent.parent if node.parent else None, 0.5),
+        ):
+            if ancestor is None or ancestor is root:
+                continue
+            if ancestor.score == 0:
+                ancestor.score = ancestor.class_weight()
+                candidates.append(ancestor)
+            ancestor.score += score * share
+    best: Optional[_Node] = None
+    best_score = float("-inf")
+    for candidate in candidates:
+        adjusted = candidate.score * (1 - candidate.link_length / (candidate.text_length or 1))
+        if adjusted > best_score:
+            best, best_score = candidate, adjusted
+    if best is not None:
+        return best
+    for node in _iter_nodes(root):
+        if node.tag in {"article", "main", "body"}:
+            return node
+    return root
+
+
+class _MarkdownRenderer:
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+
+    def render(self, node: _Node) -> str:
+        blocks = self._blocks(node)
+        return "\n\n".join(block for block in blocks if block.strip())
+
+    def _blocks(self, node: _Node) -> list[str]:
+        blocks: list[str] = []
+        inline: list[str] = []
+
+        def flush() -> None:
+            text = _WHITESPACE.sub(" ", "".join(inline)).strip()
+            if text:
+                blocks.append(text)
+            inline.clear()
+
+        for child in node.children:
+            if isinstance(child, str):
+                inline.append(child)
+                continue
+            if child.tag in _BLOCK_TAGS or child.tag in {"td", "th"}:
+                marker = f"{child.attrs.get('class', '')} {child.attrs.get('id', '')}"
+                if _NEGATIVE.search(marker) and child.link_length > child.text_length / 2:
+                    continue
+                flush()
+                blocks.extend(self._block(child))
+            elif child.tag == "br":
+                inline.append("  \n")
+            else:
+                inline.append(self._inline(child))
+        flush()
+        return blocks
+
+    def _block(self, node: _Node) -> list[str]:
+        tag = node.tag
+        if tag in {"h1", "h2", "h3", "h4", "h5", "h6"}:
+            text = self._inline_children(node)
+            return [f"{'#' * int(tag[1])} {text}"] if text else []
+        if tag == "pre":
+            return [f"```\n{node.text().strip(chr(10))}\n```"]
+        if tag == "hr":
+            return ["---"]
+        if tag in {"ul", "ol"}:
+            lines: list[str] = []
+            index = 1
+            for child in node.children:
+                if not isinstance(child, _Node) or child.tag != "li":
+                    continue
+                marker = f"{index}." if tag == "ol" else "-"
+                body = "\n\n".join(self._blocks(child)).replace("\n", "\n   ")
+                if body:
+                    lines.append(f"{marker} {body}")
+                    index += 1
+            return ["\n".join(lines)] if lines else []
+        if tag == "blockquote":
+            inner = "\n\n".join(self._blocks(node))
+            return ["\n".join(f"> {line}".rstrip() for line in inner.splitlines())] if inner else []
+        return self._blocks(node)
+
+    def _inline_children(self, node: _Node) -> str:
+        parts = [
+            child if isinstance(child, str) else self._inline(child) for child in node.children
+        ]
+        return _WHITESPACE.sub(" ", "".join(parts)).strip()
+
+    def _inline(self, node: _Node) -> str:
+        tag = node.tag
+        if tag == "img":
+            src = node.attrs.get("src")
+            return f"![{node.attrs.get('alt', '')}]({urljoin(self.base_url, src)})" if src else ""
+        if tag == "br":
+            return "  \n"
+        text = self._inline_children(node)
+        if not text:
+            return ""
+        if tag == "a":
+            href = node.attrs.get("href", "")
+            if href and not href.startswith(("javascript:", "#")):
+                return f"[{text}]({urljoin(self.base_url, href)})"
+            return text
+        if tag in {"strong", "b"}:
+            return f"**{text}**"
+        if tag in {"em", "i"}:
+            return f"*{text}*"
+        if tag == "code":
+            return f"`{text}`"
+        return text
+
+
+def extract_readable_markdown(html: str, url: str) -> str:
+    """Return the main content of ``html`` as Markdown headed by its title."""
+
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    content = _pick_content(builder.root)
+    body = _MarkdownRenderer(url).render(content)
+    heading: Optional[str] = None
+    if body.startswith("# "):
+        heading, _, body = body.partition("\n\n")
+    elif title := builder.meta_title or builder.title:
+        heading = f"# {_WHITESPACE.sub(' ', title).strip()}"
+    parts = [heading] if heading else []
+    parts.append(f"Source: <{url}>")
+    if body:
+        parts.append(body)
+    return "\n\n".join(parts) + "\n"
+
+
+__all__ = ["extract_readable_markdown"]
@@ -0,0 +1,54 @@
+"""Reference co-process worker for the DropSync worker protocol.
+
+Run as ``python -m dropsync.reference_worker``. It answers pings and, for
+``run`` requests, writes a small Markdown note naming the URL to ``output``.
+It never touches the network, which makes it handy for tests and as a
+template for real workers.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, TextIO
+
+
+def handle(message: dict[str, Any]) -> dict[str, Any]:
+    op = message.get("op")
+    if op == "ping":
+        return {"ok": True}
+    if op != "run":
+        return {"ok": False, "error": f"unknown op {op!r}"}
+    url = message.get("url")
+    output = message.get("output")
+    if not url:
+        return {"ok": False, "error": "missing url"}
+    if output:
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            f"# {url}\n\nProcessed by the DropSync reference worker.\n", encoding="utf-8"
+        )
+    return {"ok": True}
+
+
+def serve(stdin: TextIO, stdout: TextIO) -> None:
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError as exc:
+            reply: dict[str, Any] = {"id": None, "ok": False, "error": f"bad request: {exc}"}
+        else:
+            try:
+                reply = {"id": message.get("id"), **handle(message)}
+            except Exception as exc:  # pylint: disable=broad-except
+                reply = {"id": message.get("id"), "ok": False, "error": str(exc)}
+        stdout.write(json.dumps(reply) + "\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    serve(sys.stdin, sys.stdout)
@@ -0,0 +1,222 @@
+"""Registry of content processors: built-ins, config-declared and plugins.
+
+A processor is described by a :class:`ProcessorSpec`. Built-ins are registered
+here, third-party packages can add their own through the ``dropsync.processors``
+entry-point group (the entry point resolves to a spec or a zero-argument
+callable returning one), and ``[processors.custom.<name>]`` tables in the
+config declare command-line processors without any code.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from functools import cache
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Iterable, Literal
+
+from .config import CustomProcessorConfig, DropSyncConfig, ProcessorConfig
+
+logger = logging.getLogger("dropsync.registry")
+
+ENTRY_POINT_GROUP = "dropsync.processors"
+
+# Trigger value matching every URL item type.
+ANY_TYPE = "*"
+
+
+@dataclass(frozen=True, slots=True)
+class ProcessorSpec:
+    """How a processor is invoked, when it runs, and when it can be skipped.
+
+    ``args`` are appended to the configured command and may use ``{url}``,
+    ``{output}``, ``{stub}`` and ``{dir}``. ``input_args`` replace ``args`` when
+    the page is already in the page cache and may also use ``{input}``, the
+    local copy. ``output`` is a file name template next to the stub, where
+    ``{stem}`` is the stub name without ``.md``.
+    """
+
+    name: str
+    command: tuple[str, ...] = ()
+    args: tuple[str, ...] = ("{url}",)
+    input_args: tuple[str, ...] | None = None
+    output: str | None = None
+    capture_stdout: bool = False
+    # Item types the processor runs for automatically; empty means only when a
+    # rule asks for it through `post`.
+    item_types: frozenset[str] = frozenset()
+    domains: frozenset[str] = frozenset()
+    workdir: Literal["item", "media"] = "item"
+    concurrency_class: str | None = None
+    # Skip the job when its output already exists (unless forced).
+    skip_if_done: bool = True
+
+    def triggered_by(self, item_type: str, domain: str) -> bool:
+        if not self.item_types:
+            return False
+        if ANY_TYPE not in self.item_types and item_type not in self.item_types:
+            return False
+        return not self.domains or domain in self.domains
+
+    def output_path(self, stub: Path) -> Path | None:
+        if self.output is None:
+            return None
+        return stub.with_name(self.output.format(stem=stub.stem))
+
+    def build_command(
+        self,
+        base: Iterable[str],
+        url: str,
+        stub: Path,
+        output: Path | None,
+        input: Path | None = None,
+    ) -> list[str]:
+        values = {
+            "url": url,
+            "output": str(output) if output is not None else "",
+            "stub": str(stub),
+            "dir": str(stub.parent),
+            "input": str(input) if input is not None else "",
+        }
+        args = self.input_args if input is not None and self.input_args is not None else self.args
+        return [*base, *(arg.format(**values) for arg in args)]
+
+    @classmethod
+    def from_config(cls, name: str, cfg: CustomProcessorConfig) -> "ProcessorSpec":
+        return cls(
+            name=name,
+            command=tuple(cfg.command),
+            args=tuple(cfg.args),
+            input_args=tuple(cfg.input_args) if cfg.input_args is not None else None,
+            output=cfg.output,
+            capture_stdout=cfg.capture_stdout,
+            item_types=frozenset(cfg.item_types),
+            domains=frozenset(domain.lower() for domain in cfg.domains),
+            workdir=cfg.workdir,
+            concurrency_class=cfg.concurrency_class,
+            skip_if_done=cfg.skip_if_done,
+        )
+
+
+BUILTIN_SPECS = (
+    ProcessorSpec(
+        name="readability",
+        input_args=("--base", "{url}", "{input}"),
+        output="{stem}.readable.md",
+        capture_stdout=True,
+        item_types=frozenset({ANY_TYPE}),
+    ),
+    ProcessorSpec(
+        name="yt-dlp",
+        item_types=frozenset({"video"}),
+        workdir="media",
+        skip_if_done=False,
+    ),
+    ProcessorSpec(
+        name="gallery-dl",
+        item_types=frozenset({"gallery"}),
+        workdir="media",
+        skip_if_done=False,
+    ),
+    ProcessorSpec(
+        name="monolith",
+        args=("{url}", "-o", "{output}"),
+        input_args=("--base-url", "{url}", "{input}", "-o", "{output}"),
+        output="{stem}.single.html",
+        item_types=frozenset({"article", "gallery"}),
+    ),
+)
+
+BUILTIN_PROCESSORS = tuple(spec.name for spec in BUILTIN_SPECS)
+
+
+@dataclass(slots=True)
+class ProcessorRegistry:
+    """Specs in registration order; config-declared processors are layered on per call."""
+
+    specs: dict[str, ProcessorSpec] = field(default_factory=dict)
+
+    def register(self, spec: ProcessorSpec) -> None:
+        if spec.name in BUILTIN_PROCESSORS and spec.name in self.specs:
+            raise ValueError(f"cannot replace built-in processor {spec.name!r}")
+        self.specs[spec.name] = spec
+
+    def resolve(self, cfg: DropSyncConfig) -> dict[str, ProcessorSpec]:
+        """All known processors; ``[processors.custom]`` entries replace plugins of the same name."""
+
+        resolved = dict(self.specs)
+        for name, custom in cfg.processors.custom.items():
+            if name in BUILTIN_PROCESSORS:
+                logger.warning("Ignoring processors.custom.%s: name is reserved", name)
+                continue
+            resolved[name] = ProcessorSpec.from_config(name, custom)
+        return resolved
+
+    def companion_paths(self, cfg: DropSyncConfig, stub: Path) -> list[Path]:
+        """Output files of every known processor that travel with ``stub``."""
+
+        companions: list[Path] = []
+        for output in self.outputs(cfg, stub).values():
+            if output not in companions:
+                companions.append(output)
+        return companions
+
+    def outputs(self, cfg: DropSyncConfig, stub: Path) -> dict[str, Path]:
+        """Where each processor with an output file would write it for ``stub``."""
+
+        outputs: dict[str, Path] = {}
+        for name, spec in self.resolve(cfg).items():
+            output = spec.output_path(stub)
+            if output is not None:
+                outputs[name] = output
+        return outputs
+
+    def get(self, cfg: DropSyncConfig, name: str) -> ProcessorSpec | None:
+        return self.resolve(cfg).get(name)
+
+    def config_for(self, cfg: DropSyncConfig, name: str) -> ProcessorConfig | None:
+        """Runtime settings (command, limits, retry, ...) for ``name``."""
+
+        if name in BUILTIN_PROCESSORS:
+            return getattr(cfg.processors, name.replace("-", "_"))
+        if name in cfg.processors.custom:
+            return cfg.processors.custom[name]
+        spec = self.specs.get(name)
+        if spec is None:
+            return None
+        return ProcessorConfig(command=list(spec.command))
+
+    def load_entry_points(self) -> None:
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            try:
+                loaded = entry_point.load()
+                spec = loaded() if callable(loaded) else loaded
+                if not isinstance(spec, ProcessorSpec):
+                    raise TypeError(f"expected ProcessorSpec, got {type(spec).__name__}")
+                if spec.name in BUILTIN_PROCESSORS:
+                    raise ValueError(f"name {spec.name!r} is reserved")
+                self.register(spec)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to load processor plugin %s", entry_point.name)
+
+
+@cache
+def default_registry() -> ProcessorRegistry:
+    """Built-ins plus installed plugins, loaded once per process."""
+
+    registry = ProcessorRegistry()
+    for spec in BUILTIN_SPECS:
+        registry.register(spec)
+    registry.load_entry_points()
+    return registry
+
+
+__all__ = [
+    "ANY_TYPE",
+    "BUILTIN_PROCESSORS",
+    "ENTRY_POINT_GROUP",
+    "ProcessorRegistry",
+    "ProcessorSpec",
+    "default_registry",
+]
@@ -8,9 +8,11 @@ from pathlib import Path
 from typing import Any, Iterable, List, Optional, Set
 
 import tomllib
+from pydantic import ValidationError
 
-from .processors import ProcessorManager, UrlItem
-from .utils import ItemPaths, domain_from_url
+from .config import RateLimitConfig
+from .processors import Priority, ProcessorManager, UrlItem
+from .utils import domain_from_url, item_paths_for, parse_front_matter, publish_unique_path
 
 
 @dataclass(slots=True)
@@ -21,6 +23,7 @@ class Rule:
     add_tags: Set[str] = field(default_factory=set)
     move_to: Optional[str] = None
     post: List[str] = field(default_factory=list)
+    rate_limit: Optional[RateLimitConfig] = None
 
 
 @dataclass(slots=True)
@@ -56,6 +59,16 @@ class RuleEngine:
                 result.post.extend(rule.post)
         return result
 
+    def rate_limits(self) -> dict[str, RateLimitConfig]:
+        """Per-domain request limits set by rules; later rules win."""
+
+        limits: dict[str, RateLimitConfig] = {}
+        for rule in self._rules:
+            if rule.rate_limit is not None:
+                for domain in rule.domains:
+                    limits[domain] = rule.rate_limit
+        return limits
+
     @staticmethod
     def _matches(rule: Rule, item: ItemContext) -> bool:
         if rule.domains and item.domain not in rule.domains:
@@ -75,6 +88,15 @@ def _parse_domains(value: str | Iterable[str] | None) -> Set[str]:
     return {v.lower() for v in value}
 
 
+def _parse_rate_limit(value: dict[str, Any] | None) -> Optional[RateLimitConfig]:
+    if value is None:
+        return None
+    try:
+        return RateLimitConfig.model_validate(value)
+    except ValidationError as exc:
+        raise RuntimeError(f"Invalid rate_limit in rules: {exc}") from exc
+
+
 def load_rules(root: Path) -> RuleEngine:
     rules_file = root / ".dropsync" / "rules.toml"
     if not rules_file.exists():
@@ -93,39 +115,14 @@ def load_rules(root: Path) -> RuleEngine:
                 add_tags=set(entry.get("add_tags", [])),
                 move_to=entry.get("move_to"),
                 post=list(entry.get("post", [])),
+                rate_limit=_parse_rate_limit(entry.get("rate_limit")),
             )
         )
     return RuleEngine(parsed_rules)
 
 
 def _parse_front_matter(path: Path) -> dict[str, Any]:
-    content = path.read_text(encoding="utf-8", errors="ignore")
-    if not content.startswith("---\n"):
-        return {}
-    lines = content.splitlines()
-    metadata: dict[str, Any] = {}
-    for line in lines[1:]:
-        if line.strip() == "---":
-            break
-        if ":" not in line:
-            continue
-        key, raw_value = line.split(":", 1)
-        key = key.strip()
-        value = raw_value.strip().strip('"')
-        if value.startswith("[") and value.endswith("]"):
-            inner = value[1:-1].strip()
-            metadata[key] = [item.strip().strip('"') for item in inner.split(",") if item.strip()]
-        else:
-            metadata[key] = value
-    return metadata
-
-
-def _associated_paths(stub: Path) -> ItemPaths:
-    return ItemPaths(
-        stub=stub,
-        readable=stub.with_suffix(".readable.md"),
-        singlefile=stub.with_suffix(".single.html"),
-    )
+    return parse_front_matter(path.read_text(encoding="utf-8", errors="ignore"))[0]
 
 
 def organize_once(
@@ -158,7 +155,7 @@ def organize_once(
         domain = metadata.get("domain") or domain_from_url(url)
         item_type = metadata.get("item_type") or metadata.get("type") or "article"
 
-        paths = _associated_paths(stub)
+        paths = item_paths_for(stub)
         application = rule_engine.apply(
             ItemContext(
                 path=stub,
@@ -170,16 +167,20 @@ def organize_once(
 
         target_dir = config.subdirectory_path(application.move_to or "links")
         if stub.parent != target_dir:
-            target_dir.mkdir(parents=True, exist_ok=True)
-            new_stub = target_dir / stub.name
-            shutil.move(str(stub), new_stub)
-            if paths.readable.exists():
-                shutil.move(str(paths.readable), target_dir / paths.readable.name)
-            if paths.singlefile.exists():
-                shutil.move(str(paths.singlefile), target_dir / paths.singlefile.name)
+            # Claimed so a capture saved into target_dir meanwhile is never overwritten.
+            new_stub = publish_unique_path(stub, target_dir / stub.name)
+            registry = processor_manager.registry
+            companions = zip(
+                registry.companion_paths(config, stub),
+                registry.companion_paths(config, new_stub),
+                strict=True,
+            )
+            for companion, new_companion in companions:
+                if companion.exists():
+                    shutil.move(str(companion), new_companion)
             actions.append(f"moved {stub.name} -> {target_dir.relative_to(root)}")
             stub = new_stub
-            paths = _associated_paths(stub)
+            paths = item_paths_for(stub)
 
         scheduled = processor_manager.queue_for_url(
             UrlItem(
@@ -187,6 +188,7 @@ def organize_once(
                 paths=paths,
                 domain=domain,
                 item_type=item_type,
+                priority=Priority.BACKFILL,
             ),
             extra_processors=application.post,
             force=force,
@@ -0,0 +1,247 @@
+"""Bounded, prioritized scheduling for processor jobs."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Protocol
+
+if TYPE_CHECKING:
+    from .ratelimit import HostRateLimiter
+
+logger = logging.getLogger("dropsync.scheduler")
+
+
+class Priority(IntEnum):
+    """Scheduling lanes; lower values run first."""
+
+    INTERACTIVE = 0
+    BACKFILL = 1
+
+
+class SchedulableJob(Protocol):
+    name: str
+    domain: str
+    priority: Priority
+
+
+@dataclass(slots=True)
+class SchedulerLimits:
+    max_concurrency: int = 4
+    per_domain: int = 2
+    per_processor: dict[str, int] = field(default_factory=dict)
+    # Processors sharing a concurrency class count against one limit.
+    processor_class: dict[str, str] = field(default_factory=dict)
+    per_class: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass(order=True, slots=True)
+class _Entry:
+    priority: int
+    seq: int
+    job: Any = field(compare=False)
+
+
+class JobScheduler:
+    """Run jobs under global, per-processor and per-domain concurrency limits.
+
+    Pending jobs are bucketed by ``(processor, domain)``; each bucket is a heap
+    ordered by priority lane and submission order. Dispatch picks the best head
+    among buckets that still have capacity, so a saturated domain or processor
+    never blocks unrelated work behind it. With a ``rate_limiter``, a domain
+    that is out of tokens is skipped the same way and retried once its bucket
+    refills; its jobs never sit in a running slot while they wait.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[None]],
+        limits: SchedulerLimits | None = None,
+        rate_limiter: "HostRateLimiter | None" = None,
+    ) -> None:
+        self._runner = runner
+        self.limits = limits or SchedulerLimits()
+        self.rate_limiter = rate_limiter
+        self._wakeup: asyncio.TimerHandle | None = None
+        self._queues: dict[tuple[str, str], list[_Entry]] = {}
+        self._seq = itertools.count()
+        self._pending = 0
+        self._running: dict[asyncio.Task[None], SchedulableJob] = {}
+        self._running_by_processor: dict[str, int] = {}
+        self._running_by_domain: dict[str, int] = {}
+        self._running_by_class: dict[str, int] = {}
+        # Class each running job was counted under, in case limits are reconfigured.
+        self._class_of: dict[asyncio.Task[None], str] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+
+    def configure(self, limits: SchedulerLimits) -> None:
+        self.limits = limits
+        self._pump()
+
+    def submit(self, job: SchedulableJob) -> None:
+        if self._closed:
+            raise RuntimeError("scheduler is shut down")
+        key = (job.name, job.domain)
+        heapq.heappush(
+            self._queues.setdefault(key, []),
+            _Entry(int(job.priority), next(self._seq), job),
+        )
+        self._pending += 1
+        self._idle.clear()
+        self._pump()
+
+    async def join(self) -> None:
+        """Wait until every submitted job has finished."""
+
+        await self._idle.wait()
+
+    async def shutdown(self) -> list[SchedulableJob]:
+        """Cancel running jobs and return the ones that never started."""
+
+        self._closed = True
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        dropped = [entry.job for queue in self._queues.values() for entry in queue]
+        self._queues.clear()
+        self._pending = 0
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        self._idle.set()
+        return dropped
+
+    def stats(self) -> dict[str, Any]:
+        pending_by_priority: dict[str, int] = {}
+        pending_by_processor: dict[str, int] = {}
+        for (name, _domain), queue in self._queues.items():
+            pending_by_processor[name] = pending_by_processor.get(name, 0) + len(queue)
+            for entry in queue:
+                lane = Priority(entry.priority).name.lower()
+                pending_by_priority[lane] = pending_by_priority.get(lane, 0) + 1
+        return {
+            "pending": self._pending,
+            "running": len(self._running),
+            "pending_by_priority": pending_by_priority,
+            "pending_by_processor": pending_by_processor,
+            "running_by_processor": {k: v for k, v in self._running_by_processor.items() if v},
+            "running_by_class": {k: v for k, v in self._running_by_class.items() if v},
+        }
+
+    def _processor_limit(self, name: str) -> int | None:
+        return self.limits.per_processor.get(name)
+
+    def _has_capacity(self, name: str, domain: str) -> bool:
+        limit = self._processor_limit(name)
+        if limit is not None and self._running_by_processor.get(name, 0) >= limit:
+            return False
+        klass = self.limits.processor_class.get(name)
+        class_limit = self.limits.per_class.get(klass) if klass else None
+        if class_limit is not None and self._running_by_class.get(klass, 0) >= class_limit:
+            return False
+        if domain and self._running_by_domain.get(domain, 0) >= self.limits.per_domain:
+            return False
+        return True
+
+    def _pump(self) -> None:
+        if self._closed:
+            return
+        while self._pending and len(self._running) < self.limits.max_concurrency:
+            best_key: tuple[str, str] | None = None
+            best: _Entry | None = None
+            retry_in: float | None = None
+            for key, queue in self._queues.items():
+                head = queue[0]
+                if best is not None and head >= best:
+                    continue
+                if not self._has_capacity(*key):
+                    continue
+                wait = self._rate_delay(head.job)
+                if wait > 0:
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                    continue
+                best_key, best = key, head
+            if best_key is None:
+                if retry_in is not None:
+                    self._wake_in(retry_in)
+                return
+            queue = self._queues[best_key]
+            entry = heapq.heappop(queue)
+            if not queue:
+                del self._queues[best_key]
+            self._pending -= 1
+            self._start(entry.job)
+
+    def _rate_delay(self, job: SchedulableJob) -> float:
+        requests = _request_count(job)
+        if self.rate_limiter is None or not job.domain or not requests:
+            return 0.0
+        return self.rate_limiter.delay(job.domain, requests)
+
+    def _wake_in(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._wakeup is not None:
+            if self._wakeup.when() <= when:
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(when, self._wake)
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._pump()
+
+    def _start(self, job: SchedulableJob) -> None:
+        requests = _request_count(job)
+        if self.rate_limiter is not None and job.domain and requests:
+            self.rate_limiter.take(job.domain, requests)
+        self._running_by_processor[job.name] = self._running_by_processor.get(job.name, 0) + 1
+        if job.domain:
+            self._running_by_domain[job.domain] = self._running_by_domain.get(job.domain, 0) + 1
+        task = asyncio.create_task(self._runner(job))
+        self._running[task] = job
+        klass = self.limits.processor_class.get(job.name)
+        if klass:
+            self._running_by_class[klass] = self._running_by_class.get(klass, 0) + 1
+            self._class_of[task] = klass
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task[None]) -> None:
+        job = self._running.pop(task, None)
+        if job is None:
+            return
+        self._running_by_processor[job.name] -= 1
+        klass = self._class_of.pop(task, None)
+        if klass:
+            self._running_by_class[klass] -= 1
+        if job.domain:
+            remaining = self._running_by_domain[job.domain] - 1
+            if remaining:
+                self._running_by_domain[job.domain] = remaining
+            else:
+                del self._running_by_domain[job.domain]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Job %s crashed", job.name, exc_info=task.exception())
+        self._pump()
+        if not self._pending and not self._running:
+            self._idle.set()
+
+
+def _request_count(job: SchedulableJob) -> int:
+    # A job reading the page cache copy (`input`) makes no request to the site;
+    # the download that filled the cache was throttled already.
+    if getattr(job, "input", None) is not None:
+        return 0
+    # A batched job fetches one URL per member.
+    return len(getattr(job, "members", None) or ()) or 1
+
+
+__all__ = ["JobScheduler", "Priority", "SchedulerLimits"]
@@ -4,32 +4,61 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import contextlib
+import functools
 import logging
-from dataclasses import dataclass
+import os
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Awaitable, Callable
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Literal
 
-from fastapi import Depends, FastAPI, Request, Response, status
+from fastapi import Depends, FastAPI, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, model_validator
 from starlette.middleware.base import RequestResponseEndpoint
 
-from .config import ConfigManager, DropSyncConfig
-from .processors import ProcessorManager, UrlItem
+from .captureio import CaptureIO, LoopLagMonitor
+from .config import ConfigManager, DropSyncConfig, DuplicateAction
+from .dedupe import DuplicateGroup, canonical_url, merge_group, merge_into_stub, plan_group
+from .httpclient import SharedHttpClient
+from .index import IndexedItem, InvalidCursorError, ItemIndex, ItemPage, SearchHit, index_path
+from .latency import LatencyTracker, latency_path
+from .pagecache import (
+    HtmlCompression,
+    InvalidHtmlPayloadError,
+    PageCache,
+    decode_html_payload,
+    decode_html_stream,
+)
+from .processors import ProcessorJob, ProcessorManager, UrlItem
+from .ratelimit import HostRateLimiter
 from .rules import ItemContext, RuleApplication, RuleEngine, load_rules
+from .titlecache import TitleCache, title_cache_path
 from .utils import (
+    AtomicFileWriter,
+    ChecksumMismatchError,
     ItemPaths,
     build_front_matter,
     build_item_paths,
+    capture_timestamp,
+    copy_fd_to_file,
     decode_base64_to_file,
     domain_from_url,
     infer_item_type_from_url,
+    item_paths_for,
+    publish_unique_path,
     resolve_title,
     sanitize_title,
+    slug_from_url,
+    staging_path,
+    title_from_html,
+    update_front_matter,
     utc_timestamp,
-    write_text_file,
+    write_stream_to_file,
 )
 
 logger = logging.getLogger("dropsync.server")
@@ -38,12 +67,25 @@ _FAVICON_BYTES = base64.b64decode(
     "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVORK5CYII="
 )
 
+# Content-Encoding of a document uploaded to POST /url/raw.
+_CONTENT_ENCODINGS: dict[str, HtmlCompression] = {
+    "gzip": "gzip",
+    "deflate": "deflate",
+    "identity": "identity",
+}
+
 
 class UrlPayload(BaseModel):
     url: HttpUrl
     title: str | None = None
     selection: str | None = None
     tags: list[str] | None = None
+    # The page as the client rendered it, base64 of the compressed document
+    # (or the plain document with html_compression = "identity").
+    html: str | None = None
+    html_compression: HtmlCompression = "gzip"
+    # What to do when the URL was captured before; None uses dedupe.on_duplicate.
+    on_duplicate: DuplicateAction | None = None
 
 
 class NotePayload(BaseModel):
@@ -69,9 +111,79 @@ class ItemResponse(BaseModel):
     path: str
     type: str
     processors: list[str] | None = None
+    sha256: str | None = None
+    # The URL was captured before and `path` is that earlier item.
+    duplicate: bool = False
+
+
+class ItemSummary(BaseModel):
+    path: str
+    kind: str
+    type: str
+    title: str
+    url: str | None = None
+    domain: str | None = None
+    tags: list[str] = Field(default_factory=list)
+    timestamp: str
+    processors: list[str] = Field(default_factory=list)
+
+    @classmethod
+    def from_item(cls, item: IndexedItem, **extra: Any) -> Any:
+        return cls(
+            path=str(item.path),
+            kind=item.kind,
+            type=item.type,
+            title=item.title,
+            url=item.url,
+            domain=item.domain,
+            tags=item.tags,
+            timestamp=item.timestamp,
+            processors=item.outputs,
+            **extra,
+        )
+
+
+class SearchResult(ItemSummary):
+    snippet: str
+    score: float
+
+    @classmethod
+    def from_hit(cls, hit: SearchHit) -> "SearchResult":
+        return cls.from_item(hit.item, snippet=hit.snippet, score=hit.score)
+
+
+class ItemList(BaseModel):
+    items: list[ItemSummary]
+    next_cursor: str | None = None
+
+
+class DeadLetter(BaseModel):
+    id: int
+    processor: str
+    url: str
+    domain: str
+    attempts: int
+    error: str | None = None
+    failed_at: float
+
+
+class RequeuePayload(BaseModel):
+    ids: list[int] = Field(default_factory=list)
+    # Requeueing everything must be asked for explicitly, as with `--all` in the CLI.
+    all: bool = False
+
+    @model_validator(mode="after")
+    def _require_selection(self) -> "RequeuePayload":
+        if not self.ids and not self.all:
+            raise ValueError("pass ids or set all to true")
+        return self
 
 
 ItemSavedListener = Callable[[Path, str], Awaitable[None] | None]
+ItemRenamedListener = Callable[[Path, Path], Awaitable[None] | None]
+
+# `title_source` of a stub whose title is still being fetched (titles.mode = "deferred").
+TITLE_PENDING = "pending"
 
 
 @dataclass(slots=True)
@@ -79,6 +191,16 @@ class SavedItem:
     path: Path
     item_type: str
     processors: list[str]
+    sha256: str | None = None
+    duplicate: bool = False
+
+
+@dataclass(slots=True)
+class StagedCapture:
+    # Hidden file the capture is written to.
+    staging: Path
+    # Where it was published; set when the `Collector._claim` block completes.
+    path: Path = field(init=False)
 
 
 class Collector:
@@ -89,11 +211,117 @@ class Collector:
         config_manager: ConfigManager,
         rule_engine: RuleEngine,
         processor_manager: ProcessorManager,
+        http: SharedHttpClient | None = None,
     ) -> None:
         self.config_manager = config_manager
         self.rule_engine = rule_engine
         self.processor_manager = processor_manager
+        self.http = http
+        self._title_cache: TitleCache | None = None
+        self._latency: LatencyTracker | None = None
+        self._io: CaptureIO | None = None
+        self._index: ItemIndex | None = None
         self._listeners: set[ItemSavedListener] = set()
+        self._rename_listeners: set[ItemRenamedListener] = set()
+        self._pending_titles: set[asyncio.Task[None]] = set()
+        # One lock per canonical URL being captured, so a double submit finds the first.
+        self._url_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self.add_listener(self._index_saved)
+        self.add_rename_listener(self._index_renamed)
+        processor_manager.add_finished_listener(self._index_job)
+
+    @property
+    def title_cache(self) -> TitleCache | None:
+        cfg = self.config_manager.config
+        if not cfg.titles.cache.enabled:
+            return None
+        path = title_cache_path(cfg.root_path)
+        if self._title_cache is not None and (
+            self._title_cache.path != path or self._title_cache.cfg != cfg.titles.cache
+        ):
+            self._title_cache.close()
+            self._title_cache = None
+        if self._title_cache is None:
+            self._title_cache = TitleCache(path, cfg.titles.cache)
+        return self._title_cache
+
+    @property
+    def latency(self) -> LatencyTracker | None:
+        cfg = self.config_manager.config
+        if not cfg.http.adaptive.enabled:
+            return None
+        path = latency_path(cfg.root_path)
+        if self._latency is not None and (
+            self._latency.path != path or self._latency.cfg != cfg.http.adaptive
+        ):
+            self._latency.close()
+            self._latency = None
+        if self._latency is None:
+            self._latency = LatencyTracker(path, cfg.http.adaptive)
+        return self._latency
+
+    @property
+    def io(self) -> CaptureIO:
+        cfg = self.config_manager.config.storage
+        if self._io is not None and self._io.cfg != cfg:
+            # Writes already queued still finish on the old pool.
+            self._io.executor.shutdown(wait=False)
+            self._io = None
+        if self._io is None:
+            self._io = CaptureIO(cfg)
+        return self._io
+
+    @property
+    def page_cache(self) -> PageCache | None:
+        """The processors' page cache, doing its file work on the capture I/O pool."""
+
+        pages = self.processor_manager.page_cache
+        if pages is not None:
+            pages.executor = self.io.executor
+        return pages
+
+    @property
+    def index(self) -> ItemIndex | None:
+        cfg = self.config_manager.config
+        if not cfg.index.enabled:
+            return None
+        path = index_path(cfg.root_path)
+        if self._index is not None and self._index.path != path:
+            self._index.close()
+            self._index = None
+        canonicalize = functools.partial(canonical_url, strip_params=tuple(cfg.dedupe.strip_params))
+        if self._index is None:
+            self._index = ItemIndex(path, cfg.index, canonicalize)
+        self._index.cfg = cfg.index
+        self._index.canonicalize = canonicalize
+        return self._index
+
+    async def close(self) -> None:
+        await self.wait_for_titles(timeout=self.config_manager.config.http.timeout + 1.0)
+        if self._io is not None:
+            await self._io.close()
+            self._io = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._title_cache is not None:
+            self._title_cache.close()
+            self._title_cache = None
+        if self._latency is not None:
+            self._latency.close()
+            self._latency = None
+
+    async def wait_for_titles(self, timeout: float | None = None) -> None:
+        """Let deferred title lookups finish; cancel those still running after ``timeout``."""
+
+        if not self._pending_titles:
+            return
+        _, still_running = await asyncio.wait(set(self._pending_titles), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
 
     def add_listener(self, listener: ItemSavedListener) -> None:
         self._listeners.add(listener)
@@ -101,19 +329,215 @@ class Collector:
     def remove_listener(self, listener: ItemSavedListener) -> None:
         self._listeners.discard(listener)
 
+    def add_rename_listener(self, listener: ItemRenamedListener) -> None:
+        self._rename_listeners.add(listener)
+
+    def remove_rename_listener(self, listener: ItemRenamedListener) -> None:
+        self._rename_listeners.discard(listener)
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 20,
+        kind: str | None = None,
+        domain: str | None = None,
+        tag: str | None = None,
+    ) -> list[SearchHit] | None:
+        """Full-text search over captured items; None when the index is disabled."""
+
+        index = self.index
+        if index is None:
+            return None
+        return await self.io.run(index.search, query, limit, kind, domain, tag)
+
+    async def list_items(
+        self,
+        limit: int = 50,
+        cursor: str | None = None,
+        newest_first: bool = True,
+        kind: str | None = None,
+        item_type: str | None = None,
+        domain: str | None = None,
+        tag: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> ItemPage | None:
+        """A page of captured items from the index; None when it is disabled.
+
+        Raises InvalidCursorError for a cursor this index did not hand out.
+        """
+
+        index = self.index
+        if index is None:
+            return None
+        return await self.io.run(
+            index.list_items,
+            limit,
+            cursor,
+            newest_first,
+            kind=kind,
+            item_type=item_type,
+            domain=domain,
+            tag=tag,
+            since=capture_timestamp(since) if since is not None else None,
+            until=capture_timestamp(until) if until is not None else None,
+        )
+
+    async def index_version(self) -> str | None:
+        index = self.index
+        return await self.io.run(index.version) if index is not None else None
+
+    async def reconcile_index(self) -> dict[str, int] | None:
+        """Pick up captures added, moved or removed behind the daemon's back."""
+
+        index = self.index
+        if index is None:
+            return None
+        cfg = self.config_manager.config
+        registry = self.processor_manager.registry
+        return await self.io.run(
+            index.reconcile,
+            cfg.root_path,
+            cfg.subdirectory_path("files"),
+            lambda stub: registry.outputs(cfg, stub),
+        )
+
+    async def dedupe(self, apply: bool = False) -> list[DuplicateGroup] | None:
+        """Items captured more than once; with ``apply`` each group is merged into one item.
+
+        None when the index is disabled.
+        """
+
+        index = self.index
+        if index is None:
+            return None
+        await self.reconcile_index()
+        # Picks up changed `dedupe.strip_params` for items indexed earlier.
+        await self.io.run(index.recanonicalize)
+        found = await self.io.run(index.duplicate_groups)
+        groups = [plan_group(canonical, items) for canonical, items in found.items()]
+        if not apply:
+            return groups
+        cfg = self.config_manager.config
+        registry = self.processor_manager.registry
+        for group in groups:
+            removed = await self.io.run(
+                merge_group, group, lambda stub: registry.outputs(cfg, stub), self.io.cfg.fsync
+            )
+            for path in removed:
+                await self.io.run(index.remove, path)
+            await self._reindex(group.keep.path)
+        return groups
+
+    async def _reindex(self, path: Path, is_file: bool = False) -> None:
+        index = self.index
+        if index is None:
+            return
+        cfg = self.config_manager.config
+        outputs = {} if is_file else self.processor_manager.registry.outputs(cfg, path)
+        await self.io.run(index.update, path, outputs, is_file)
+
+    async def _index_saved(self, path: Path, item_type: str) -> None:
+        await self._reindex(path, is_file=item_type == "file")
+
+    async def _index_renamed(self, old: Path, new: Path) -> None:
+        index = self.index
+        if index is not None:
+            await self.io.run(index.rename, old, new)
+            await self._reindex(new)
+
+    async def _index_job(self, job: ProcessorJob) -> None:
+        # Only jobs writing next to their capture change what is indexed for it.
+        if job.stub is not None and job.output is not None:
+            await self._reindex(job.stub)
+
     def update_rules(self) -> None:
         self.rule_engine = load_rules(self.config_manager.config.root_path)
 
-    async def save_url(self, payload: UrlPayload) -> SavedItem:
+    async def save_url(
+        self, payload: UrlPayload, html: AsyncIterable[bytes] | None = None
+    ) -> SavedItem:
+        """Capture a URL, or reuse the item already captured for it (see ``dedupe``).
+
+        ``html`` is an uploaded copy of the page, compressed as
+        ``payload.html_compression`` says, and takes the place of ``payload.html``.
+        """
+
+        action = payload.on_duplicate or self.config_manager.config.dedupe.on_duplicate
+        index = self.index
+        if action == "new" or index is None:
+            return await self._save_new_url(payload, html)
+        canonical = index.canonicalize(str(payload.url))
+        lock = self._url_locks.setdefault(canonical, asyncio.Lock())
+        async with lock:
+            existing = await self._captured_before(index, canonical)
+            if existing is None:
+                return await self._save_new_url(payload, html)
+            return await self._save_duplicate_url(existing, payload, action)
+
+    async def _captured_before(self, index: ItemIndex, canonical: str) -> IndexedItem | None:
+        while True:
+            item = await self.io.run(index.find_by_url, canonical)
+            if item is None or await self.io.run(item.path.exists):
+                return item
+            # Deleted behind the daemon's back and not reconciled yet.
+            await self.io.run(index.remove, item.path)
+
+    async def _save_duplicate_url(
+        self, existing: IndexedItem, payload: UrlPayload, action: DuplicateAction
+    ) -> SavedItem:
+        """Return ``existing``; with ``update`` fold the new tags and selection into it.
+
+        Processors only run again where their output is missing.
+        """
+
+        saved = SavedItem(path=existing.path, item_type="url", processors=[], duplicate=True)
+        logger.info("%s was captured before as %s", payload.url, existing.path)
+        if action != "update":
+            return saved
+        await self.io.run(
+            merge_into_stub,
+            existing.path,
+            payload.tags or [],
+            payload.selection,
+            utc_timestamp(),
+            self.io.cfg.fsync,
+        )
+        url = existing.url or str(payload.url)
+        domain = existing.domain or domain_from_url(url)
+        item = UrlItem(
+            url=url,
+            paths=item_paths_for(existing.path),
+            domain=domain,
+            item_type=existing.type or infer_item_type_from_url(domain),
+        )
+        saved.processors = self.processor_manager.queue_for_url(
+            item, extra_processors=[], missing_only=True
+        )
+        await self._notify(saved)
+        return saved
+
+    async def _save_new_url(
+        self, payload: UrlPayload, html: AsyncIterable[bytes] | None = None
+    ) -> SavedItem:
         cfg = self.config_manager.config
         timestamp = utc_timestamp()
         domain = domain_from_url(str(payload.url))
         item_type = infer_item_type_from_url(domain)
-        title, title_source = await resolve_title(str(payload.url), payload.title, cfg.filename_max_length)
+        pages = self._pages_for(item_type, domain)
+        if payload.html is not None or html is not None:
+            title, title_source = await self._title_from_supplied_html(payload, html)
+        elif payload.title or cfg.titles.mode == "inline":
+            title, title_source = await self._resolve_title(
+                str(payload.url), payload.title, pages
+            )
+        else:
+            title, title_source = self._title_without_fetch(str(payload.url))
+            self._prefetch_page(str(payload.url), title_source, pages)
         initial_paths = build_item_paths(cfg.subdirectory_path("links"), timestamp, title)
         rule_application = self._apply_rules(initial_paths.stub, domain, item_type)
         base_dir = cfg.subdirectory_path(rule_application.move_to or "links")
-        paths = build_item_paths(base_dir, timestamp, title)
+        candidate = build_item_paths(base_dir, timestamp, title).stub
 
         metadata: dict[str, Any] = {
             "title": title,
@@ -127,7 +551,7 @@ class Collector:
         }
         tags: set[str] = set(payload.tags or [])
 
-        rule_application = self._apply_rules(paths.stub, domain, item_type)
+        rule_application = self._apply_rules(candidate, domain, item_type)
         tags.update(rule_application.tags)
         if tags:
             metadata["tags"] = sorted(tags)
@@ -139,28 +563,202 @@ class Collector:
         if payload.selection:
             body_parts.append(payload.selection.strip())
         body_parts.append("\nCaptured via DropSync.")
-        write_text_file(paths.stub, "\n\n".join(body_parts))
-
-        processors = self.processor_manager.queue_for_url(
-            UrlItem(
-                url=str(payload.url),
-                paths=paths,
-                domain=domain,
-                item_type=item_type,
-            ),
-            extra_processors=rule_application.post,
-        )
+        async with self._claim(candidate) as capture:
+            await self.io.write_text(capture.staging, "\n\n".join(body_parts))
+        paths = item_paths_for(capture.path)
+
+        item = UrlItem(url=str(payload.url), paths=paths, domain=domain, item_type=item_type)
+        if title_source == TITLE_PENDING:
+            # Processors write next to the stub, so they wait for the final name.
+            task = asyncio.create_task(
+                self._finish_pending_title(item, timestamp, title, rule_application.post, pages)
+            )
+            self._pending_titles.add(task)
+            task.add_done_callback(self._pending_titles.discard)
+            processors: list[str] = []
+        else:
+            processors = self.processor_manager.queue_for_url(
+                item, extra_processors=rule_application.post
+            )
         saved = SavedItem(path=paths.stub, item_type="url", processors=processors)
         await self._notify(saved)
         return saved
 
+    async def _resolve_title(
+        self, url: str, provided_title: str | None, pages: PageCache | None = None
+    ) -> tuple[str, str]:
+        cfg = self.config_manager.config
+        title, title_source = await resolve_title(
+            url,
+            provided_title,
+            cfg.filename_max_length,
+            client=self.http.client if self.http is not None else None,
+            max_bytes=cfg.http.title_max_bytes,
+            cache=self.title_cache,
+            timeout=cfg.http.timeout,
+            latency=self.latency,
+            pages=pages,
+        )
+        self._prefetch_page(url, title_source, pages)
+        return title, title_source
+
+    async def _title_from_supplied_html(
+        self, payload: UrlPayload, html: AsyncIterable[bytes] | None = None
+    ) -> tuple[str, str]:
+        """Keep the client's copy of the page for the processors and take the title from it.
+
+        The copy is ``html`` when it was uploaded as the request body, else
+        ``payload.html``. Raises InvalidHtmlPayloadError before anything is
+        written for the capture.
+        """
+
+        cfg = self.config_manager.config
+        url = str(payload.url)
+        pages = self.page_cache
+        chunks: Iterable[bytes] | AsyncIterable[bytes]
+        if html is not None:
+            chunks = decode_html_stream(html, payload.html_compression)
+        else:
+            chunks = decode_html_payload(payload.html or "", payload.html_compression)
+        if pages is not None:
+            page = await pages.store(url, chunks, executor=self.io.executor)
+            head = await self.io.run(page.read_text, cfg.http.title_max_bytes)
+        elif isinstance(chunks, AsyncIterable):
+            head = await _stream_head(chunks, cfg.http.title_max_bytes)
+        else:
+            head = await self.io.run(_document_head, chunks, cfg.http.title_max_bytes)
+        if payload.title:
+            return sanitize_title(payload.title, cfg.filename_max_length), "provided"
+        metadata = title_from_html(head)
+        if metadata is None:
+            return sanitize_title(slug_from_url(url), cfg.filename_max_length), "slug"
+        return sanitize_title(metadata.title, cfg.filename_max_length), metadata.source
+
+    def _pages_for(self, item_type: str, domain: str) -> PageCache | None:
+        """The page cache when the item's processors will read the fetched page."""
+
+        if self.http is None or self.http.client is None:
+            return None
+        if not self.processor_manager.wants_page(item_type, domain):
+            return None
+        return self.page_cache
+
+    def _prefetch_page(self, url: str, title_source: str, pages: PageCache | None) -> None:
+        # Titles that came without a fetch (provided or cached) still leave the
+        # processors a page to read. A slug title means the site failed or was
+        # skipped; the processors then try the URL themselves.
+        if pages is None or self.http is None or self.http.client is None:
+            return
+        if title_source in ("slug", TITLE_PENDING):
+            return
+        pages.prefetch(self.http.client, url, self.config_manager.config.http.timeout)
+
+    def _title_without_fetch(self, url: str) -> tuple[str, str]:
+        max_length = self.config_manager.config.filename_max_length
+        title_cache = self.title_cache
+        cached = title_cache.get(url) if title_cache is not None else None
+        if cached is not None and cached.metadata is not None:
+            return sanitize_title(cached.metadata.title, max_length), cached.metadata.source
+        if cached is not None:
+            return sanitize_title(slug_from_url(url), max_length), "slug"
+        return sanitize_title(slug_from_url(url), max_length), TITLE_PENDING
+
+    async def _finish_pending_title(
+        self,
+        item: UrlItem,
+        timestamp: str,
+        slug_title: str,
+        extra_processors: list[str],
+        pages: PageCache | None = None,
+    ) -> None:
+        resolved = False
+        try:
+            title, title_source = await self._resolve_title(item.url, None, pages)
+            item.paths = await self._retitle(item.paths, timestamp, slug_title, title, title_source)
+            resolved = True
+        except FileNotFoundError:
+            logger.info("Stub %s disappeared before its title was resolved", item.paths.stub)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Deferred title lookup failed for %s", item.url)
+        finally:
+            # Also on cancellation (shutdown): the stub keeps its slug title rather
+            # than staying pending, and the journal picks the processors up again.
+            if resolved or await self._keep_slug_title(item.paths, timestamp, slug_title):
+                self.processor_manager.queue_for_url(item, extra_processors=extra_processors)
+
+    async def _keep_slug_title(self, paths: ItemPaths, timestamp: str, slug_title: str) -> bool:
+        """Settle a pending stub on its slug title; return False if the stub is gone."""
+
+        try:
+            await self._retitle(paths, timestamp, slug_title, slug_title, "slug")
+        except FileNotFoundError:
+            return False
+        except OSError:
+            logger.exception("Could not record the slug title of %s", paths.stub)
+        return True
+
+    async def _retitle(
+        self,
+        paths: ItemPaths,
+        timestamp: str,
+        old_title: str,
+        title: str,
+        title_source: str,
+    ) -> ItemPaths:
+        """Record the resolved title in the stub and rename it (and its companions)."""
+
+        new_paths = await self.io.run(
+            self._retitle_files, paths, timestamp, old_title, title, title_source
+        )
+        if new_paths is not paths:
+            await self._notify_renamed(paths.stub, new_paths.stub)
+        return new_paths
+
+    def _retitle_files(
+        self,
+        paths: ItemPaths,
+        timestamp: str,
+        old_title: str,
+        title: str,
+        title_source: str,
+    ) -> ItemPaths:
+        cfg = self.config_manager.config
+        stub = paths.stub
+        text = stub.read_text(encoding="utf-8")
+        writer = AtomicFileWriter(stub, cfg.storage.fsync)
+        try:
+            writer.write(
+                update_front_matter(text, {"title": title, "title_source": title_source}).encode(
+                    "utf-8"
+                )
+            )
+            writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+        if title == old_title:
+            return paths
+        new_paths = item_paths_for(
+            publish_unique_path(stub, build_item_paths(stub.parent, timestamp, title).stub)
+        )
+        registry = self.processor_manager.registry
+        companions = zip(
+            registry.companion_paths(cfg, stub),
+            registry.companion_paths(cfg, new_paths.stub),
+            strict=True,
+        )
+        for old, new in companions:
+            if old.exists():
+                os.rename(old, new)
+        return new_paths
+
     async def save_note(self, payload: NotePayload) -> SavedItem:
         cfg = self.config_manager.config
         timestamp = utc_timestamp()
         title = payload.title or payload.body.splitlines()[0][: cfg.filename_max_length]
         title = sanitize_title(title, cfg.filename_max_length)
         base_dir = cfg.subdirectory_path("notes")
-        path = build_item_paths(base_dir, timestamp, title).stub
+        candidate = build_item_paths(base_dir, timestamp, title).stub
 
         metadata = {
             "title": title,
@@ -172,8 +770,9 @@ class Collector:
             metadata["tags"] = payload.tags
 
         content = f"{build_front_matter(metadata)}\n\n{payload.body.strip()}\n"
-        write_text_file(path, content)
-        saved = SavedItem(path=path, item_type="note", processors=[])
+        async with self._claim(candidate) as capture:
+            await self.io.write_text(capture.staging, content)
+        saved = SavedItem(path=capture.path, item_type="note", processors=[])
         await self._notify(saved)
         return saved
 
@@ -183,7 +782,7 @@ class Collector:
         title = payload.title or payload.lang or "snippet"
         title = sanitize_title(title, cfg.filename_max_length)
         base_dir = cfg.subdirectory_path("code")
-        path = build_item_paths(base_dir, timestamp, title).stub
+        candidate = build_item_paths(base_dir, timestamp, title).stub
 
         metadata = {
             "title": title,
@@ -199,24 +798,77 @@ class Collector:
         code_block = payload.code.rstrip()
         fence = payload.lang or ""
         body = f"{build_front_matter(metadata)}\n\n```{fence}\n{code_block}\n```\n"
-        write_text_file(path, body)
-        saved = SavedItem(path=path, item_type="code", processors=[])
+        async with self._claim(candidate) as capture:
+            await self.io.write_text(capture.staging, body)
+        saved = SavedItem(path=capture.path, item_type="code", processors=[])
         await self._notify(saved)
         return saved
 
     async def save_file(self, payload: FilePayload) -> SavedItem:
+        fsync = self.config_manager.config.storage.fsync
+        async with self._claim(self._file_path(payload.name)) as capture:
+            await self.io.run(decode_base64_to_file, payload.content_b64, capture.staging, fsync)
+        saved = SavedItem(path=capture.path, item_type="file", processors=[])
+        await self._notify(saved)
+        return saved
+
+    async def save_file_stream(
+        self, name: str, chunks: AsyncIterable[bytes], sha256: str | None = None
+    ) -> SavedItem:
+        """Save an upload as it arrives; raises ChecksumMismatchError if ``sha256`` differs."""
+
+        io = self.io
+        async with self._claim(self._file_path(name)) as capture:
+            checksum = await write_stream_to_file(
+                chunks, capture.staging, sha256, fsync=io.cfg.fsync, executor=io.executor
+            )
+        saved = SavedItem(path=capture.path, item_type="file", processors=[], sha256=checksum)
+        await self._notify(saved)
+        return saved
+
+    async def save_file_fd(self, name: str, fd: int) -> SavedItem:
+        """Copy the file behind ``fd`` into place without reading it into memory.
+
+        The copy runs on the I/O pool; the caller still owns (and closes) ``fd``.
+        """
+
+        fsync = self.config_manager.config.storage.fsync
+        async with self._claim(self._file_path(name)) as capture:
+            await self.io.run(copy_fd_to_file, fd, capture.staging, fsync)
+        saved = SavedItem(path=capture.path, item_type="file", processors=[])
+        await self._notify(saved)
+        return saved
+
+    @contextlib.asynccontextmanager
+    async def _claim(self, candidate: Path) -> AsyncIterator[StagedCapture]:
+        """Publish one capture under ``candidate`` or the next free variant of it.
+
+        The block writes the complete capture to ``capture.staging``; it is then
+        linked into place on the I/O pool (see ``publish_unique_path``), so the
+        final name never shows an empty or partial file. A failed capture
+        leaves nothing behind.
+        """
+
+        capture = StagedCapture(staging_path(candidate))
+        try:
+            yield capture
+            capture.path = await self.io.run(
+                publish_unique_path, capture.staging, candidate, self.io.cfg.fsync
+            )
+        except BaseException:
+            capture.staging.unlink(missing_ok=True)
+            raise
+
+    def _file_path(self, name: str) -> Path:
         cfg = self.config_manager.config
         timestamp = utc_timestamp()
-        name = sanitize_title(payload.name, cfg.filename_max_length)
-        extension = Path(payload.name).suffix
+        title = sanitize_title(name, cfg.filename_max_length)
+        extension = Path(name).suffix
         base_dir = cfg.subdirectory_path("files")
-        path = build_item_paths(base_dir, timestamp, name).stub
+        path = build_item_paths(base_dir, timestamp, title).stub
         if extension:
             path = path.with_suffix(extension)
-        decode_base64_to_file(payload.content_b64, path)
-        saved = SavedItem(path=path, item_type="file", processors=[])
-        await self._notify(saved)
-        return saved
+        return path
 
     def _apply_rules(self, path: Path, domain: str, item_type: str) -> RuleApplication:
         extension = path.suffix.lstrip(".") if path.suffix else None
@@ -229,6 +881,15 @@ class Collector:
             )
         )
 
+    async def _notify_renamed(self, old: Path, new: Path) -> None:
+        for listener in list(self._rename_listeners):
+            try:
+                maybe_awaitable = listener(old, new)
+                if asyncio.iscoroutine(maybe_awaitable):
+                    await maybe_awaitable
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Rename listener failed for %s", new)
+
     async def _notify(self, item: SavedItem) -> None:
         for listener in list(self._listeners):
             try:
@@ -239,22 +900,83 @@ class Collector:
                 logger.exception("Listener failed for %s", item.path)
 
 
+def _document_head(chunks: Iterable[bytes], max_bytes: int) -> str:
+    data = bytearray()
+    for chunk in chunks:
+        data += chunk
+        if len(data) >= max_bytes:
+            break
+    return data.decode("utf-8", errors="replace")
+
+
+async def _stream_head(chunks: AsyncIterable[bytes], max_bytes: int) -> str:
+    data = bytearray()
+    async for chunk in chunks:
+        data += chunk
+        if len(data) >= max_bytes:
+            break
+    return data.decode("utf-8", errors="replace")
+
+
+def _index_disabled() -> JSONResponse:
+    return JSONResponse({"detail": "item index is disabled"}, status_code=503)
+
+
 class AppState:
     def __init__(self) -> None:
         self.config_manager = ConfigManager()
-        self.processor_manager = ProcessorManager(self.config_manager)
         self.rule_engine = load_rules(self.config_manager.config.root_path)
+        config = self.config_manager.config
+        self.rate_limiter = HostRateLimiter(config.rate_limits, self.rule_engine.rate_limits())
+        self.http = SharedHttpClient(config.http, self.rate_limiter)
+        self.processor_manager = ProcessorManager(
+            self.config_manager, rate_limiter=self.rate_limiter, http=self.http
+        )
         self.collector = Collector(
             config_manager=self.config_manager,
             rule_engine=self.rule_engine,
             processor_manager=self.processor_manager,
+            http=self.http,
         )
+        self.loop_monitor = LoopLagMonitor()
+        self._reconcile: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        self.config_manager.ensure_directories()
+        self.processor_manager.start()
+        await self.http.start()
+        self.loop_monitor.start()
+        self._reconcile = asyncio.create_task(self._reconcile_index())
+
+    async def close(self) -> None:
+        if self._reconcile is not None:
+            self._reconcile.cancel()
+            await asyncio.gather(self._reconcile, return_exceptions=True)
+            self._reconcile = None
+        await self.loop_monitor.stop()
+        await self.collector.close()
+        await self.http.close()
+
+    async def _reconcile_index(self) -> None:
+        try:
+            counts = await self.collector.reconcile_index()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to reconcile the item index")
+            return
+        if counts is not None:
+            logger.info(
+                "Item index: %d indexed, %d removed, %d unchanged",
+                counts["indexed"],
+                counts["removed"],
+                counts["unchanged"],
+            )
 
     def reload(self) -> DropSyncConfig:
         config = self.config_manager.reload()
         self.config_manager.ensure_directories()
         self.rule_engine = load_rules(config.root_path)
         self.collector.rule_engine = self.rule_engine
+        self.rate_limiter.configure(config.rate_limits, self.rule_engine.rate_limits())
         return config
 
 
@@ -286,7 +1008,11 @@ def create_app() -> FastAPI:
 
     @app.on_event("startup")
     async def _startup() -> None:
-        app_state.config_manager.ensure_directories()
+        await app_state.start()
+
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        await app_state.close()
 
     @app.middleware("http")
     async def auth_middleware(request: Request, call_next: RequestResponseEndpoint) -> Response:
@@ -300,11 +1026,51 @@ def create_app() -> FastAPI:
 
     @app.post("/url", response_model=ItemResponse)
     async def post_url(payload: UrlPayload, collector: Collector = Depends(get_collector)) -> ItemResponse:
-        saved = await collector.save_url(payload)
+        try:
+            saved = await collector.save_url(payload)
+        except InvalidHtmlPayloadError as exc:
+            return JSONResponse({"detail": str(exc)}, status_code=422)
+        return ItemResponse(
+            path=str(saved.path),
+            type=saved.item_type,
+            processors=saved.processors,
+            duplicate=saved.duplicate,
+        )
+
+    @app.post("/url/raw", response_model=ItemResponse)
+    async def post_url_raw(
+        request: Request,
+        url: HttpUrl,
+        title: str | None = None,
+        selection: str | None = None,
+        tags: list[str] | None = Query(None),
+        on_duplicate: DuplicateAction | None = None,
+        collector: Collector = Depends(get_collector),
+    ) -> ItemResponse:
+        encoding = request.headers.get("Content-Encoding", "identity").strip().lower()
+        compression = _CONTENT_ENCODINGS.get(encoding)
+        if compression is None:
+            return JSONResponse(
+                {"detail": f"unsupported Content-Encoding: {encoding}"},
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        payload = UrlPayload(
+            url=url,
+            title=title,
+            selection=selection,
+            tags=tags,
+            html_compression=compression,
+            on_duplicate=on_duplicate,
+        )
+        try:
+            saved = await collector.save_url(payload, html=request.stream())
+        except InvalidHtmlPayloadError as exc:
+            return JSONResponse({"detail": str(exc)}, status_code=422)
         return ItemResponse(
             path=str(saved.path),
             type=saved.item_type,
             processors=saved.processors,
+            duplicate=saved.duplicate,
         )
 
     @app.post("/note", response_model=ItemResponse)
@@ -322,6 +1088,21 @@ def create_app() -> FastAPI:
         saved = await collector.save_file(payload)
         return ItemResponse(path=str(saved.path), type=saved.item_type, processors=[])
 
+    @app.post("/file/raw", response_model=ItemResponse)
+    async def post_file_raw(
+        request: Request,
+        name: str,
+        sha256: str | None = None,
+        collector: Collector = Depends(get_collector),
+    ) -> ItemResponse:
+        try:
+            saved = await collector.save_file_stream(name, request.stream(), sha256)
+        except ChecksumMismatchError as exc:
+            return JSONResponse({"detail": str(exc)}, status_code=422)
+        return ItemResponse(
+            path=str(saved.path), type=saved.item_type, processors=[], sha256=saved.sha256
+        )
+
     @app.get("/health")
     async def get_health(config: DropSyncConfig = Depends(get_config)) -> dict[str, Any]:
         return {
@@ -331,6 +1112,101 @@ def create_app() -> FastAPI:
             "port": config.port,
         }
 
+    @app.get("/stats")
+    async def get_stats() -> dict[str, Any]:
+        title_cache = app_state.collector.title_cache
+        latency = app_state.collector.latency
+        index = app_state.collector.index
+        http_stats = app_state.http.stats()
+        if latency is not None:
+            http_stats["latency"] = latency.stats(get_config().http.timeout)
+        return {
+            "processors": app_state.processor_manager.stats(),
+            "http": http_stats,
+            "titles": title_cache.stats() if title_cache is not None else None,
+            "rate_limits": app_state.rate_limiter.stats(),
+            "io": app_state.collector.io.stats(),
+            "index": index.stats() if index is not None else None,
+            "loop": app_state.loop_monitor.stats(),
+        }
+
+    @app.get("/search", response_model=list[SearchResult])
+    async def get_search(
+        q: str,
+        limit: int = Query(20, ge=1, le=200),
+        kind: str | None = None,
+        domain: str | None = None,
+        tag: str | None = None,
+        collector: Collector = Depends(get_collector),
+    ) -> list[SearchResult]:
+        hits = await collector.search(q, limit, kind, domain, tag)
+        if hits is None:
+            return _index_disabled()
+        return [SearchResult.from_hit(hit) for hit in hits]
+
+    @app.get("/items", response_model=ItemList)
+    async def get_items(
+        request: Request,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: str | None = None,
+        order: Literal["newest", "oldest"] = "newest",
+        kind: str | None = None,
+        item_type: str | None = Query(None, alias="type"),
+        domain: str | None = None,
+        tag: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        collector: Collector = Depends(get_collector),
+    ) -> Response:
+        version = await collector.index_version()
+        if version is None:
+            return _index_disabled()
+        # One ETag per index state; caches key it by the full URL, query included.
+        etag = f'"{version}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        try:
+            page = await collector.list_items(
+                limit,
+                cursor,
+                order == "newest",
+                kind=kind,
+                item_type=item_type,
+                domain=domain,
+                tag=tag,
+                since=since,
+                until=until,
+            )
+        except InvalidCursorError as exc:
+            return JSONResponse({"detail": str(exc)}, status_code=422)
+        if page is None:
+            return _index_disabled()
+        body = ItemList(
+            items=[ItemSummary.from_item(item) for item in page.items],
+            next_cursor=page.next_cursor,
+        )
+        return JSONResponse(body.model_dump(mode="json"), headers={"ETag": etag})
+
+    @app.get("/processors/dead-letters", response_model=list[DeadLetter])
+    async def get_dead_letters(limit: int = 100) -> list[DeadLetter]:
+        return [
+            DeadLetter(
+                id=entry.id,
+                processor=entry.name,
+                url=entry.url,
+                domain=entry.domain,
+                attempts=entry.attempts,
+                error=entry.error,
+                failed_at=entry.updated_at,
+            )
+            for entry in app_state.processor_manager.dead_letters(limit)
+        ]
+
+    @app.post("/processors/dead-letters/requeue")
+    async def post_requeue_dead_letters(payload: RequeuePayload) -> dict[str, int]:
+        ids = None if payload.all else payload.ids
+        return {"requeued": app_state.processor_manager.requeue_dead_letters(ids)}
+
     @app.post("/config/reload")
     async def post_config_reload() -> JSONResponse:
         config = app_state.reload()
@@ -0,0 +1,169 @@
+"""Two-level cache of resolved page titles."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit
+
+from .config import TitleCacheConfig
+from .utils import TitleMetadata
+
+logger = logging.getLogger("dropsync.titles")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    key TEXT PRIMARY KEY,
+    title TEXT,
+    source TEXT,
+    expires_at REAL NOT NULL
+);
+"""
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass(slots=True)
+class CachedTitle:
+    """A cached lookup; ``title`` is None for a negative entry."""
+
+    title: str | None
+    source: str | None
+    expires_at: float
+
+    @property
+    def metadata(self) -> TitleMetadata | None:
+        if self.title is None:
+            return None
+        return TitleMetadata(title=self.title, source=self.source or "title")
+
+
+def title_cache_path(root: Path) -> Path:
+    return root / ".dropsync" / "titles.sqlite"
+
+
+def cache_key(url: str) -> str:
+    """Key for ``url``: scheme and host lowercased, default port and fragment dropped."""
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port is not None and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def _host_key(url: str) -> str:
+    return "host:" + (urlsplit(url).hostname or "").lower()
+
+
+class TitleCache:
+    """In-memory LRU in front of a SQLite table.
+
+    Besides titles it stores negative entries: per URL when a lookup produced
+    no title, and per host when the host timed out or refused the connection,
+    so captures from a dead site skip straight to the slug fallback.
+    """
+
+    def __init__(self, path: Path | None, cfg: TitleCacheConfig) -> None:
+        self.path = path
+        self.cfg = cfg
+        self._memory: OrderedDict[str, CachedTitle] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute("DELETE FROM titles WHERE expires_at < ?", (time.time(),))
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, url: str) -> CachedTitle | None:
+        now = time.time()
+        entry = self._lookup(_host_key(url), now) or self._lookup(cache_key(url), now)
+        if entry is None:
+            self.misses += 1
+        elif entry.title is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, url: str, metadata: TitleMetadata | None) -> None:
+        if metadata is None:
+            self._put(cache_key(url), CachedTitle(None, None, time.time() + self.cfg.negative_ttl))
+        else:
+            self._put(
+                cache_key(url),
+                CachedTitle(metadata.title, metadata.source, time.time() + self.cfg.ttl),
+            )
+
+    def store_host_failure(self, url: str) -> None:
+        self._put(_host_key(url), CachedTitle(None, None, time.time() + self.cfg.host_failure_ttl))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+    def _lookup(self, key: str, now: float) -> CachedTitle | None:
+        entry = self._memory.get(key)
+        if entry is None and self._conn is not None:
+            row = self._conn.execute(
+                "SELECT title, source, expires_at FROM titles WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = CachedTitle(*row)
+                self._remember(key, entry)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._forget(key)
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, entry: CachedTitle) -> None:
+        if entry.expires_at <= time.time():
+            return
+        self._remember(key, entry)
+        if self._conn is not None:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO titles (key, title, source, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, entry.title, entry.source, entry.expires_at),
+                )
+            except sqlite3.Error:
+                logger.exception("Failed to persist cached title for %s", key)
+
+    def _remember(self, key: str, entry: CachedTitle) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.cfg.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        self._memory.pop(key, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM titles WHERE key = ?", (key,))
+
+
+__all__ = ["CachedTitle", "TitleCache", "cache_key", "title_cache_path"]
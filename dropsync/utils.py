@@ -4,21 +4,48 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import codecs
+import errno
+import fcntl
 import hashlib
+import os
 import re
+import secrets
+import shutil
+import stat
+import tempfile
+import time
+from concurrent.futures import Executor
 from dataclasses import dataclass
+from functools import cache
 from datetime import datetime, timezone
 from html.parser import HTMLParser
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterable, BinaryIO, Iterable, Iterator, Optional
 from urllib.parse import urlparse
 
 import httpx
 
+from .config import FsyncPolicy
+from .ratelimit import RateLimitExceededError
+
+if TYPE_CHECKING:
+    from .latency import LatencyTracker
+    from .pagecache import PageCache
+    from .titlecache import TitleCache
+
 
 SAFE_FILENAME_PATTERN = re.compile(r"[^\w\s._-]")
 MULTISPACE_PATTERN = re.compile(r"\s+")
 
+# Title lookups read at most this much of a page.
+TITLE_MAX_BYTES = 128 * 1024
+_TITLE_DRAIN_BYTES = 16 * 1024
+_HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+
+# Name collisions past ``--2`` .. ``--<this + 1>`` get a random suffix instead.
+_NUMBERED_CANDIDATES = 64
+
 
 @dataclass(slots=True)
 class TitleMetadata:
@@ -32,10 +59,32 @@ class _MetaTitleParser(HTMLParser):
         self.meta_title: Optional[str] = None
         self.h1_title: Optional[str] = None
         self.page_title: Optional[str] = None
+        self.title_tag: Optional[str] = None
+        self.head_closed = False
         self._in_h1 = False
+        self._in_title = False
+
+    @property
+    def done(self) -> bool:
+        """Nothing later in the document would change the chosen title."""
+
+        return bool(self.meta_title) or (self.head_closed and bool(self.title_tag))
+
+    def result(self) -> Optional[TitleMetadata]:
+        if self.meta_title:
+            return TitleMetadata(title=self.meta_title, source="meta")
+        if self.h1_title:
+            return TitleMetadata(title=self.h1_title, source="h1")
+        if self.title_tag or self.page_title:
+            return TitleMetadata(title=self.title_tag or self.page_title or "", source="title")
+        return None
 
     def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
-        if tag.lower() == "meta":
+        if tag.lower() == "title":
+            self._in_title = True
+        elif tag.lower() == "body":
+            self.head_closed = True
+        elif tag.lower() == "meta":
             attr_map = {name.lower(): (value or "") for name, value in attrs}
             prop = attr_map.get("property") or attr_map.get("name")
             content = attr_map.get("content")
@@ -49,8 +98,14 @@ class _MetaTitleParser(HTMLParser):
     def handle_endtag(self, tag: str) -> None:
         if tag.lower() == "h1":
             self._in_h1 = False
+        elif tag.lower() == "title":
+            self._in_title = False
+        elif tag.lower() == "head":
+            self.head_closed = True
 
     def handle_data(self, data: str) -> None:
+        if self._in_title and not self.title_tag:
+            self.title_tag = data.strip()
         if self._in_h1:
             if not self.h1_title:
                 self.h1_title = data.strip()
@@ -58,8 +113,22 @@ class _MetaTitleParser(HTMLParser):
             self.page_title = data.strip()
 
 
+def title_from_html(html: str) -> Optional[TitleMetadata]:
+    parser = _MetaTitleParser()
+    parser.feed(html)
+    return parser.result()
+
+
 def utc_timestamp() -> str:
-    return datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return capture_timestamp(datetime.now(timezone.utc))
+
+
+def capture_timestamp(moment: datetime) -> str:
+    """``moment`` in the ``YYYYMMDD-HHMMSS`` (UTC) form used in file names; naive means UTC."""
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y%m%d-%H%M%S")
 
 
 def sanitize_title(raw_title: str, max_length: int = 120) -> str:
@@ -87,60 +156,422 @@ def slug_from_url(url: str) -> str:
     return parsed.netloc or "untitled"
 
 
-async def fetch_title_from_url(url: str, timeout: float = 3.0) -> Optional[TitleMetadata]:
+async def fetch_title_from_url(
+    url: str,
+    timeout: float = 3.0,
+    client: Optional[httpx.AsyncClient] = None,
+    max_bytes: int = TITLE_MAX_BYTES,
+) -> Optional[TitleMetadata]:
+    """Fetch ``url`` and pick a title; ``client`` is the daemon's shared pool if running.
+
+    The body is streamed into the parser and the download stops as soon as the
+    title is settled, after ``max_bytes``, or straight away for non-HTML content.
+    """
+
     try:
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-            response = await client.get(url, headers={"User-Agent": "DropSync/0.1"})
-            response.raise_for_status()
+        return await _fetch_title(url, timeout, client, max_bytes)
     except httpx.HTTPError:
         return None
+
+
+async def _fetch_title(
+    url: str,
+    timeout: float,
+    client: Optional[httpx.AsyncClient],
+    max_bytes: int,
+) -> Optional[TitleMetadata]:
+    if client is not None:
+        return await _stream_title(client, url, max_bytes, timeout)
+    async with httpx.AsyncClient(
+        timeout=timeout, follow_redirects=True, headers={"User-Agent": "DropSync/0.1"}
+    ) as own_client:
+        return await _stream_title(own_client, url, max_bytes, timeout)
+
+
+async def _stream_title(
+    client: httpx.AsyncClient, url: str, max_bytes: int, timeout: float
+) -> Optional[TitleMetadata]:
     parser = _MetaTitleParser()
-    parser.feed(response.text[:20000])
-    if parser.meta_title:
-        return TitleMetadata(title=parser.meta_title, source="meta")
-    if parser.h1_title:
-        return TitleMetadata(title=parser.h1_title, source="h1")
-    if parser.page_title:
-        return TitleMetadata(title=parser.page_title, source="title")
-    return None
+    async with client.stream("GET", url, timeout=timeout) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in _HTML_CONTENT_TYPES:
+            return None
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        received = 0
+        chunks = response.aiter_bytes()
+        async for chunk in chunks:
+            chunk = chunk[: max_bytes - received]
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or received >= max_bytes:
+                break
+        # Closing a response mid-body drops its connection; finish short
+        # bodies so the connection goes back to the pool.
+        remaining = _content_length(response) - response.num_bytes_downloaded
+        if 0 <= remaining <= _TITLE_DRAIN_BYTES:
+            async for _ in chunks:
+                pass
+    return parser.result()
+
+
+def _content_length(response: httpx.Response) -> int:
+    try:
+        return int(response.headers.get("content-length", ""))
+    except ValueError:
+        return -1
 
 
 async def resolve_title(
     url: str,
     provided_title: Optional[str],
     max_length: int,
+    client: Optional[httpx.AsyncClient] = None,
+    max_bytes: int = TITLE_MAX_BYTES,
+    cache: Optional["TitleCache"] = None,
+    timeout: float = 3.0,
+    latency: Optional["LatencyTracker"] = None,
+    pages: Optional["PageCache"] = None,
 ) -> tuple[str, str]:
     if provided_title:
         sanitized = sanitize_title(provided_title, max_length=max_length)
         return sanitized, "provided"
-    metadata = await fetch_title_from_url(url)
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None:
+        metadata = cached.metadata
+    else:
+        metadata = await _lookup_title(url, timeout, client, max_bytes, cache, latency, pages)
     if metadata:
         return sanitize_title(metadata.title, max_length=max_length), metadata.source
     slug = slug_from_url(url)
     return sanitize_title(slug, max_length=max_length), "slug"
 
 
-def unique_filename(base_path: Path) -> Path:
-    if not base_path.exists():
-        return base_path
-    counter = hashlib.sha256(str(base_path).encode("utf-8")).hexdigest()[:8]
-    new_name = f"{base_path.stem}--{counter}{base_path.suffix}"
-    return base_path.with_name(new_name)
+async def _lookup_title(
+    url: str,
+    timeout: float,
+    client: Optional[httpx.AsyncClient],
+    max_bytes: int,
+    cache: Optional["TitleCache"],
+    latency: Optional["LatencyTracker"],
+    pages: Optional["PageCache"] = None,
+) -> Optional[TitleMetadata]:
+    domain = domain_from_url(url)
+    ceiling = timeout
+    if latency is not None:
+        if not latency.allow(domain):
+            return None
+        timeout = latency.timeout_for(domain, ceiling)
+    started = time.monotonic()
+    try:
+        if pages is not None and client is not None:
+            # Download the whole page once for the processors, parsing the title on the way.
+            metadata = await pages.fetch_title(client, url, timeout, max_bytes)
+        else:
+            metadata = await _fetch_title(url, timeout, client, max_bytes)
+    except RateLimitExceededError:
+        # Our own throttling says nothing about the site; just use the slug this time.
+        return None
+    except (httpx.TimeoutException, httpx.ConnectError) as exc:
+        # With latency tracking the circuit breaker decides when to retry the host.
+        if latency is not None and isinstance(exc, httpx.TimeoutException):
+            latency.record_timeout(domain, timeout, ceiling)
+        elif latency is not None:
+            latency.record_failure(domain)
+        elif cache is not None:
+            cache.store_host_failure(url)
+        return None
+    except httpx.HTTPError as exc:
+        if latency is not None and isinstance(exc, httpx.HTTPStatusError):
+            latency.record_success(domain, time.monotonic() - started)
+        if cache is not None:
+            cache.store(url, None)
+        return None
+    if latency is not None:
+        latency.record_success(domain, time.monotonic() - started)
+    if cache is not None:
+        cache.store(url, metadata)
+    return metadata
+
+
+def _candidate_paths(base_path: Path) -> Iterator[Path]:
+    yield base_path
+    for counter in range(2, _NUMBERED_CANDIDATES + 2):
+        yield base_path.with_name(f"{base_path.stem}--{counter}{base_path.suffix}")
+    while True:
+        yield base_path.with_name(f"{base_path.stem}--{secrets.token_hex(4)}{base_path.suffix}")
+
+
+# link() failures meaning the file system (or this pair of directories) has no hard links.
+_NO_HARD_LINKS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOSYS, errno.EXDEV, errno.EMLINK}
+
+
+def claim_unique_path(base_path: Path) -> Path:
+    """Create an empty placeholder at ``base_path``, or at ``<stem>--2``, ``--3``, ...
+
+    The name is claimed with ``O_CREAT | O_EXCL``, so concurrent captures (in
+    this process or another daemon writing the same directory) never get the
+    same path. Readers can see the empty file until the caller replaces it;
+    prefer :func:`publish_unique_path` for content that is already written.
+    """
+
+    ensure_directory(base_path.parent)
+    for candidate in _candidate_paths(base_path):
+        try:
+            fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return candidate
+    raise AssertionError("unreachable")
+
+
+def staging_path(base_path: Path) -> Path:
+    """Hidden sibling of ``base_path`` to write a capture to before publishing it."""
+
+    return base_path.with_name(f".{base_path.name}.{secrets.token_hex(4)}.staged")
+
+
+def publish_unique_path(source: Path, base_path: Path, fsync: FsyncPolicy = "none") -> Path:
+    """Move the complete file ``source`` to ``base_path`` or its next free variant.
+
+    The name is taken with ``link()``, which fails instead of replacing an
+    existing file, so claiming the name and publishing the content are one
+    step: no reader sees an empty or partial file under the final name, and
+    concurrent captures never get the same path. Where hard links are not
+    available it falls back to a :func:`claim_unique_path` placeholder that is
+    replaced right away. ``source`` is gone afterwards.
+    """
+
+    ensure_directory(base_path.parent)
+    for candidate in _candidate_paths(base_path):
+        try:
+            os.link(source, candidate)
+        except FileExistsError:
+            continue
+        except OSError as exc:
+            if exc.errno not in _NO_HARD_LINKS:
+                raise
+            candidate = claim_unique_path(base_path)
+            try:
+                shutil.move(str(source), candidate)
+            except BaseException:
+                candidate.unlink(missing_ok=True)
+                raise
+        else:
+            source.unlink()
+        if fsync == "file+dir":
+            fsync_directory(candidate.parent)
+        return candidate
+    raise AssertionError("unreachable")
+
+
+def fsync_directory(path: Path) -> None:
+    directory = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
 
 
 def ensure_directory(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
 
-def write_text_file(path: Path, content: str) -> None:
-    ensure_directory(path.parent)
-    path.write_text(content, encoding="utf-8")
+def write_text_file(path: Path, content: str, fsync: FsyncPolicy = "none") -> None:
+    writer = AtomicFileWriter(path, fsync)
+    try:
+        writer.write(content.encode("utf-8"))
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+
+
+class AtomicFileWriter:
+    """Write to a hidden temporary sibling of ``path`` and rename it into place.
+
+    Readers (and Syncthing) only ever observe the previous file or the complete
+    new one; ``discard`` drops the partial output instead. ``fsync`` makes the
+    content (``"file"``) and also the rename (``"file+dir"``) durable on commit.
+    """
+
+    def __init__(self, path: Path, fsync: FsyncPolicy = "none") -> None:
+        ensure_directory(path.parent)
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+        # mkstemp creates 0600 files; give the result the mode a plain open()
+        # would have, or keep the mode of the file being replaced.
+        try:
+            mode = stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_process_umask()
+        os.fchmod(fd, mode)
+        self.path = path
+        self.fsync = fsync
+        self.temp_path = Path(temp_name)
+        self.size = 0
+        self._file: BinaryIO = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.size += len(data)
+
+    def fileno(self) -> int:
+        """Descriptor of the temporary file, for copies done by the kernel."""
+
+        self._file.flush()
+        return self._file.fileno()
+
+    def commit(self) -> Path:
+        if self.fsync != "none":
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+        if self.fsync == "file+dir":
+            fsync_directory(self.path.parent)
+        return self.path
+
+    def discard(self) -> None:
+        self._file.close()
+        self.temp_path.unlink(missing_ok=True)
+
+
+@cache
+def _process_umask() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    # Fallback where /proc is unavailable; briefly swaps the umask.
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+# Uploads are decoded, hashed and written in chunks of this size.
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class ChecksumMismatchError(ValueError):
+    """An upload's content does not match the SHA-256 the client announced."""
+
+
+def decode_base64_to_file(content_b64: str, path: Path, fsync: FsyncPolicy = "none") -> None:
+    """Decode ``content_b64`` into ``path`` a chunk at a time, atomically."""
+
+    if MULTISPACE_PATTERN.search(content_b64):
+        content_b64 = MULTISPACE_PATTERN.sub("", content_b64)
+    # A multiple of 4 characters decodes to whole bytes.
+    step = UPLOAD_CHUNK_BYTES // 3 * 4
+    writer = AtomicFileWriter(path, fsync)
+    try:
+        for start in range(0, len(content_b64), step):
+            writer.write(base64.b64decode(content_b64[start : start + step]))
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+
+
+# ioctl that makes the destination share the source's extents (btrfs, XFS, ...).
+_FICLONE = 0x40049409
+
+
+def copy_fd_to_file(source_fd: int, path: Path, fsync: FsyncPolicy = "none") -> int:
+    """Copy everything readable from ``source_fd`` into ``path`` atomically.
 
+    Tries, in order, a reflink of the whole file, ``copy_file_range`` and
+    ``sendfile`` so the data never passes through Python, and falls back to
+    plain reads for pipes and sockets. Returns the number of bytes copied.
+    The caller keeps ownership of ``source_fd``.
+    """
 
-def decode_base64_to_file(content_b64: str, path: Path) -> None:
-    ensure_directory(path.parent)
-    data = base64.b64decode(content_b64)
-    path.write_bytes(data)
+    writer = AtomicFileWriter(path, fsync)
+    try:
+        writer.size = _copy_fd(source_fd, writer.fileno())
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+    return writer.size
+
+
+def _copy_fd(source_fd: int, target_fd: int) -> int:
+    try:
+        regular = stat.S_ISREG(os.fstat(source_fd).st_mode)
+        offset = os.lseek(source_fd, 0, os.SEEK_CUR) if regular else -1
+    except OSError:
+        regular, offset = False, -1
+    if regular and offset == 0:
+        try:
+            fcntl.ioctl(target_fd, _FICLONE, source_fd)
+            size = os.fstat(source_fd).st_size
+            os.lseek(source_fd, size, os.SEEK_SET)
+            return size
+        except OSError:
+            pass
+    copied = 0
+    if regular:
+        for kernel_copy in (_copy_file_range, _sendfile):
+            try:
+                while count := kernel_copy(source_fd, target_fd):
+                    copied += count
+                return copied
+            except (AttributeError, OSError):
+                # Unsupported here (or across these file systems); carry on
+                # from wherever the previous method stopped.
+                continue
+    while chunk := os.read(source_fd, UPLOAD_CHUNK_BYTES):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(target_fd, view) :]
+        copied += len(chunk)
+    return copied
+
+
+def _copy_file_range(source_fd: int, target_fd: int) -> int:
+    return os.copy_file_range(source_fd, target_fd, 1 << 30)
+
+
+def _sendfile(source_fd: int, target_fd: int) -> int:
+    return os.sendfile(target_fd, source_fd, None, 1 << 30)
+
+
+async def write_stream_to_file(
+    chunks: AsyncIterable[bytes],
+    path: Path,
+    expected_sha256: Optional[str] = None,
+    fsync: FsyncPolicy = "none",
+    executor: Optional[Executor] = None,
+) -> str:
+    """Write ``chunks`` to ``path`` atomically and return the content's SHA-256.
+
+    Memory use is one chunk regardless of size; the disk writes run on
+    ``executor``. If ``expected_sha256`` is given and does not match, nothing is
+    written and ChecksumMismatchError is raised.
+    """
+
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    writer = await loop.run_in_executor(executor, AtomicFileWriter, path, fsync)
+    try:
+        async for chunk in chunks:
+            digest.update(chunk)
+            await loop.run_in_executor(executor, writer.write, chunk)
+        checksum = digest.hexdigest()
+        if expected_sha256 is not None and checksum != expected_sha256.lower():
+            raise ChecksumMismatchError(
+                f"sha256 mismatch: expected {expected_sha256}, got {checksum}"
+            )
+    except BaseException:
+        writer.discard()
+        raise
+    await loop.run_in_executor(executor, writer.commit)
+    return checksum
 
 
 def domain_from_url(url: str) -> str:
@@ -178,38 +609,109 @@ class ItemPaths:
     singlefile: Path
 
 
+def item_paths_for(stub: Path) -> ItemPaths:
+    return ItemPaths(
+        stub=stub,
+        readable=stub.with_suffix(".readable.md"),
+        singlefile=stub.with_suffix(".single.html"),
+    )
+
+
 def build_item_paths(base_dir: Path, timestamp: str, title: str) -> ItemPaths:
+    """Paths an item would get; the stub name is only reserved by ``claim_unique_path``."""
+
     safe_title = sanitize_title(title)
-    stub_path = unique_filename(base_dir / f"{timestamp}--{safe_title}.md")
-    readable_path = stub_path.with_suffix(".readable.md")
-    single_path = stub_path.with_suffix(".single.html")
-    return ItemPaths(stub=stub_path, readable=readable_path, singlefile=single_path)
+    return item_paths_for(base_dir / f"{timestamp}--{safe_title}.md")
+
+
+def _front_matter_line(key: str, value: Any) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return f"{key}: [{', '.join(str(v) for v in value)}]"
+    return f"{key}: {value}"
 
 
 def build_front_matter(metadata: dict[str, Any]) -> str:
     lines = ["---"]
     for key, value in metadata.items():
-        if isinstance(value, (list, tuple, set)):
-            lines.append(f"{key}: [{', '.join(str(v) for v in value)}]")
-        else:
-            lines.append(f"{key}: {value}")
+        lines.append(_front_matter_line(key, value))
     lines.append("---\n")
     return "\n".join(lines)
 
 
+def parse_front_matter(text: str) -> tuple[dict[str, Any], str]:
+    """Split a capture into its front matter (as written by ``build_front_matter``) and body."""
+
+    if not text.startswith("---\n"):
+        return {}, text
+    lines = text.split("\n")
+    metadata: dict[str, Any] = {}
+    end = len(lines)
+    for index in range(1, len(lines)):
+        line = lines[index]
+        if line.strip() == "---":
+            end = index
+            break
+        if ":" not in line:
+            continue
+        key, raw_value = line.split(":", 1)
+        key = key.strip()
+        value = raw_value.strip().strip('"')
+        if value.startswith("[") and value.endswith("]"):
+            inner = value[1:-1].strip()
+            metadata[key] = [item.strip().strip('"') for item in inner.split(",") if item.strip()]
+        else:
+            metadata[key] = value
+    return metadata, "\n".join(lines[end + 1 :]).strip()
+
+
+def update_front_matter(text: str, updates: dict[str, Any]) -> str:
+    """Replace existing ``key: value`` lines of the leading front matter block.
+
+    Keys the block does not have yet are added at its end.
+    """
+
+    lines = text.split("\n")
+    if not lines or lines[0] != "---":
+        return text
+    missing = dict(updates)
+    end = len(lines)
+    for index in range(1, len(lines)):
+        if lines[index] == "---":
+            end = index
+            break
+        key = lines[index].split(":", 1)[0].strip()
+        if key in updates:
+            lines[index] = _front_matter_line(key, updates[key])
+            missing.pop(key, None)
+    lines[end:end] = [_front_matter_line(key, value) for key, value in missing.items()]
+    return "\n".join(lines)
+
+
 __all__ = [
     "utc_timestamp",
+    "capture_timestamp",
     "sanitize_title",
     "slug_from_url",
     "fetch_title_from_url",
     "resolve_title",
-    "unique_filename",
+    "title_from_html",
+    "claim_unique_path",
+    "publish_unique_path",
+    "staging_path",
+    "fsync_directory",
     "ensure_directory",
     "write_text_file",
+    "AtomicFileWriter",
     "decode_base64_to_file",
+    "write_stream_to_file",
+    "copy_fd_to_file",
+    "ChecksumMismatchError",
     "domain_from_url",
     "infer_item_type_from_url",
     "build_item_paths",
+    "item_paths_for",
     "build_front_matter",
+    "parse_front_matter",
+    "update_front_matter",
     "TitleMetadata",
 ]
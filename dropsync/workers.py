@@ -0,0 +1,271 @@
+"""Long-lived co-process workers for processors.
+
+A worker is started once and fed jobs as newline-delimited JSON on stdin,
+answering each on stdout:
+
+    -> {"id": 1, "op": "run", "url": "https://…", "output": "/…/x.readable.md", "cwd": "/…"}
+    <- {"id": 1, "ok": true}
+    <- {"id": 1, "ok": false, "error": "HTTP 404"}
+
+    -> {"id": 2, "op": "ping"}
+    <- {"id": 2, "ok": true}
+
+Closing stdin asks the worker to exit. ``python -m dropsync.reference_worker``
+is a minimal implementation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+from pathlib import Path
+from typing import Any, Callable
+
+from .config import WorkerConfig
+
+logger = logging.getLogger("dropsync.workers")
+
+KILL_GRACE_SECONDS = 5.0
+
+
+class WorkerUnavailableError(RuntimeError):
+    """No worker could be started; callers fall back to one-shot execution."""
+
+
+class WorkerError(RuntimeError):
+    """A worker crashed, hung, or answered out of protocol."""
+
+
+class WorkerProcess:
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+        self.jobs_done = 0
+        self._ids = itertools.count(1)
+
+    @classmethod
+    async def start(
+        cls,
+        command: list[str],
+        cwd: Path,
+        on_start: Callable[[int], None] | None = None,
+    ) -> "WorkerProcess":
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=str(cwd),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        if on_start is not None:
+            on_start(process.pid)
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def request(self, message: dict[str, Any], timeout: float | None) -> dict[str, Any]:
+        stdin, stdout = self.process.stdin, self.process.stdout
+        if stdin is None or stdout is None or not self.alive:
+            raise WorkerError("worker is not running")
+        request_id = next(self._ids)
+        stdin.write((json.dumps({"id": request_id, **message}) + "\n").encode("utf-8"))
+        try:
+            async with asyncio.timeout(timeout):
+                await stdin.drain()
+                line = await stdout.readline()
+        except TimeoutError as exc:
+            raise WorkerError(f"no answer within {timeout}s") from exc
+        except (ConnectionError, ValueError) as exc:
+            raise WorkerError(str(exc)) from exc
+        if not line:
+            raise WorkerError("worker exited")
+        try:
+            reply = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise WorkerError(f"malformed reply: {line[:200]!r}") from exc
+        if not isinstance(reply, dict) or reply.get("id") != request_id:
+            raise WorkerError(f"unexpected reply: {reply!r}")
+        return reply
+
+    async def close(self) -> None:
+        if not self.alive:
+            return
+        if self.process.stdin is not None:
+            self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=KILL_GRACE_SECONDS)
+            return
+        except TimeoutError:
+            pass
+        await self.kill()
+
+    async def kill(self) -> None:
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if not self.alive:
+                return
+            try:
+                os.killpg(self.process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=KILL_GRACE_SECONDS)
+                return
+            except TimeoutError:
+                continue
+
+
+class WorkerPool:
+    """Up to ``pool_size`` workers for one processor, recycled after ``max_jobs``."""
+
+    def __init__(
+        self,
+        name: str,
+        cfg: WorkerConfig,
+        cwd: Path,
+        on_start: Callable[[int], None] | None = None,
+    ) -> None:
+        self.name = name
+        self.cfg = cfg
+        self.cwd = cwd
+        self._on_start = on_start
+        self._idle: list[WorkerProcess] = []
+        self._size = 0
+        self._available = asyncio.Condition()
+        self._health_task: asyncio.Task[None] | None = None
+        self._closed = False
+        self.started = 0
+        self.recycled = 0
+        self.failures = 0
+
+    async def run(self, message: dict[str, Any], timeout: float | None) -> str | None:
+        """Send one job to a worker; return an error description on failure."""
+
+        worker = await self._acquire()
+        try:
+            reply = await worker.request({"op": "run", **message}, timeout)
+        except WorkerError as exc:
+            self.failures += 1
+            await self._discard(worker)
+            logger.error("Worker for %s failed: %s", self.name, exc)
+            return f"worker failed: {exc}"
+        except BaseException:
+            await asyncio.shield(self._discard(worker))
+            raise
+        worker.jobs_done += 1
+        await self._release(worker)
+        if reply.get("ok"):
+            return None
+        return str(reply.get("error") or "worker reported failure")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "started": self.started,
+            "recycled": self.recycled,
+            "failures": self.failures,
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        # Wake tasks queued in _acquire so they see the pool is closed.
+        async with self._available:
+            self._available.notify_all()
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(worker.close() for worker in idle), return_exceptions=True)
+
+    async def _acquire(self) -> WorkerProcess:
+        async with self._available:
+            while True:
+                if self._closed:
+                    raise WorkerUnavailableError(f"{self.name} worker pool is closed")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive:
+                        return worker
+                    self._size -= 1
+                if self._size < self.cfg.pool_size:
+                    self._size += 1
+                    break
+                await self._available.wait()
+        try:
+            worker = await self._spawn()
+        except BaseException:
+            async with self._available:
+                self._size -= 1
+                self._available.notify_all()
+            raise
+        self._ensure_health_checks()
+        return worker
+
+    async def _spawn(self) -> WorkerProcess:
+        try:
+            worker = await WorkerProcess.start(self.cfg.command, self.cwd, self._on_start)
+        except OSError as exc:
+            raise WorkerUnavailableError(f"cannot start {self.name} worker: {exc}") from exc
+        try:
+            reply = await worker.request({"op": "ping"}, self.cfg.startup_timeout)
+        except WorkerError as exc:
+            await worker.kill()
+            raise WorkerUnavailableError(f"{self.name} worker did not answer ping: {exc}") from exc
+        if not reply.get("ok"):
+            await worker.kill()
+            raise WorkerUnavailableError(f"{self.name} worker rejected ping")
+        self.started += 1
+        return worker
+
+    async def _release(self, worker: WorkerProcess) -> None:
+        if worker.jobs_done >= self.cfg.max_jobs or self._closed:
+            self.recycled += 1
+            await self._discard(worker, graceful=True)
+            return
+        async with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    async def _discard(self, worker: WorkerProcess, graceful: bool = False) -> None:
+        if graceful:
+            await worker.close()
+        else:
+            await worker.kill()
+        async with self._available:
+            self._size -= 1
+            self._available.notify()
+
+    def _ensure_health_checks(self) -> None:
+        if self._health_task is None and self.cfg.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.cfg.health_interval)
+            async with self._available:
+                idle, self._idle = self._idle, []
+            for worker in idle:
+                try:
+                    reply = await worker.request({"op": "ping"}, self.cfg.startup_timeout)
+                    healthy = bool(reply.get("ok"))
+                except WorkerError:
+                    healthy = False
+                if healthy:
+                    async with self._available:
+                        self._idle.append(worker)
+                        self._available.notify()
+                else:
+                    logger.warning(
+                        "Dropping unhealthy %s worker (pid %s)", self.name, worker.process.pid
+                    )
+                    self.failures += 1
+                    await self._discard(worker)
+
+
+__all__ = ["WorkerPool", "WorkerProcess", "WorkerError", "WorkerUnavailableError"]
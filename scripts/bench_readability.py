@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Compare the built-in readability backend against readability-cli.
+
+Both backends read the same local HTML files, so the numbers measure
+extraction cost (process startup included) rather than network time.
+
+    python scripts/bench_readability.py page1.html page2.html --repeat 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dropsync.readability import extract_readable_markdown  # noqa: E402
+
+SYNTHETIC_PARAGRAPH = (
+    "<p>DropSync benchmark paragraph with commas, clauses, and <a href='/x'>a link</a> "
+    "so the scorer has something realistic to chew on.</p>"
+)
+
+
+def _synthetic_page(paragraphs: int = 400) -> str:
+    body = "\n".join(SYNTHETIC_PARAGRAPH for _ in range(paragraphs))
+    return (
+        "<html><head><title>Benchmark</title></head><body>"
+        "<nav><a href='/'>Home</a></nav>"
+        f"<article class='post'>{body}</article>"
+        "<footer>footer</footer></body></html>"
+    )
+
+
+def _extract_file(path: str) -> int:
+    html = Path(path).read_text(encoding="utf-8", errors="replace")
+    return len(extract_readable_markdown(html, "https://example.com/"))
+
+
+def bench_builtin(files: list[Path], workers: int) -> list[float]:
+    timings: list[float] = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pool.submit(_extract_file, str(files[0])).result()  # warm the workers
+        for path in files:
+            started = time.perf_counter()
+            pool.submit(_extract_file, str(path)).result()
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_cli(files: list[Path], command: list[str]) -> list[float]:
+    timings: list[float] = []
+    for path in files:
+        started = time.perf_counter()
+        subprocess.run([*command, str(path)], check=False, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _report(name: str, timings: list[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{name:<10} n={len(timings):<4} mean={statistics.mean(timings) * 1000:8.1f} ms"
+        f"  p50={statistics.median(timings) * 1000:8.1f} ms  p95={p95 * 1000:8.1f} ms"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("files", nargs="*", type=Path, help="HTML files (default: synthetic page)")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per file")
+    parser.add_argument(
+        "--workers", type=int, default=2, help="Process pool size for the builtin backend"
+    )
+    parser.add_argument("--cli", default="readability-cli", help="CLI backend command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        files = list(args.files)
+        if not files:
+            synthetic = Path(scratch) / "synthetic.html"
+            synthetic.write_text(_synthetic_page(), encoding="utf-8")
+            files = [synthetic]
+        runs = [path for path in files for _ in range(args.repeat)]
+
+        _report("builtin", bench_builtin(runs, args.workers))
+        command = args.cli.split()
+        if shutil.which(command[0]):
+            _report("cli", bench_cli(runs, command))
+        else:
+            print(f"cli        skipped: {command[0]!r} not found in PATH")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
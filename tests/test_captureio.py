@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from dropsync import captureio
+from dropsync.captureio import CaptureIO, LoopLagMonitor
+from dropsync.config import ConfigManager, StorageConfig
+from dropsync.processors import ProcessorManager
+from dropsync.rules import load_rules
+from dropsync.server import Collector, NotePayload
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_stalls():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.15)  # block the loop
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["stalls"] == 1
+    assert stats["max_lag"] >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_capture_io_writes_atomically(tmp_path):
+    io = CaptureIO(StorageConfig(fsync="file+dir"))
+    target = tmp_path / "notes" / "note.md"
+    await io.write_text(target, "first")
+    await io.write_text(target, "second")
+    await io.close()
+
+    assert target.read_text() == "second"
+    assert [path.name for path in target.parent.iterdir()] == ["note.md"]
+    assert io.stats()["operations"] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_disk_does_not_stall_the_loop(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+    original = captureio.write_text_file
+
+    def slow_write(path, content, fsync="none"):
+        time.sleep(0.2)
+        original(path, content, fsync)
+
+    monkeypatch.setattr(captureio, "write_text_file", slow_write)
+    config_manager = ConfigManager()
+    collector = Collector(config_manager, load_rules(root), ProcessorManager(config_manager))
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    saved = await asyncio.gather(
+        *(collector.save_note(NotePayload(title=f"Note {n}", body="text")) for n in range(4))
+    )
+    await monitor.stop()
+    await collector.close()
+
+    assert all(item.path.exists() for item in saved)
+    assert monitor.stats()["stalls"] == 0
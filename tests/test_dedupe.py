@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from dropsync.config import ConfigManager, IndexConfig
+from dropsync.dedupe import canonical_url, merge_group, plan_group
+from dropsync.index import ItemIndex
+from dropsync.processors import ProcessorManager
+from dropsync.rules import load_rules
+from dropsync.server import Collector, UrlPayload
+from dropsync.utils import build_front_matter, parse_front_matter
+
+
+def _stub(path: Path, selection: str | None = None, **metadata: object) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    body = f"{selection}\n\n\nCaptured via DropSync." if selection else "Captured via DropSync."
+    path.write_text(f"{build_front_matter(metadata)}\n\n{body}\n")
+    return path
+
+
+def _outputs(stub: Path) -> dict[str, Path]:
+    return {"readability": stub.with_suffix(".readable.md")}
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        (
+            "http://WWW.Example.com:80/post/?utm_source=x&b=2&a=1&fbclid=abc#top",
+            "https://example.com/post?a=1&b=2",
+        ),
+        ("https://m.example.com/", "https://example.com/"),
+        ("https://www.com/page", "https://www.com/page"),
+        ("https://example.com:8443/a", "https://example.com:8443/a"),
+        ("https://youtu.be/abc123?si=share", "https://youtube.com/watch?v=abc123"),
+        (
+            "https://m.youtube.com/watch?v=abc123&t=42&feature=share",
+            "https://youtube.com/watch?v=abc123",
+        ),
+        ("https://www.youtube.com/shorts/abc123", "https://youtube.com/watch?v=abc123"),
+        (
+            "https://old.reddit.com/r/python/comments/1/x/?share_id=9",
+            "https://reddit.com/r/python/comments/1/x",
+        ),
+        ("https://twitter.com/user/status/1?s=20", "https://x.com/user/status/1"),
+        ("mailto:someone@example.com", "mailto:someone@example.com"),
+    ],
+)
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_canonical_url_strips_configured_params():
+    url = "https://example.com/a?ref=feed&share_src=app&id=3"
+    assert canonical_url(url, strip_params=["ref", "share_*"]) == "https://example.com/a?id=3"
+
+
+def test_duplicate_groups_are_merged(tmp_path):
+    index = ItemIndex(tmp_path / "index.sqlite", IndexConfig())
+    links = tmp_path / "links"
+    first = _stub(
+        links / "20240513-000000--Post.md",
+        selection="Only the first capture quoted this",
+        url="https://example.com/post?utm_source=rss",
+        kind="url",
+        tags=["rust"],
+        timestamp="20240513-000000",
+    )
+    second = _stub(
+        links / "20240514-000000--Post.md",
+        url="https://www.example.com/post",
+        kind="url",
+        tags=["async"],
+        timestamp="20240514-000000",
+    )
+    second.with_suffix(".readable.md").write_text("Readable text")
+    other = _stub(links / "20240515-000000--Other.md", url="https://example.com/other", kind="url")
+    for stub in (first, second, other):
+        index.update(stub, _outputs(stub))
+
+    assert index.find_by_url("https://example.com/post").path == second
+    groups = index.duplicate_groups()
+    assert list(groups) == ["https://example.com/post"]
+    group = plan_group("https://example.com/post", groups["https://example.com/post"])
+    # The capture with processor output wins over the older one.
+    assert group.keep.path == second
+    assert [item.path for item in group.duplicates] == [first]
+
+    assert merge_group(group, _outputs) == [first]
+    assert not first.exists()
+    metadata, body = parse_front_matter(second.read_text())
+    assert metadata["tags"] == ["async", "rust"]
+    assert body.endswith("Only the first capture quoted this")
+    assert body.count("Captured via DropSync.") == 1
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_save_url_reuses_the_earlier_capture(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+    config_manager = ConfigManager()
+    manager = ProcessorManager(config_manager)
+    queued: list[bool] = []
+    monkeypatch.setattr(
+        manager,
+        "queue_for_url",
+        lambda item, extra_processors, missing_only=False: queued.append(missing_only) or [],
+    )
+    collector = Collector(config_manager, load_rules(root), manager)
+
+    first = await collector.save_url(
+        UrlPayload(url="https://example.com/post?utm_source=rss", title="Post")
+    )
+    again = await collector.save_url(
+        UrlPayload(url="http://www.example.com/post/", title="Post", on_duplicate="existing")
+    )
+    assert again.duplicate and again.path == first.path
+    assert queued == [False]
+
+    updated = await collector.save_url(
+        UrlPayload(
+            url="https://example.com/post",
+            tags=["later"],
+            selection="A quote worth keeping",
+            on_duplicate="update",
+        )
+    )
+    assert updated.path == first.path
+    assert queued == [False, True]
+    text = first.path.read_text()
+    metadata, body = parse_front_matter(text)
+    assert metadata["tags"] == ["later"]
+    assert "recaptured" in metadata
+    assert body.endswith("A quote worth keeping")
+
+    fresh = await collector.save_url(UrlPayload(url="https://example.com/post", title="Post"))
+    assert not fresh.duplicate and fresh.path != first.path
+
+    first.path.unlink()
+    fresh.path.unlink()
+    recaptured = await collector.save_url(
+        UrlPayload(url="https://example.com/post", title="Post", on_duplicate="existing")
+    )
+    assert not recaptured.duplicate and recaptured.path.exists()
+    await collector.close()
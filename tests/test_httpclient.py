@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from dropsync.config import HttpConfig
+from dropsync.httpclient import SharedHttpClient
+from dropsync.utils import resolve_title
+
+PAGE = b"<html><head><title>Pooled</title></head><body></body></html>"
+
+
+@pytest_asyncio.fixture
+async def http_server():
+    connections: list[int] = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connections.append(1)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                    + f"Content-Length: {len(PAGE)}\r\n\r\n".encode()
+                    + PAGE
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    yield port, connections
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_connections_and_dns(http_server):
+    port, connections = http_server
+    http = SharedHttpClient(HttpConfig())
+    client = await http.start()
+    try:
+        for index in range(3):
+            title, source = await resolve_title(
+                f"http://localhost:{port}/page{index}", None, 120, client=client
+            )
+            assert (title, source) == ("Pooled", "title")
+    finally:
+        await http.close()
+
+    assert len(connections) == 1
+    assert http.client is None
+
+
+@pytest.mark.asyncio
+async def test_resolver_caches_answers(http_server):
+    port, _ = http_server
+    http = SharedHttpClient(HttpConfig(keepalive_expiry=0))
+    client = await http.start()
+    try:
+        for _ in range(3):
+            response = await client.get(f"http://localhost:{port}/")
+            assert response.status_code == 200
+        stats = http.stats()
+    finally:
+        await http.close()
+
+    assert stats["dns"] == {"hits": 2, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_pool_errors_surface_as_httpx_errors():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    http = SharedHttpClient(HttpConfig())
+    client = await http.start()
+    try:
+        with pytest.raises(httpx.ConnectError):
+            await client.get(f"http://localhost:{port}/")
+    finally:
+        await http.close()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from dropsync.config import ConfigManager, IndexConfig
+from dropsync.index import InvalidCursorError, ItemIndex, fts_query
+from dropsync.processors import ProcessorJob, ProcessorManager
+from dropsync.rules import load_rules
+from dropsync.server import Collector, NotePayload, UrlPayload
+from dropsync.utils import build_front_matter
+
+
+def _stub(path: Path, body: str, **metadata: object) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{build_front_matter(metadata)}\n\n{body}\n")
+    return path
+
+
+def _outputs(stub: Path) -> dict[str, Path]:
+    return {"readability": stub.with_suffix(".readable.md")}
+
+
+def test_fts_query_quotes_terms():
+    assert fts_query('rust "async" tok*') == '"rust" """async""" "tok"*'
+    assert fts_query("  * ") == ""
+
+
+def test_index_search_and_filters(tmp_path):
+    index = ItemIndex(tmp_path / "index.sqlite", IndexConfig())
+    article = _stub(
+        tmp_path / "links" / "20240513-000000--Tokio internals.md",
+        "Captured via DropSync.",
+        title="Tokio internals",
+        url="https://example.com/tokio",
+        domain="example.com",
+        kind="url",
+        type="article",
+        tags=["rust", "async"],
+    )
+    article.with_suffix(".readable.md").write_text("# Tokio\n\nThe scheduler steals work.\n")
+    note = _stub(
+        tmp_path / "notes" / "20240513-000001--Groceries.md",
+        "Buy oat milk and work gloves",
+        title="Groceries",
+        kind="note",
+        type="note",
+    )
+    upload = tmp_path / "files" / "20240513-000002--quarterly report.pdf"
+    upload.parent.mkdir()
+    upload.write_bytes(b"%PDF-1.7")
+    companion = article.with_suffix(".readable.md")
+
+    assert index.update(article, _outputs(article))
+    assert index.update(note)
+    assert index.update(upload, is_file=True)
+    assert not index.update(companion)
+
+    hits = index.search("work")
+    assert {hit.item.path for hit in hits} == {note, article}
+    assert index.search("steals")[0].item.outputs == ["readability"]
+    assert [hit.item.path for hit in index.search("tok*")] == [article]
+    assert [hit.item.path for hit in index.search("work", tag="rust")] == [article]
+    assert [hit.item.path for hit in index.search("work", kind="note")] == [note]
+    assert [hit.item.path for hit in index.search("quarterly")] == [upload]
+    assert "[steals]" in index.search("steals")[0].snippet
+
+    moved = tmp_path / "archive" / article.name
+    moved.parent.mkdir()
+    article.rename(moved)
+    index.rename(article, moved)
+    assert [hit.item.path for hit in index.search("tokio")] == [moved]
+
+    note.unlink()
+    assert not index.update(note)
+    assert index.search("groceries") == []
+    assert index.stats()["items"] == 2
+    index.close()
+
+
+def test_reconcile_picks_up_changes(tmp_path):
+    root = tmp_path / "root"
+    index = ItemIndex(root / ".dropsync" / "index.sqlite", IndexConfig())
+    first = _stub(root / "notes" / "20240513-000000--One.md", "alpha", title="One", kind="note")
+    second = _stub(root / "notes" / "20240513-000001--Two.md", "beta", title="Two", kind="note")
+    files_dir = root / "files"
+
+    assert index.reconcile(root, files_dir, _outputs) == {
+        "indexed": 2,
+        "removed": 0,
+        "unchanged": 0,
+    }
+    second.unlink()
+    moved = _stub(root / "archive" / first.name, "alpha", title="One", kind="note")
+    first.unlink()
+    assert index.reconcile(root, files_dir, _outputs) == {
+        "indexed": 1,
+        "removed": 2,
+        "unchanged": 0,
+    }
+    assert [hit.item.path for hit in index.search("alpha")] == [moved]
+    assert index.reconcile(root, files_dir, _outputs)["unchanged"] == 1
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_collector_keeps_the_index_current(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+    config_manager = ConfigManager()
+    manager = ProcessorManager(config_manager)
+    monkeypatch.setattr(manager, "queue_for_url", lambda item, extra_processors: [])
+    collector = Collector(config_manager, load_rules(root), manager)
+
+    note = await collector.save_note(NotePayload(title="Standup", body="Discuss the flaky build"))
+    saved = await collector.save_url(
+        UrlPayload(url="https://example.com/post", title="Release notes")
+    )
+    hits = await collector.search("flaky")
+    assert hits is not None and [hit.item.path for hit in hits] == [note.path]
+
+    readable = saved.path.with_suffix(".readable.md")
+    readable.write_text("Version two ships incremental compilation.")
+    job = ProcessorJob(
+        name="readability", command=[], cwd=saved.path.parent, output=readable, stub=saved.path
+    )
+    await manager._notify_finished(job)
+    hits = await collector.search("incremental")
+    assert hits is not None and [hit.item.path for hit in hits] == [saved.path]
+    assert hits[0].item.outputs == ["readability"]
+    await collector.close()
+
+
+def test_list_items_pages_with_a_cursor(tmp_path):
+    index = ItemIndex(tmp_path / "index.sqlite", IndexConfig())
+    for n in range(7):
+        stub = _stub(
+            tmp_path / "notes" / f"20240513-00000{n}--Note {n}.md",
+            "text",
+            title=f"Note {n}",
+            kind="note" if n % 2 else "url",
+            tags=["odd"] if n % 2 else [],
+            timestamp=f"20240513-00000{n}",
+        )
+        index.update(stub)
+    version = index.version()
+
+    first = index.list_items(limit=3)
+    assert [item.title for item in first.items] == ["Note 6", "Note 5", "Note 4"]
+    second = index.list_items(limit=3, cursor=first.next_cursor)
+    third = index.list_items(limit=3, cursor=second.next_cursor)
+    assert [item.title for item in second.items + third.items] == [
+        "Note 3",
+        "Note 2",
+        "Note 1",
+        "Note 0",
+    ]
+    assert third.next_cursor is None
+
+    oldest = index.list_items(limit=2, newest_first=False, tag="odd")
+    assert [item.title for item in oldest.items] == ["Note 1", "Note 3"]
+    window = index.list_items(kind="url", since="20240513-000002", until="20240513-000006")
+    assert [item.title for item in window.items] == ["Note 4", "Note 2"]
+    with pytest.raises(InvalidCursorError):
+        index.list_items(cursor="not a cursor")
+
+    assert index.version() == version
+    index.remove(tmp_path / "notes" / "missing.md")
+    assert index.version() == version
+    index.remove(tmp_path / "notes" / "20240513-000000--Note 0.md")
+    assert index.version() != version
+    index.close()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from dropsync.config import ConfigManager
+from dropsync.journal import JobJournal, _process_token, journal_path
+from dropsync.processors import ProcessorManager
+
+
+def test_claim_unfinished_returns_pending_and_interrupted(tmp_path):
+    journal = JobJournal(tmp_path / "jobs.sqlite")
+    pending = journal.enqueue(
+        "readability", "https://a.example", "a.example", 1, {"command": ["x"], "cwd": "/"}
+    )
+    running = journal.enqueue(
+        "monolith", "https://b.example", "b.example", 0, {"command": ["y"], "cwd": "/"}
+    )
+    finished = journal.enqueue(
+        "monolith", "https://c.example", "c.example", 0, {"command": ["z"], "cwd": "/"}
+    )
+    journal.mark_running(running)
+    journal.mark_running(finished)
+    journal.mark_finished(finished, ok=True)
+    journal.close()
+
+    reopened = JobJournal(tmp_path / "jobs.sqlite")
+    claimed = reopened.claim_unfinished()
+    # Interactive-priority work comes back first.
+    assert [entry.id for entry in claimed] == [running, pending]
+    assert claimed[0].attempts == 1
+    assert reopened.counts() == {"pending": 2, "done": 1}
+
+
+def test_claim_ignores_owner_with_recycled_pid(tmp_path):
+    journal = JobJournal(tmp_path / "jobs.sqlite")
+    job = journal.enqueue(
+        "readability", "https://a.example", "a.example", 0, {"command": ["x"], "cwd": "/"}
+    )
+    parent = (os.getppid(), _process_token(os.getppid()))
+    journal._conn.execute("UPDATE jobs SET owner = ?, owner_token = ? WHERE id = ?", (*parent, job))
+    assert journal.claim_unfinished() == []
+    # A live PID whose recorded start time no longer matches belongs to a new process.
+    journal._conn.execute(
+        "UPDATE jobs SET owner = ?, owner_token = ? WHERE id = ?", (os.getppid(), "stale", job)
+    )
+    assert [entry.id for entry in journal.claim_unfinished()] == [job]
+    assert journal.claim_unfinished(active={job}) == []
+
+
+@pytest.mark.asyncio
+async def test_resume_runs_journaled_jobs(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+
+    journal = JobJournal(journal_path(root))
+    journal.enqueue(
+        "readability",
+        "https://a.example",
+        "a.example",
+        1,
+        {"command": ["true"], "cwd": str(tmp_path)},
+    )
+    journal.close()
+
+    manager = ProcessorManager(ConfigManager())
+    assert manager.resume() == 1
+    await manager.join()
+    assert manager.stats()["journal"] == {"done": 1}
+    await manager.shutdown()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from dropsync.config import AdaptiveTimeoutConfig
+from dropsync.latency import LatencyTracker
+from dropsync.utils import resolve_title
+
+
+def test_timeout_budget_follows_observed_latency(tmp_path):
+    path = tmp_path / "domains.sqlite"
+    tracker = LatencyTracker(path, AdaptiveTimeoutConfig(min_timeout=0.2))
+    assert tracker.timeout_for("fast.example", 3.0) == 3.0
+    for _ in range(20):
+        tracker.record_success("fast.example", 0.05)
+        tracker.record_success("slow.example", 2.5)
+    assert tracker.timeout_for("fast.example", 3.0) == pytest.approx(0.2)
+    assert 2.5 < tracker.timeout_for("slow.example", 3.0) <= 3.0
+    tracker.close()
+
+    reopened = LatencyTracker(path, AdaptiveTimeoutConfig(min_timeout=0.2))
+    assert reopened.timeout_for("fast.example", 3.0) == pytest.approx(0.2)
+    assert reopened.stats(3.0)["tracked"] == 2
+
+
+def test_breaker_opens_and_lets_one_probe_through():
+    tracker = LatencyTracker(None, AdaptiveTimeoutConfig(failure_threshold=2, cooldown=60))
+    tracker.record_failure("dead.example")
+    assert tracker.allow("dead.example")
+    tracker.record_failure("dead.example")
+    assert not tracker.allow("dead.example")
+    assert tracker.stats(3.0)["domains"][0]["domain"] == "dead.example"
+
+    # Once the cooldown has passed a single probe goes out.
+    tracker._domains["dead.example"].open_until = 0.0
+    assert tracker.allow("dead.example")
+    assert not tracker.allow("dead.example")
+    tracker.record_success("dead.example", 0.3)
+    assert tracker.allow("dead.example")
+
+
+@pytest.mark.asyncio
+async def test_resolve_title_skips_domains_with_open_breaker():
+    tracker = LatencyTracker(None, AdaptiveTimeoutConfig(failure_threshold=2))
+    requests: list[float] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.extensions["timeout"]["read"])
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for _ in range(4):
+            assert await resolve_title(
+                "https://dead.example/post", None, 120, client=client, latency=tracker
+            ) == ("post", "slug")
+
+    assert requests == [3.0, 3.0]
+    assert tracker.skipped == 2
+
+
+def test_timeouts_below_the_ceiling_back_off_instead_of_tripping():
+    tracker = LatencyTracker(None, AdaptiveTimeoutConfig(min_timeout=0.5, failure_threshold=3))
+    for _ in range(20):
+        tracker.record_success("healthy.example", 0.1)
+    assert tracker.timeout_for("healthy.example", 3.0) == pytest.approx(0.5)
+
+    # The site is briefly slower than it has ever been: each timeout doubles the budget.
+    budgets = []
+    for _ in range(3):
+        budget = tracker.timeout_for("healthy.example", 3.0)
+        budgets.append(budget)
+        tracker.record_timeout("healthy.example", budget, 3.0)
+    assert budgets == pytest.approx([0.5, 1.0, 2.0])
+    assert tracker.allow("healthy.example")
+    assert tracker.timeout_for("healthy.example", 3.0) == 3.0
+
+    tracker.record_success("healthy.example", 1.5)
+    assert tracker.timeout_for("healthy.example", 3.0) < 3.0
+    assert tracker._domains["healthy.example"].failures == 0
+
+    # Only timeouts with the full budget count toward the breaker.
+    for _ in range(3):
+        tracker.record_timeout("down.example", 3.0, 3.0)
+    assert not tracker.allow("down.example")
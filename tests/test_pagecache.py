@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import zlib
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from dropsync import processors
+from dropsync.config import ConfigManager, PagesConfig
+from dropsync.pagecache import InvalidHtmlPayloadError, PageCache, decode_html_payload
+from dropsync.processors import ProcessorManager, UrlItem
+from dropsync.utils import ItemPaths
+
+PAGE = (
+    b"<html><head><title>Fetched once</title></head><body>"
+    + b"<p>Plenty of article text here, enough to be scored.</p>" * 200
+    + b"</body></html>"
+)
+
+
+@pytest_asyncio.fixture
+async def page_server():
+    requests: list[bytes] = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                requests.append(await reader.readuntil(b"\r\n\r\n"))
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                    + f"Content-Length: {len(PAGE)}\r\n\r\n".encode()
+                    + PAGE
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", requests
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_page_is_downloaded_once(page_server, tmp_path):
+    base, requests = page_server
+    pages = PageCache(tmp_path / "pages", PagesConfig())
+    async with httpx.AsyncClient() as client:
+        metadata = await pages.fetch_title(client, f"{base}/article", 3.0, 1024)
+        page = await pages.wait(f"{base}/article")
+        again = await pages.fetch_title(client, f"{base}/article#comments", 3.0, 1024)
+        pages.prefetch(client, f"{base}/article", 3.0)
+        await pages.wait(f"{base}/article")
+
+    assert metadata is not None and metadata.title == "Fetched once"
+    assert again is not None and again.title == "Fetched once"
+    assert page is not None and not page.truncated
+    assert page.path.read_bytes() == PAGE
+    assert len(requests) == 1
+    assert pages.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_long_pages_are_truncated(page_server, tmp_path):
+    base, _ = page_server
+    pages = PageCache(tmp_path / "pages", PagesConfig(max_bytes=1024))
+    async with httpx.AsyncClient() as client:
+        pages.prefetch(client, f"{base}/long", 3.0)
+        page = await pages.wait(f"{base}/long")
+
+    assert page is not None and page.truncated
+    assert page.size == 1024
+
+
+@pytest.mark.asyncio
+async def test_processors_read_the_fetched_page(page_server, tmp_path, monkeypatch):
+    async def no_fetch(client, url, max_bytes):
+        raise AssertionError("builtin readability fetched the URL again")
+
+    monkeypatch.setattr(processors, "_fetch_document", no_fetch)
+    base, requests = page_server
+    root = tmp_path / "root"
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(
+        f'root = "{root}"\n'
+        '[processors.readability]\nbackend = "builtin"\nworkers = 1\n'
+        "[processors.monolith]\nenabled = false\n"
+        "[processors.custom.copy]\n"
+        'command = ["cat"]\nargs = ["/nonexistent"]\ninput_args = ["{input}"]\n'
+        'output = "{stem}.copy.html"\ncapture_stdout = true\nitem_types = ["article"]\n'
+    )
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+    manager = ProcessorManager(ConfigManager())
+    assert manager.wants_page("article", "127.0.0.1")
+    pages = manager.page_cache
+    assert pages is not None
+
+    stub = root / "links" / "20240513-000000--Fetched.md"
+    stub.parent.mkdir(parents=True)
+    paths = ItemPaths(
+        stub=stub,
+        readable=stub.with_suffix(".readable.md"),
+        singlefile=stub.with_suffix(".single.html"),
+    )
+    url = f"{base}/doc"
+    async with httpx.AsyncClient() as client:
+        pages.prefetch(client, url, 3.0)
+        item = UrlItem(url=url, paths=paths, domain="127.0.0.1", item_type="article")
+        assert manager.queue_for_url(item, extra_processors=[]) == ["readability", "copy"]
+        await manager.join()
+    await manager.shutdown()
+
+    assert stub.with_name(f"{stub.stem}.copy.html").read_bytes() == PAGE
+    assert paths.readable.read_text().startswith("# Fetched once")
+    assert len(requests) == 1
+
+
+def test_decode_html_payload():
+    html = b"<title>Supplied</title>" + b"x" * 200_000
+    deflated = base64.b64encode(zlib.compress(html)).decode("ascii")
+    assert b"".join(decode_html_payload(deflated, "deflate")) == html
+    assert b"".join(decode_html_payload(html.decode(), "identity")) == html
+
+    truncated = base64.b64encode(zlib.compress(html)[:-8]).decode("ascii")
+    with pytest.raises(InvalidHtmlPayloadError):
+        b"".join(decode_html_payload(truncated, "deflate"))
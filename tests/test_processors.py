@@ -1,24 +1,51 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import time
 from pathlib import Path
 
+import httpx
 import pytest
 
-from dropsync.config import ConfigManager
-from dropsync.processors import ProcessorManager, UrlItem
+from dropsync import processors
+from dropsync.config import BatchConfig, ConfigManager, RateLimitConfig, RateLimitsConfig
+from dropsync.httpclient import SharedHttpClient
+from dropsync.processors import ProcessorJob, ProcessorManager, UrlItem
+from dropsync.ratelimit import HostRateLimiter, RateLimitedTransport
+from dropsync.scheduler import Priority
 from dropsync.utils import ItemPaths
 
 
 @pytest.fixture
-def processor_manager(tmp_path, monkeypatch):
-    config_path = tmp_path / "config.toml"
+def make_manager(tmp_path, monkeypatch):
+    """Build a ProcessorManager rooted at ``tmp_path / "root"`` with extra config TOML."""
+
     root = tmp_path / "root"
-    root.mkdir()
-    config_path.write_text(f"root = \"{root}\"\n")
-    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    root.mkdir(exist_ok=True)
+
+    def factory(extra_config: str = "") -> ProcessorManager:
+        config_path = tmp_path / "config.toml"
+        config_path.write_text(f'root = "{root}"\n{extra_config}')
+        monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+        monkeypatch.delenv("DROPSYNC_ROOT", raising=False)
+        return ProcessorManager(ConfigManager())
+
+    return factory
+
+
+@pytest.fixture
+def processor_manager(make_manager):
+    return make_manager()
+
 
-    manager = ConfigManager()
-    return ProcessorManager(manager)
+def item_paths(directory: Path, slug: str) -> ItemPaths:
+    stub = directory / f"20240513-000000--{slug}.md"
+    return ItemPaths(
+        stub=stub,
+        readable=stub.with_suffix(".readable.md"),
+        singlefile=stub.with_suffix(".single.html"),
+    )
 
 
 def test_queue_for_article(processor_manager, tmp_path, monkeypatch):
@@ -106,3 +133,314 @@ def test_queue_skips_when_schedule_fails(processor_manager, tmp_path, monkeypatc
 
     scheduled = processor_manager.queue_for_url(item, extra_processors=[])
     assert scheduled == []
+
+
+def test_custom_processor_from_config(make_manager, tmp_path, monkeypatch):
+    manager = make_manager(
+        "[processors.classes]\n"
+        "heavy = 1\n"
+        "[processors.custom.screenshot]\n"
+        'command = ["chromium", "--headless"]\n'
+        'args = ["--screenshot={output}", "{url}"]\n'
+        'output = "{stem}.png"\n'
+        'item_types = ["article"]\n'
+        'concurrency_class = "heavy"\n'
+    )
+    recorded = []
+    monkeypatch.setattr(manager, "_schedule", lambda job: recorded.append(job) or True)
+    directory = tmp_path / "links"
+    directory.mkdir()
+    paths = item_paths(directory, "Shot")
+    item = UrlItem(
+        url="https://example.com/a", paths=paths, domain="example.com", item_type="article"
+    )
+
+    assert "screenshot" in manager.queue_for_url(item, extra_processors=[])
+    job = next(job for job in recorded if job.name == "screenshot")
+    output = paths.stub.with_name("20240513-000000--Shot.png")
+    assert job.command == [
+        "chromium",
+        "--headless",
+        f"--screenshot={output}",
+        "https://example.com/a",
+    ]
+    assert job.output == output
+    limits = manager._limits(manager.config_manager.config)
+    assert limits.processor_class["screenshot"] == "heavy"
+    assert limits.per_class == {"heavy": 1}
+
+    # An existing output means the item is already done.
+    recorded.clear()
+    output.write_bytes(b"png")
+    assert "screenshot" not in manager.queue_for_url(item, extra_processors=["unknown"])
+    assert "unknown" not in {job.name for job in recorded}
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_dead_lettered(make_manager, tmp_path):
+    manager = make_manager(
+        "[processors.readability]\n"
+        'command = ["false"]\n'
+        "[processors.readability.retry]\n"
+        "max_attempts = 2\n"
+        "backoff = 0.0\n"
+        "[processors.monolith]\n"
+        "enabled = false\n"
+    )
+    paths = item_paths(tmp_path / "root" / "links", "Example")
+    item = UrlItem(
+        url="https://example.com/gone", paths=paths, domain="example.com", item_type="article"
+    )
+    assert manager.queue_for_url(item, extra_processors=[]) == ["readability"]
+
+    for _ in range(200):
+        if manager.dead_letters():
+            break
+        await asyncio.sleep(0.01)
+    [entry] = manager.dead_letters()
+    assert (entry.name, entry.url, entry.attempts) == ("readability", item.url, 2)
+
+    item.priority = Priority.BACKFILL
+    assert manager.queue_for_url(item, extra_processors=[]) == []
+    assert manager.requeue_dead_letters() == 1
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_retries_without_journal(make_manager, tmp_path, monkeypatch):
+    manager = make_manager("[processors]\njournal = false\n")
+    submitted = []
+    monkeypatch.setattr(manager.scheduler, "submit", submitted.append)
+    job = ProcessorJob(name="monolith", command=["true"], cwd=tmp_path, url="https://example.com")
+    manager._submit_later(job, 0.05)
+    await manager.shutdown()
+    await asyncio.sleep(0.1)
+    assert submitted == []
+    assert manager._scheduler is None
+
+
+@pytest.mark.asyncio
+async def test_duplicate_jobs_are_coalesced(processor_manager, tmp_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(processor_manager, "_ensure_command_available", lambda *_: True)
+    monkeypatch.setattr(processor_manager.scheduler, "submit", submitted.append)
+
+    paths = item_paths(tmp_path / "links", "Example")
+    item = UrlItem(
+        url="https://example.com/a", paths=paths, domain="example.com", item_type="article"
+    )
+
+    first = processor_manager.queue_for_url(item, extra_processors=[])
+    second = processor_manager.queue_for_url(item, extra_processors=["readability"])
+    assert first == second == ["readability", "monolith"]
+    assert [job.name for job in submitted] == ["readability", "monolith"]
+    dedup = processor_manager.stats()["dedup"]
+    assert (dedup["submitted"], dedup["coalesced"], dedup["hit_rate"]) == (2, 2, 0.5)
+    await processor_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stdout_is_streamed_into_place(processor_manager, tmp_path):
+    target = tmp_path / "links" / "page.readable.md"
+    script = "import sys; [sys.stdout.write('x' * 1000) for _ in range(300)]; sys.stderr.write('e' * 20000)"
+    job = ProcessorJob(
+        name="readability",
+        command=["python3", "-c", script],
+        cwd=tmp_path,
+        capture_stdout_to=target,
+    )
+    assert await processor_manager._run_job(job) is None
+    assert target.read_text() == "x" * 300_000
+    assert [p.name for p in target.parent.iterdir()] == [target.name]
+
+    job.command = ["python3", "-c", "import sys; sys.exit(3)"]
+    job.capture_stdout_to = tmp_path / "links" / "empty.readable.md"
+    assert await processor_manager._run_job(job) == "exit status 3"
+    assert not job.capture_stdout_to.exists()
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_process_group(make_manager, tmp_path):
+    manager = make_manager("[processors.monolith]\ntimeout = 0.3\n")
+
+    pid_file = tmp_path / "child.pid"
+    job = ProcessorJob(
+        name="monolith",
+        command=["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"],
+        cwd=tmp_path,
+    )
+    started = time.monotonic()
+    assert await manager._run_job(job) == "timed out after 0.3s"
+    assert time.monotonic() - started < 5
+
+    child = int(pid_file.read_text())
+    for _ in range(100):
+        try:
+            state = open(f"/proc/{child}/stat").read().split()[2]
+        except FileNotFoundError:
+            break
+        if state == "Z":
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("grandchild survived the timeout")
+
+
+@pytest.mark.asyncio
+async def test_worker_only_processor_fails_instead_of_falling_back(
+    make_manager, tmp_path, monkeypatch
+):
+    manager = make_manager(
+        "[processors.monolith]\ncommand = []\n"
+        "[processors.monolith.worker]\nenabled = true\n"
+        'command = ["definitely-not-a-dropsync-worker"]\nstartup_timeout = 1\n'
+    )
+
+    spawn = asyncio.create_subprocess_exec
+
+    async def no_url_exec(program, *args, **kwargs):
+        assert not program.startswith("https:"), "fell back to exec'ing the URL"
+        return await spawn(program, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", no_url_exec)
+    job = ProcessorJob(
+        name="monolith",
+        command=["https://example.com/page"],
+        cwd=tmp_path,
+        url="https://example.com/page",
+    )
+    assert await manager._run_job(job) == "worker unavailable"
+    assert manager._batch_config("monolith") is None
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_limits_are_applied_after_spawn(make_manager, tmp_path):
+    manager = make_manager("[processors.readability]\nnice = 5\nrlimit_cpu = 120\n")
+    target = tmp_path / "limits.txt"
+    script = (
+        "import os, resource, time; time.sleep(0.3); "
+        "print(os.nice(0), resource.getrlimit(resource.RLIMIT_CPU)[0])"
+    )
+    job = ProcessorJob(
+        name="readability",
+        command=["python3", "-c", script],
+        cwd=tmp_path,
+        capture_stdout_to=target,
+    )
+    assert await manager._run_job(job) is None
+    assert target.read_text().split() == [str(min(19, os.nice(0) + 5)), "120"]
+
+
+FAKE_YT_DLP = """#!/usr/bin/env python3
+import sys
+args = sys.argv[1:]
+result = args[args.index("--print-to-file") + 2]
+batch = args[args.index("--batch-file") + 1]
+with open("calls.log", "a") as log:
+    log.write(batch + "\\n")
+with open(batch) as urls, open(result, "a") as out:
+    for url in urls:
+        if "bad" not in url:
+            out.write(url)
+sys.exit(1 if "bad" in open(batch).read() else 0)
+"""
+
+
+@pytest.mark.asyncio
+async def test_media_jobs_share_one_batched_invocation(make_manager, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "yt-dlp"
+    fake.write_text(FAKE_YT_DLP)
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    root = tmp_path / "root"
+    manager = make_manager(
+        "[processors.readability]\nenabled = false\n"
+        '[processors.yt_dlp]\ncommand = ["yt-dlp"]\n'
+        "[processors.yt_dlp.retry]\nmax_attempts = 1\n"
+        "[processors.yt_dlp.batch]\nenabled = true\nmax_items = 3\nwindow = 10.0\n"
+    )
+
+    for slug in ["a", "bad", "c"]:
+        paths = item_paths(root / "links", slug)
+        item = UrlItem(
+            url=f"https://youtube.com/{slug}", paths=paths, domain="youtube.com", item_type="video"
+        )
+        assert manager.queue_for_url(item, extra_processors=[]) == ["yt-dlp"]
+
+    await manager.join()
+    await asyncio.sleep(0)
+    calls = (root / "media" / "calls.log").read_text().splitlines()
+    assert len(calls) == 1
+    assert [entry.url for entry in manager.dead_letters()] == ["https://youtube.com/bad"]
+    assert manager.stats()["journal"] == {"done": 2, "dead": 1}
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_batches_keep_one_domain(processor_manager, tmp_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(processor_manager.scheduler, "submit", submitted.append)
+    batch_cfg = BatchConfig(enabled=True, max_items=10, window=60.0)
+    urls = ["https://a.example/1", "https://b.example/1", "https://a.example/2"]
+    for url in urls:
+        domain = url.split("/")[2]
+        job = ProcessorJob(
+            name="yt-dlp", command=["yt-dlp", url], cwd=tmp_path, url=url, domain=domain
+        )
+        processor_manager._batcher.add(job, batch_cfg)
+    processor_manager._batcher.flush_all()
+    assert sorted((job.domain, len(job.members)) for job in submitted) == [
+        ("a.example", 2),
+        ("b.example", 0),
+    ]
+    await processor_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_builtin_readability_backend(make_manager, tmp_path, monkeypatch):
+    async def fake_fetch(client, url, max_bytes):
+        return "<title>Doc</title><article><p>Plenty of article text here, enough to be scored.</p></article>"
+
+    monkeypatch.setattr(processors, "_fetch_document", fake_fetch)
+    manager = make_manager(
+        '[processors.readability]\nbackend = "builtin"\nworkers = 1\n'
+        "[processors.monolith]\nenabled = false\n"
+    )
+
+    paths = item_paths(tmp_path / "root" / "links", "Doc")
+    item = UrlItem(
+        url="https://example.com/doc", paths=paths, domain="example.com", item_type="article"
+    )
+    assert manager.queue_for_url(item, extra_processors=[]) == ["readability"]
+    await manager.join()
+    assert paths.readable.read_text().startswith("# Doc\n\nSource: <https://example.com/doc>")
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_builtin_readability_fetches_with_the_shared_client(make_manager):
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, html="<title>Doc</title>")
+
+    limiter = HostRateLimiter(RateLimitsConfig(default=RateLimitConfig(rate=0.01, burst=1)))
+    limiter.take("example.com", 1)
+    manager = make_manager("")
+    manager.http = SharedHttpClient(manager.config_manager.config.http)
+    manager.http.client = httpx.AsyncClient(
+        transport=RateLimitedTransport(httpx.MockTransport(handler), limiter),
+        headers={"User-Agent": "DropSync-test"},
+    )
+
+    # The scheduler already charged the job, so the empty bucket does not stall it.
+    html = await asyncio.wait_for(manager._fetch_document("https://example.com/doc", 1024), 1.0)
+    assert html == "<title>Doc</title>"
+    assert seen[0].headers["User-Agent"] == "DropSync-test"
+    await manager.http.client.aclose()
+    await manager.shutdown()
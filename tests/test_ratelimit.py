@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import time
+
+import httpx
+import pytest
+
+from dropsync.config import RateLimitConfig, RateLimitsConfig
+from dropsync.ratelimit import HostRateLimiter, RateLimitedTransport, RateLimitExceededError
+from dropsync.rules import load_rules
+
+
+def test_domains_cover_subdomains_and_default_is_per_host():
+    limiter = HostRateLimiter(
+        RateLimitsConfig(
+            default=RateLimitConfig(rate=100, burst=1),
+            domains={"reddit.com": RateLimitConfig(rate=0.5, burst=2)},
+        )
+    )
+    for host in ("www.reddit.com", "old.reddit.com"):
+        assert limiter.delay(host) == 0
+        limiter.take(host)
+    # Both hosts drew from the reddit.com bucket.
+    assert limiter.delay("reddit.com") == pytest.approx(2.0, abs=0.05)
+    limiter.take("a.example")
+    assert limiter.delay("b.example") == 0
+
+
+@pytest.mark.asyncio
+async def test_transport_waits_for_tokens_and_rejects_long_waits():
+    limiter = HostRateLimiter(RateLimitsConfig(default=RateLimitConfig(rate=20, burst=1)))
+    transport = RateLimitedTransport(
+        httpx.MockTransport(lambda request: httpx.Response(200)), limiter
+    )
+    async with httpx.AsyncClient(transport=transport) as client:
+        started = time.monotonic()
+        await client.get("https://example.com/1")
+        await client.get("https://example.com/2")
+        assert time.monotonic() - started >= 0.04
+        assert limiter.waits == 1
+        limiter.take("example.com", 10)
+        with pytest.raises(RateLimitExceededError):
+            await client.get("https://example.com/3", timeout=0.1)
+
+
+def test_rules_override_rate_limits(tmp_path):
+    rules_dir = tmp_path / ".dropsync"
+    rules_dir.mkdir()
+    (rules_dir / "rules.toml").write_text(
+        '[[rules]]\ndomain = ["reddit.com"]\nrate_limit = { rate = 0.1, burst = 1 }\n'
+    )
+    engine = load_rules(tmp_path)
+    limiter = HostRateLimiter(RateLimitsConfig(), engine.rate_limits())
+    limiter.take("reddit.com")
+    assert limiter.delay("reddit.com") == pytest.approx(10.0, abs=0.1)
+    limiter.configure(RateLimitsConfig())
+    assert limiter.delay("reddit.com") == 0
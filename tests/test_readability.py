@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from dropsync.readability import extract_readable_markdown
+
+PAGE = """<html><head><title>Fallback</title><meta property="og:title" content="Real Title"></head>
+<body>
+<nav><a href="/">Home</a> <a href="/about">About</a></nav>
+<div class="sidebar"><ul><li><a href="/x">Promo one</a></li><li><a href="/y">Promo two</a></li></ul></div>
+<div class="post-content">
+<p>The first paragraph has commas, clauses, and enough text to be scored as content.
+<p>The second one links <a href="/more">elsewhere</a> and has <em>emphasis</em> too, naturally.
+<pre>print("hi")</pre>
+</div>
+<footer>Copyright</footer>
+<script>tracking()</script>
+</body></html>"""
+
+
+def test_extracts_main_content_as_markdown():
+    markdown = extract_readable_markdown(PAGE, "https://example.com/posts/1")
+    assert markdown.startswith("# Real Title\n\nSource: <https://example.com/posts/1>\n")
+    assert "The first paragraph has commas" in markdown
+    assert "[elsewhere](https://example.com/more)" in markdown
+    assert "*emphasis*" in markdown
+    assert '```\nprint("hi")\n```' in markdown
+    for noise in ("Home", "Promo one", "Copyright", "tracking"):
+        assert noise not in markdown
+
+
+def test_unclosed_list_items_stay_flat():
+    items = "".join(f"<li>Item number {index}, with a comma" for index in range(1500))
+    page = f"<html><body><article><p>Intro paragraph, long enough to be scored.</p><ul>{items}</ul></article></body></html>"
+    markdown = extract_readable_markdown(page, "https://example.com/list")
+    assert "- Item number 0, with a comma\n- Item number 1, with a comma" in markdown
+    assert "- Item number 1499, with a comma" in markdown
+
+
+def test_deeply_nested_markup_does_not_recurse_without_bound():
+    page = (
+        "<div>" * 5000
+        + "<p>Deep text, with commas, nested far down the tree.</p>"
+        + "</div>" * 5000
+    )
+    assert "Deep text, with commas" in extract_readable_markdown(page, "https://example.com/deep")
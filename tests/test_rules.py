@@ -3,10 +3,13 @@ from __future__ import annotations
 from pathlib import Path
 
 from dropsync.config import DropSyncConfig
+from dropsync.registry import default_registry
 from dropsync.rules import ItemContext, Rule, RuleApplication, RuleEngine, load_rules, organize_once
 
 
 class DummyProcessorManager:
+    registry = default_registry()
+
     def __init__(self) -> None:
         self.calls: list[tuple[str, list[str], bool]] = []
 
@@ -34,6 +37,7 @@ def test_organize_moves_and_schedules(tmp_path):
     rules_dir.mkdir()
 
     stub = links_dir / "20240513-000000--Example.md"
+    stub.with_suffix(".readable.md").write_text("readable")
     stub.write_text(
         "---\n"
         "title: Example\n"
@@ -58,4 +62,5 @@ def test_organize_moves_and_schedules(tmp_path):
     assert any("moved" in action for action in actions)
     moved_stub = media_dir / stub.name
     assert moved_stub.exists()
+    assert (media_dir / "20240513-000000--Example.readable.md").exists()
     assert processor_manager.calls
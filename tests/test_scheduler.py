@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from dropsync.config import RateLimitConfig, RateLimitsConfig
+from dropsync.ratelimit import HostRateLimiter
+from dropsync.scheduler import JobScheduler, Priority, SchedulerLimits
+
+
+@dataclass
+class FakeJob:
+    name: str
+    domain: str
+    priority: Priority = Priority.INTERACTIVE
+    input: Path | None = None
+
+
+@pytest.mark.asyncio
+async def test_interactive_jobs_run_before_backfill():
+    order: list[str] = []
+
+    async def runner(job):
+        order.append(f"{job.priority.name}:{job.domain}")
+        await asyncio.sleep(0)
+
+    scheduler = JobScheduler(runner, SchedulerLimits(max_concurrency=1, per_domain=1))
+    for index in range(3):
+        scheduler.submit(FakeJob("readability", f"b{index}.example", Priority.BACKFILL))
+    scheduler.submit(FakeJob("readability", "i.example", Priority.INTERACTIVE))
+    await scheduler.join()
+
+    # The first backfill job starts immediately; the interactive one jumps the rest.
+    assert order[:2] == ["BACKFILL:b0.example", "INTERACTIVE:i.example"]
+
+
+@pytest.mark.asyncio
+async def test_limits_are_enforced():
+    running: dict[str, int] = {}
+    peaks: dict[str, int] = {}
+    total = {"now": 0, "peak": 0}
+
+    async def runner(job):
+        for key in (job.name, job.domain):
+            running[key] = running.get(key, 0) + 1
+            peaks[key] = max(peaks.get(key, 0), running[key])
+        total["now"] += 1
+        total["peak"] = max(total["peak"], total["now"])
+        await asyncio.sleep(0.01)
+        for key in (job.name, job.domain):
+            running[key] -= 1
+        total["now"] -= 1
+
+    limits = SchedulerLimits(max_concurrency=3, per_domain=2, per_processor={"yt-dlp": 1})
+    scheduler = JobScheduler(runner, limits)
+    for index in range(6):
+        scheduler.submit(FakeJob("yt-dlp", f"v{index}.example"))
+        scheduler.submit(FakeJob("monolith", "same.example"))
+    assert scheduler.stats()["pending"] > 0
+    await scheduler.join()
+
+    assert total["peak"] <= 3
+    assert peaks["yt-dlp"] == 1
+    assert peaks["same.example"] <= 2
+    assert scheduler.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_class_is_shared_between_processors():
+    running = {"now": 0, "peak": 0}
+
+    async def runner(job):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+
+    limits = SchedulerLimits(
+        max_concurrency=4,
+        per_domain=4,
+        processor_class={"monolith": "heavy", "screenshot": "heavy"},
+        per_class={"heavy": 1},
+    )
+    scheduler = JobScheduler(runner, limits)
+    for index in range(3):
+        scheduler.submit(FakeJob("monolith", f"m{index}.example"))
+        scheduler.submit(FakeJob("screenshot", f"s{index}.example"))
+    await scheduler.join()
+
+    assert running["peak"] == 1
+    assert scheduler.stats()["running_by_class"] == {}
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_domain_does_not_hold_slots():
+    started: list[tuple[str, float]] = []
+
+    async def runner(job):
+        started.append((job.domain, asyncio.get_running_loop().time()))
+
+    limiter = HostRateLimiter(
+        RateLimitsConfig(domains={"slow.example": RateLimitConfig(rate=20, burst=1)})
+    )
+    scheduler = JobScheduler(runner, SchedulerLimits(max_concurrency=1), limiter)
+    for _ in range(3):
+        scheduler.submit(FakeJob("monolith", "slow.example"))
+    scheduler.submit(FakeJob("monolith", "fast.example"))
+    await scheduler.join()
+
+    domains = [domain for domain, _ in started]
+    # The throttled domain's second job waits for a token; other work runs meanwhile.
+    assert domains == ["slow.example", "fast.example", "slow.example", "slow.example"]
+    slow_times = [at for domain, at in started if domain == "slow.example"]
+    assert slow_times[2] - slow_times[0] >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_jobs_reading_the_cached_page_skip_the_rate_limit():
+    started: list[str] = []
+
+    async def runner(job):
+        started.append("cached" if job.input is not None else "fetch")
+
+    limiter = HostRateLimiter(
+        RateLimitsConfig(domains={"slow.example": RateLimitConfig(rate=0.01, burst=1)})
+    )
+    scheduler = JobScheduler(runner, SchedulerLimits(max_concurrency=1), limiter)
+    scheduler.submit(FakeJob("monolith", "slow.example"))
+    for _ in range(3):
+        scheduler.submit(FakeJob("readability", "slow.example", input=Path("page.html")))
+    await asyncio.wait_for(scheduler.join(), timeout=1.0)
+
+    # The bucket is empty after the first fetch, yet the cache readers still run.
+    assert started == ["fetch", "cached", "cached", "cached"]
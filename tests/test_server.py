@@ -1,6 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import gzip
+import hashlib
 import importlib
+import os
 from pathlib import Path
 
 import httpx
@@ -39,3 +44,342 @@ async def test_post_url_creates_stub(tmp_path, monkeypatch):
     files = list((root / "links").glob("*.md"))
     assert files, "stub markdown not created"
     assert recorded
+
+
+@pytest.mark.asyncio
+async def test_requeue_requires_explicit_selection(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+
+    requeued = []
+
+    def fake_requeue(ids=None):
+        requeued.append(ids)
+        return len(ids or [])
+
+    server_module.app_state.processor_manager.requeue_dead_letters = fake_requeue  # type: ignore[assignment]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        empty = await client.post("/processors/dead-letters/requeue", json={})
+        everything = await client.post("/processors/dead-letters/requeue", json={"all": True})
+        some = await client.post("/processors/dead-letters/requeue", json={"ids": [3]})
+    assert empty.status_code == 422
+    assert everything.status_code == some.status_code == 200
+    assert requeued == [None, [3]]
+
+
+@pytest.mark.asyncio
+async def test_deferred_title_renames_stub(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n[titles]\nmode = "deferred"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+    collector = server_module.app_state.collector
+
+    queued = []
+
+    def fake_queue(item, extra_processors, force=False):  # type: ignore[signature-diff]
+        queued.append(item.paths.stub)
+        return ["readability"]
+
+    collector.processor_manager.queue_for_url = fake_queue  # type: ignore[assignment]
+    fetched = asyncio.Event()
+
+    async def fake_resolve(url, provided_title, max_length, **kwargs):
+        await fetched.wait()
+        return "Real Title", "meta"
+
+    monkeypatch.setattr(server_module, "resolve_title", fake_resolve)
+    renames = []
+    collector.add_rename_listener(lambda old, new: renames.append((old.name, new.name)))
+
+    saved = await collector.save_url(server_module.UrlPayload(url="https://example.com/some-post"))
+    assert saved.processors == []
+    assert "title_source: pending" in saved.path.read_text()
+    assert queued == []
+
+    fetched.set()
+    await collector.wait_for_titles()
+
+    renamed = saved.path.with_name(saved.path.name.replace("some post", "Real Title"))
+    assert not saved.path.exists()
+    assert "title: Real Title" in renamed.read_text()
+    assert "title_source: meta" in renamed.read_text()
+    assert renames == [(saved.path.name, renamed.name)]
+    assert queued == [renamed]
+
+
+@pytest.mark.asyncio
+async def test_unfinished_deferred_title_keeps_the_slug(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n[titles]\nmode = "deferred"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+    collector = server_module.app_state.collector
+
+    queued = []
+
+    def fake_queue(item, extra_processors, force=False):  # type: ignore[signature-diff]
+        queued.append(item.paths.stub)
+        return ["readability"]
+
+    collector.processor_manager.queue_for_url = fake_queue  # type: ignore[assignment]
+
+    async def failing_resolve(url, provided_title, max_length, **kwargs):
+        if "broken" in url:
+            raise RuntimeError("parser crashed")
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(server_module, "resolve_title", failing_resolve)
+
+    failed = await collector.save_url(server_module.UrlPayload(url="https://example.com/broken"))
+    hung = await collector.save_url(server_module.UrlPayload(url="https://example.com/hung"))
+    # The failed lookup settles by itself; the hung one is cancelled at shutdown.
+    await collector.wait_for_titles(timeout=0.1)
+
+    for saved in (failed, hung):
+        assert saved.path.exists()
+        assert "title_source: slug" in saved.path.read_text()
+    assert sorted(queued) == sorted([failed.path, hung.path])
+
+
+@pytest.mark.asyncio
+async def test_supplied_html_skips_fetching(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+
+    async def no_fetch(*args, **kwargs):
+        raise AssertionError("page was fetched")
+
+    monkeypatch.setattr(server_module, "resolve_title", no_fetch)
+    server_module.app_state.processor_manager.queue_for_url = (  # type: ignore[assignment]
+        lambda item, extra_processors, force=False: []
+    )
+    html = b"<html><head><title>Members only</title></head><body>secret</body></html>"
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            "/url",
+            json={
+                "url": "https://example.com/private",
+                "html": base64.b64encode(gzip.compress(html)).decode("ascii"),
+            },
+        )
+        invalid = await client.post(
+            "/url", json={"url": "https://example.com/broken", "html": "not base64!"}
+        )
+
+    assert response.status_code == 200
+    stub = Path(response.json()["path"])
+    assert stub.name.endswith("--Members only.md")
+    assert "title_source: title" in stub.read_text()
+    pages = server_module.app_state.processor_manager.page_cache
+    page = await pages.get("https://example.com/private")
+    assert page is not None and page.path.read_bytes() == html
+    assert invalid.status_code == 422
+    assert len(list((root / "links").glob("*.md"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_uploaded_html_is_decoded_as_it_streams(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+
+    async def no_fetch(*args, **kwargs):
+        raise AssertionError("page was fetched")
+
+    monkeypatch.setattr(server_module, "resolve_title", no_fetch)
+    server_module.app_state.processor_manager.queue_for_url = (  # type: ignore[assignment]
+        lambda item, extra_processors, force=False: []
+    )
+    html = b"<html><head><title>Streamed</title></head><body>" + b"x" * 300_000 + b"</body></html>"
+    compressed = gzip.compress(html)
+
+    async def body():
+        for start in range(0, len(compressed), 1024):
+            yield compressed[start : start + 1024]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            "/url/raw",
+            params={"url": "https://example.com/long", "tags": ["a", "b"]},
+            headers={"Content-Encoding": "gzip"},
+            content=body(),
+        )
+        invalid = await client.post(
+            "/url/raw",
+            params={"url": "https://example.com/broken"},
+            headers={"Content-Encoding": "gzip"},
+            content=b"not gzip",
+        )
+        unsupported = await client.post(
+            "/url/raw",
+            params={"url": "https://example.com/brotli"},
+            headers={"Content-Encoding": "br"},
+            content=b"...",
+        )
+
+    assert response.status_code == 200
+    stub = Path(response.json()["path"])
+    assert stub.name.endswith("--Streamed.md")
+    assert "tags: [a, b]" in stub.read_text()
+    pages = server_module.app_state.processor_manager.page_cache
+    page = await pages.get("https://example.com/long")
+    assert page is not None and page.path.read_bytes() == html
+    assert invalid.status_code == 422
+    assert unsupported.status_code == 415
+    assert len(list((root / "links").glob("*.md"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_raw_file_upload_is_streamed(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+
+    content = os.urandom(300_000)
+
+    async def body():
+        for start in range(0, len(content), 65536):
+            yield content[start : start + 65536]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            "/file/raw",
+            params={"name": "photo.jpg", "sha256": hashlib.sha256(content).hexdigest()},
+            content=body(),
+        )
+        mismatch = await client.post(
+            "/file/raw", params={"name": "other.jpg", "sha256": "0" * 64}, content=b"data"
+        )
+        legacy = await client.post(
+            "/file",
+            json={"name": "note.txt", "content_b64": base64.encodebytes(b"hello").decode()},
+        )
+
+    assert response.status_code == 200
+    saved = Path(response.json()["path"])
+    assert saved.suffix == ".jpg" and saved.read_bytes() == content
+    assert response.json()["sha256"] == hashlib.sha256(content).hexdigest()
+    assert mismatch.status_code == 422
+    assert Path(legacy.json()["path"]).read_bytes() == b"hello"
+    assert sorted(path.suffix for path in (root / "files").iterdir()) == [".jpg", ".txt"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_captures_never_share_a_name(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+    monkeypatch.setattr(server_module, "utc_timestamp", lambda: "20240513-000000")
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        responses = await asyncio.gather(
+            *(
+                client.post("/note", json={"title": "Same", "body": f"note {n}"})
+                for n in range(24)
+            )
+        )
+
+    paths = {Path(response.json()["path"]) for response in responses}
+    assert len(paths) == 24
+    bodies = {path.read_text().rsplit("\n\n", 1)[-1].strip() for path in paths}
+    assert bodies == {f"note {n}" for n in range(24)}
+    assert len(list((root / "notes").iterdir())) == 24
+
+
+@pytest.mark.asyncio
+async def test_items_are_listed_from_the_index(tmp_path, monkeypatch):
+    config_path = tmp_path / "config.toml"
+    root = tmp_path / "Collect"
+    config_path.write_text(f'root = "{root}"\n')
+    monkeypatch.setenv("DROPSYNC_CONFIG", str(config_path))
+    monkeypatch.setenv("DROPSYNC_ROOT", str(root))
+
+    import dropsync.server as server_module
+
+    importlib.reload(server_module)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server_module.app), base_url="http://test"
+    ) as client:
+        for n in range(3):
+            await client.post("/note", json={"title": f"Note {n}", "body": "text", "tags": ["t"]})
+        first = await client.get("/items", params={"limit": 2, "kind": "note", "tag": "t"})
+        etag = first.headers["etag"]
+        second = await client.get(
+            "/items", params={"limit": 2, "kind": "note", "cursor": first.json()["next_cursor"]}
+        )
+        unchanged = await client.get(
+            "/items",
+            params={"limit": 2, "kind": "note", "tag": "t"},
+            headers={"If-None-Match": etag},
+        )
+        await client.post("/code", json={"code": "print(1)", "lang": "python"})
+        changed = await client.get("/items", params={"limit": 2}, headers={"If-None-Match": etag})
+        bad_cursor = await client.get("/items", params={"cursor": "???"})
+        old = await client.get("/items", params={"until": "2000-01-01T00:00:00Z"})
+
+    assert first.status_code == 200
+    assert len(first.json()["items"]) == 2
+    assert second.json()["next_cursor"] is None
+    titles = [item["title"] for item in first.json()["items"] + second.json()["items"]]
+    assert sorted(titles) == ["Note 0", "Note 1", "Note 2"]
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["items"][0]["kind"] == "code"
+    assert bad_cursor.status_code == 422
+    assert old.json() == {"items": [], "next_cursor": None}
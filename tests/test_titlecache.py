@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from dropsync.config import TitleCacheConfig
+from dropsync.titlecache import TitleCache, cache_key
+from dropsync.utils import TitleMetadata, resolve_title
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_cache_key_normalizes_url():
+    assert cache_key("HTTPS://Example.COM:443/a?b=1#frag") == "https://example.com/a?b=1"
+    assert cache_key("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_titles_persist_across_instances(tmp_path):
+    path = tmp_path / "titles.sqlite"
+    cache = TitleCache(path, TitleCacheConfig())
+    cache.store("https://example.com/a", TitleMetadata(title="A", source="meta"))
+    cache.close()
+
+    reopened = TitleCache(path, TitleCacheConfig())
+    entry = reopened.get("https://EXAMPLE.com/a#top")
+    assert entry is not None and entry.metadata == TitleMetadata(title="A", source="meta")
+    assert reopened.get("https://example.com/b") is None
+    assert reopened.stats()["hits"] == 1
+    assert reopened.stats()["misses"] == 1
+
+
+def test_memory_layer_is_bounded():
+    cache = TitleCache(None, TitleCacheConfig(memory_entries=2))
+    for name in "abc":
+        cache.store(f"https://example.com/{name}", TitleMetadata(title=name, source="title"))
+    assert cache.get("https://example.com/a") is None
+    assert cache.get("https://example.com/c") is not None
+
+
+@pytest.mark.asyncio
+async def test_resolve_title_uses_cache_and_negative_entries(tmp_path):
+    cache = TitleCache(tmp_path / "titles.sqlite", TitleCacheConfig())
+    requests: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        if request.url.host == "down.example":
+            raise httpx.ConnectTimeout("timed out", request=request)
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(
+            200, headers={"Content-Type": "text/html"}, text="<title>Cached</title></head>"
+        )
+
+    async with _client(handler) as client:
+        for _ in range(2):
+            assert await resolve_title(
+                "https://ok.example/page", None, 120, client=client, cache=cache
+            ) == ("Cached", "title")
+            assert await resolve_title(
+                "https://ok.example/missing", None, 120, client=client, cache=cache
+            ) == ("missing", "slug")
+            assert await resolve_title(
+                "https://down.example/one", None, 120, client=client, cache=cache
+            ) == ("one", "slug")
+        # A host that timed out is skipped for every URL until the entry expires.
+        assert await resolve_title(
+            "https://down.example/two", None, 120, client=client, cache=cache
+        ) == ("two", "slug")
+
+    assert requests == [
+        "https://ok.example/page",
+        "https://ok.example/missing",
+        "https://down.example/one",
+    ]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["negative_hits"] == 3
@@ -1,8 +1,35 @@
 from __future__ import annotations
 
+import os
+import threading
+from pathlib import Path
+
+import httpx
+import pytest
+
 from dropsync import utils
 
 
+class _ChunkStream(httpx.AsyncByteStream):
+    """Response body that records how many chunks the client pulled."""
+
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.chunks = chunks
+        self.served = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.served += 1
+            yield chunk
+
+
+def _client_for(stream: _ChunkStream, content_type: str) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"Content-Type": content_type}, stream=stream)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
 def test_sanitize_title_keeps_spaces():
     title = utils.sanitize_title("  Hello / there: world!  ", max_length=50)
     assert title == "Hello - there world"
@@ -25,3 +52,131 @@ def test_build_front_matter_roundtrip(tmp_path):
     saved = path.read_text()
     assert "title: Example" in saved
     assert "tags: [a, b]" in saved
+
+
+def test_atomic_writer_honours_umask_and_existing_mode(tmp_path):
+    fresh = tmp_path / "fresh.md"
+    writer = utils.AtomicFileWriter(fresh)
+    writer.write(b"hello")
+    writer.commit()
+    assert fresh.stat().st_mode & 0o777 == 0o666 & ~utils._process_umask()
+
+    existing = tmp_path / "existing.md"
+    existing.write_text("old")
+    existing.chmod(0o640)
+    writer = utils.AtomicFileWriter(existing)
+    writer.write(b"new")
+    writer.commit()
+    assert existing.read_text() == "new"
+    assert existing.stat().st_mode & 0o777 == 0o640
+
+
+@pytest.mark.asyncio
+async def test_title_fetch_stops_after_head():
+    stream = _ChunkStream(
+        [
+            b"<html><head><title>Streamed</title>",
+            b"</head><body>",
+            *(b"<p>filler</p>" * 1000 for _ in range(50)),
+        ]
+    )
+    async with _client_for(stream, "text/html; charset=utf-8") as client:
+        metadata = await utils.fetch_title_from_url("https://example.com/", client=client)
+    assert metadata == utils.TitleMetadata(title="Streamed", source="title")
+    assert stream.served == 2
+
+
+@pytest.mark.asyncio
+async def test_title_fetch_prefers_meta_and_caps_bytes():
+    stream = _ChunkStream(
+        [b"<head><title>Plain</title>", b'<meta property="og:title" content="OG">']
+    )
+    async with _client_for(stream, "text/html") as client:
+        metadata = await utils.fetch_title_from_url("https://example.com/", client=client)
+    assert metadata == utils.TitleMetadata(title="OG", source="meta")
+
+    endless = _ChunkStream([b"<html><head><script>" + b"x" * 4096 for _ in range(100)])
+    async with _client_for(endless, "text/html") as client:
+        assert (
+            await utils.fetch_title_from_url("https://example.com/", client=client, max_bytes=8192)
+            is None
+        )
+    assert endless.served == 2
+
+
+@pytest.mark.asyncio
+async def test_title_fetch_skips_non_html():
+    stream = _ChunkStream([b"%PDF-1.7 <title>Nope</title>"])
+    async with _client_for(stream, "application/pdf") as client:
+        assert await utils.fetch_title_from_url("https://example.com/a.pdf", client=client) is None
+    assert stream.served == 0
+
+
+def test_copy_fd_to_file_from_file_and_pipe(tmp_path):
+    content = os.urandom(200_000)
+    source = tmp_path / "source.bin"
+    source.write_bytes(content)
+    with source.open("rb") as handle:
+        assert utils.copy_fd_to_file(handle.fileno(), tmp_path / "copy.bin") == len(content)
+    assert (tmp_path / "copy.bin").read_bytes() == content
+
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(target=lambda: (os.write(write_fd, content), os.close(write_fd)))
+    writer.start()
+    try:
+        assert utils.copy_fd_to_file(read_fd, tmp_path / "piped.bin") == len(content)
+    finally:
+        writer.join()
+        os.close(read_fd)
+    assert (tmp_path / "piped.bin").read_bytes() == content
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "copy.bin",
+        "piped.bin",
+        "source.bin",
+    ]
+
+
+def test_claim_unique_path_under_contention(tmp_path):
+    base = tmp_path / "20240513-000000--Same title.md"
+    barrier = threading.Barrier(16)
+    claimed: list[Path] = []
+
+    def claim() -> None:
+        barrier.wait()
+        for _ in range(8):
+            claimed.append(utils.claim_unique_path(base))
+
+    threads = [threading.Thread(target=claim) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(claimed)) == 128
+    assert base in claimed
+    assert base.with_name("20240513-000000--Same title--2.md") in claimed
+    assert all(path.suffix == ".md" and path.exists() for path in claimed)
+
+
+def test_publish_unique_path_links_complete_files(tmp_path):
+    base = tmp_path / "20240513-000000--Same title.md"
+    barrier = threading.Barrier(16)
+    published: dict[Path, str] = {}
+
+    def publish(worker: int) -> None:
+        barrier.wait()
+        for n in range(8):
+            staged = utils.staging_path(base)
+            staged.write_text(f"capture {worker}-{n}")
+            # The final name only ever appears with its content.
+            published[utils.publish_unique_path(staged, base)] = f"capture {worker}-{n}"
+
+    threads = [threading.Thread(target=publish, args=(worker,)) for worker in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(published) == 128
+    assert all(path.read_text() == content for path, content in published.items())
+    assert sorted(tmp_path.iterdir()) == sorted(published)
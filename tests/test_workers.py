@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+from dropsync.config import WorkerConfig
+from dropsync.workers import WorkerPool, WorkerUnavailableError
+
+REFERENCE_WORKER = [sys.executable, "-m", "dropsync.reference_worker"]
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def _importable_worker(monkeypatch):
+    # Workers run with cwd=tmp_path, so make the checkout importable even when
+    # dropsync is not installed into the interpreter.
+    monkeypatch.setenv("PYTHONPATH", str(REPO_ROOT))
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_and_recycles_workers(tmp_path):
+    cfg = WorkerConfig(enabled=True, command=REFERENCE_WORKER, pool_size=2, max_jobs=3)
+    pool = WorkerPool("readability", cfg, tmp_path)
+
+    outputs = [tmp_path / f"item{index}.readable.md" for index in range(6)]
+    results = await asyncio.gather(
+        *(
+            pool.run({"url": f"https://example.com/{index}", "output": str(path)}, timeout=10)
+            for index, path in enumerate(outputs)
+        )
+    )
+    assert results == [None] * 6
+    assert outputs[3].read_text().startswith("# https://example.com/3")
+    stats = pool.stats()
+    # Six jobs with max_jobs=3: at least one worker is recycled, and every
+    # worker started is either recycled or still in the pool (at most two).
+    assert 2 <= stats["started"] <= 3
+    assert stats["recycled"] >= 1
+    assert stats["started"] - stats["recycled"] == stats["size"] <= 2
+
+    assert await pool.run({"op": "run", "url": ""}, timeout=10) == "missing url"
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_unavailable_worker(tmp_path):
+    cfg = WorkerConfig(enabled=True, command=["definitely-not-a-dropsync-worker"])
+    pool = WorkerPool("readability", cfg, tmp_path)
+    with pytest.raises(WorkerUnavailableError):
+        await pool.run({"url": "https://example.com"}, timeout=1)
+    assert pool.stats()["size"] == 0
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_close_wakes_waiting_jobs(tmp_path):
+    cfg = WorkerConfig(enabled=True, command=REFERENCE_WORKER, pool_size=1, health_interval=0)
+    pool = WorkerPool("readability", cfg, tmp_path)
+    worker = await pool._acquire()
+    waiter = asyncio.create_task(pool._acquire())
+    await asyncio.sleep(0)
+    await pool.close()
+    with pytest.raises(WorkerUnavailableError):
+        await asyncio.wait_for(waiter, timeout=5)
+    await pool._release(worker)
+    assert pool.stats()["size"] == 0